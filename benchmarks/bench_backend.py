@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Compares the latency of the backends over a series of generations:
+#
+#   cli           one fake `gemini` process per request, booting each time
+#   http          the HTTP backend, reusing one kept-alive connection
+#   http-no-reuse the HTTP backend with connection reuse turned off
+#
+# A local fake API stands in for Gemini. It adds --handshake seconds to every
+# new connection, standing in for the TCP and TLS handshakes of a real one.
+#
+#   python benchmarks/bench_backend.py [--runs 10] [--boot 0.3] [--handshake 0.1]
+
+import argparse
+import os
+import stat
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from gemmit.core.gemini_cli import GeminiCliBackend  # noqa: E402
+from gemmit.core.gemini_http import GeminiHttpBackend  # noqa: E402
+
+MESSAGE = "feat: Benchmark commit message"
+
+FAKE_GEMINI = """#!{python}
+import sys, time
+time.sleep({boot})
+sys.stdin.read()
+time.sleep({think})
+print({message!r})
+"""
+
+
+def make_api(handshake, think):
+    class FakeApi(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            time.sleep(handshake)
+            super().setup()
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            # The body is chunked; read up to its terminating chunk.
+            while self.rfile.readline().strip() != b"0":
+                pass
+            self.rfile.readline()
+            time.sleep(think)
+            payload = (
+                'data: {"candidates": [{"content": {"parts": [{"text": "%s"}]}}]}\r\n\r\n'
+                % MESSAGE
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return FakeApi
+
+
+def measure(backend, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = backend.generate("prompt")
+        times.append(time.perf_counter() - start)
+        assert text.strip() == MESSAGE, text
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the generation backends.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--boot", type=float, default=0.3)
+    parser.add_argument("--handshake", type=float, default=0.1)
+    parser.add_argument("--think", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_api(args.handshake, args.think))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+    with tempfile.TemporaryDirectory() as bin_dir:
+        gemini = os.path.join(bin_dir, "gemini")
+        with open(gemini, "w") as f:
+            f.write(
+                FAKE_GEMINI.format(
+                    python=sys.executable,
+                    boot=args.boot,
+                    think=args.think,
+                    message=MESSAGE,
+                )
+            )
+        os.chmod(gemini, os.stat(gemini).st_mode | stat.S_IEXEC)
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+
+        backends = [
+            ("cli", GeminiCliBackend()),
+            ("http", GeminiHttpBackend({"base_url": base_url})),
+            (
+                "http-no-reuse",
+                GeminiHttpBackend({"base_url": base_url, "max_connections": 0}),
+            ),
+        ]
+        print(f"{'backend':>14} {'first_s':>8} {'median_s':>9} {'connections':>12}")
+        for name, backend in backends:
+            times = measure(backend, args.runs)
+            pool = getattr(backend, "pool", None)
+            opened = pool.opened if pool else "-"
+            print(
+                f"{name:>14} {times[0]:>8.3f} {statistics.median(times):>9.3f} "
+                f"{opened:>12}"
+            )
+            backend.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Measures the perceived latency of streaming: time to the first message line
+# against the total generation time that a buffered display waits for.
+#
+# A fake `gemini` that thinks for a while and then writes the message line by
+# line is put on PATH.
+#
+#   python benchmarks/bench_first_line.py [--lines 8] [--runs 5]
+
+import argparse
+import os
+import stat
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# ~/.gemmit is resolved when gemmit is imported. A temporary HOME keeps the
+# real config, rate limit and latency history out of the benchmark.
+HOME = tempfile.TemporaryDirectory()
+os.environ["HOME"] = HOME.name
+
+from gemmit.core.ai import generate_commit_message  # noqa: E402
+
+FAKE_GEMINI = """#!{python}
+import sys, time
+sys.stdin.read()
+time.sleep({think})
+print("feat: Benchmark commit message", flush=True)
+for i in range({lines}):
+    time.sleep({per_line})
+    print(f"- change {{i}}", flush=True)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark time to first line against total generation time."
+    )
+    parser.add_argument("--lines", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--think", type=float, default=0.5)
+    parser.add_argument("--per-line", type=float, default=0.15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as bin_dir:
+        gemini = os.path.join(bin_dir, "gemini")
+        with open(gemini, "w") as f:
+            f.write(
+                FAKE_GEMINI.format(
+                    python=sys.executable,
+                    think=args.think,
+                    lines=args.lines,
+                    per_line=args.per_line,
+                )
+            )
+        os.chmod(gemini, os.stat(gemini).st_mode | stat.S_IEXEC)
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+
+        first_lines = []
+        totals = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            first = []
+
+            def on_line(line):
+                if not first:
+                    first.append(time.perf_counter() - start)
+
+            generate_commit_message("prompt", use_cache=False, on_line=on_line)
+            totals.append(time.perf_counter() - start)
+            first_lines.append(first[0])
+
+        print(f"{'display':>10} {'median_s':>9}")
+        print(f"{'streamed':>10} {statistics.median(first_lines):>9.2f}")
+        print(f"{'buffered':>10} {statistics.median(totals):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Benchmarks prompt latency against diff size, with and without map-reduce.
+#
+# A fake `gemini` whose latency grows with the prompt size is put on PATH, so
+# the numbers reflect how each mode scales rather than real model speed.
+#
+#   python benchmarks/bench_large_diff.py [--sizes 16,64,256,1024] [--workers 4]
+
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# ~/.gemmit is resolved when gemmit is imported. A temporary HOME keeps the
+# real config, rate limit and latency history out of the benchmark.
+HOME = tempfile.TemporaryDirectory()
+os.environ["HOME"] = HOME.name
+
+from gemmit.core.ai import generate_commit_message  # noqa: E402
+from gemmit.core.summarize import build_prompt  # noqa: E402
+
+FAKE_GEMINI = """#!{python}
+import sys, time
+prompt = sys.argv[-1] if len(sys.argv) > 2 else sys.stdin.read()
+time.sleep({base_latency} + {per_kb_latency} * len(prompt) / 1024)
+print("feat: Benchmark commit message")
+"""
+
+
+def make_diff(size_kb):
+    """Returns a synthetic diff of roughly size_kb kilobytes over many files."""
+    lines = "".join(f"+generated line {i} with some content\n" for i in range(30))
+    file_diff = (
+        "diff --git a/f{0}.py b/f{0}.py\n--- a/f{0}.py\n+++ b/f{0}.py\n@@ -1 +1,30 @@\n"
+    )
+    parts = []
+    size = 0
+    i = 0
+    while size < size_kb * 1024:
+        part = file_diff.format(i) + lines
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def time_call(fn):
+    start = time.perf_counter()
+    try:
+        fn()
+    except (OSError, SystemExit) as e:
+        return None, type(e).__name__
+    return time.perf_counter() - start, ""
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark latency against diff size for both prompt modes."
+    )
+    parser.add_argument("--sizes", default="16,64,256,1024", help="Diff sizes in KB.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--base-latency", type=float, default=0.2)
+    parser.add_argument("--per-kb-latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as bin_dir:
+        gemini = os.path.join(bin_dir, "gemini")
+        with open(gemini, "w") as f:
+            f.write(
+                FAKE_GEMINI.format(
+                    python=sys.executable,
+                    base_latency=args.base_latency,
+                    per_kb_latency=args.per_kb_latency,
+                )
+            )
+        os.chmod(gemini, os.stat(gemini).st_mode | stat.S_IEXEC)
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+
+        template = {"prompt": "Write a commit message."}
+        settings = {
+            "threshold_bytes": 1,
+            "chunk_bytes": 65536,
+            "max_workers": args.workers,
+        }
+
+        print(f"{'size_kb':>8} {'direct_s':>10} {'map_reduce_s':>13}")
+        for size_kb in [int(s) for s in args.sizes.split(",")]:
+            diff = make_diff(size_kb)
+            direct, direct_err = time_call(
+                lambda: generate_commit_message(
+                    build_prompt(template, diff, settings={"threshold_bytes": 0}),
+                    use_cache=False,
+                )
+            )
+            mapped, mapped_err = time_call(
+                lambda: generate_commit_message(
+                    build_prompt(template, diff, use_cache=False, settings=settings),
+                    use_cache=False,
+                )
+            )
+            print(
+                f"{size_kb:>8} "
+                f"{direct_err or f'{direct:.2f}':>10} "
+                f"{mapped_err or f'{mapped:.2f}':>13}"
+            )
+
+
+if __name__ == "__main__":
+    main()
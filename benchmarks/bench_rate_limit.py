@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# Runs several gemmit processes at once against a fake API that enforces a
+# quota, with and without the shared rate limiter, and compares how many
+# requests were refused with 429 and how long the whole batch took.
+#
+# Each process generates --messages messages through the http backend, with
+# its own ~/.gemmit in a temporary HOME that all of them share.
+#
+#   python benchmarks/bench_rate_limit.py [--processes 8] [--messages 3] [--quota 4]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+WORKER = """
+import sys
+from gemmit.core.ai import generate_commit_message
+for i in range({messages}):
+    generate_commit_message(f"prompt {{sys.argv[1]}} {{i}}", use_cache=False)
+"""
+
+
+def make_api(quota, stats):
+    """Returns a handler that allows quota requests per second, refusing the rest."""
+    lock = threading.Lock()
+    bucket = {"tokens": quota, "updated": time.monotonic()}
+
+    class QuotaApi(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            while self.rfile.readline().strip() != b"0":
+                pass
+            self.rfile.readline()
+            with lock:
+                now = time.monotonic()
+                bucket["tokens"] = min(
+                    quota, bucket["tokens"] + (now - bucket["updated"]) * quota
+                )
+                bucket["updated"] = now
+                allowed = bucket["tokens"] >= 1
+                if allowed:
+                    bucket["tokens"] -= 1
+                    stats["ok"] += 1
+                else:
+                    stats["429"] += 1
+            if allowed:
+                payload = (
+                    b'data: {"candidates": [{"content": {"parts": '
+                    b'[{"text": "feat: Benchmark"}]}}]}\r\n\r\n'
+                )
+                self.send_response(200)
+            else:
+                payload = b'{"error": {"message": "Quota exceeded"}}'
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return QuotaApi
+
+
+def run_batch(args, limiter):
+    stats = {"ok": 0, "429": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_api(args.quota, stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as home:
+        os.makedirs(os.path.join(home, ".gemmit"))
+        with open(os.path.join(ROOT, "gemmit", "config.json")) as f:
+            config = json.load(f)
+        config["backend"] = "http"
+        config["http_backend"] = {"base_url": f"http://127.0.0.1:{server.server_port}"}
+        # Configured a little under the quota, as one would for a real one.
+        config["rate_limit"] = {
+            "enabled": limiter,
+            "requests_per_minute": int(args.quota * 60 * 0.95),
+            "burst": max(1, args.quota - 1),
+        }
+        config["retry"] = dict(config.get("retry", {}), max_attempts=10)
+        with open(os.path.join(home, ".gemmit", "config.json"), "w") as f:
+            json.dump(config, f)
+
+        env = dict(os.environ, HOME=home, PYTHONPATH=ROOT, GEMINI_API_KEY="benchmark")
+        code = WORKER.format(messages=args.messages)
+        start = time.perf_counter()
+        workers = [
+            subprocess.Popen(
+                [sys.executable, "-c", code, str(i)],
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            for i in range(args.processes)
+        ]
+        failed = sum(1 for worker in workers if worker.wait())
+        elapsed = time.perf_counter() - start
+    server.shutdown()
+    return elapsed, stats, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark concurrent gemmit processes against a shared quota."
+    )
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=3)
+    parser.add_argument("--quota", type=int, default=4, help="requests per second")
+    args = parser.parse_args()
+
+    total = args.processes * args.messages
+    print(f"{total} messages, quota {args.quota}/s (ideal {total / args.quota:.1f}s)")
+    print(f"{'limiter':>8} {'total_s':>8} {'msgs/s':>7} {'429s':>5} {'failed':>7}")
+    for limiter in (False, True):
+        elapsed, stats, failed = run_batch(args, limiter)
+        print(
+            f"{'on' if limiter else 'off':>8} {elapsed:>8.2f} "
+            f"{stats['ok'] / elapsed:>7.2f} {stats['429']:>5} {failed:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
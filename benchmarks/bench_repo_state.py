@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Compares git process count and wall time of collecting repository state
+# with one git call per question against a single RepoState snapshot.
+#
+#   python benchmarks/bench_repo_state.py [--files 2000] [--runs 20]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from gemmit.core import git  # noqa: E402
+
+
+def make_repo(path, files):
+    """Creates a repository with `files` committed files, all modified and staged."""
+    subprocess.run(["git", "init", "-q", path], check=True)
+    subprocess.run(
+        ["git", "remote", "add", "origin", "https://example.com/bench.git"],
+        cwd=path,
+        check=True,
+    )
+    for i in range(files):
+        with open(os.path.join(path, f"f{i}.txt"), "w") as f:
+            f.write(f"file {i}\n")
+    subprocess.run(["git", "add", "."], cwd=path, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=b", "-c", "user.email=b@b", "commit", "-qm", "init"],
+        cwd=path,
+        check=True,
+    )
+    for i in range(files):
+        with open(os.path.join(path, f"f{i}.txt"), "a") as f:
+            f.write("changed\n")
+    subprocess.run(["git", "add", "."], cwd=path, check=True)
+
+
+def per_question(cwd):
+    """The calls gemmit made before RepoState: one git process per question."""
+    git.has_staged_changes(cwd)
+    git.get_staged_numstat(cwd)
+    git.get_current_branch(cwd)
+    git.get_remote_url(cwd)
+
+
+def snapshot(cwd):
+    state = git.RepoState.collect(cwd)
+    state.branch
+    state.remote_url
+
+
+def measure(fn, cwd, runs):
+    """Returns (processes per run, median seconds)."""
+    spawned = []
+    original = subprocess.Popen.__init__
+
+    def counting_init(self, *args, **kwargs):
+        spawned.append(args[0] if args else kwargs.get("args"))
+        original(self, *args, **kwargs)
+
+    subprocess.Popen.__init__ = counting_init
+    try:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            fn(cwd)
+            times.append(time.perf_counter() - start)
+    finally:
+        subprocess.Popen.__init__ = original
+    return len(spawned) // runs, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark per-question git calls against a RepoState snapshot."
+    )
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as repo:
+        make_repo(repo, args.files)
+        print(f"{'mode':>14} {'processes':>10} {'median_ms':>10}")
+        for name, fn in [("per-question", per_question), ("RepoState", snapshot)]:
+            processes, seconds = measure(fn, repo, args.runs)
+            print(f"{name:>14} {processes:>10} {seconds * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Benchmarks `gemmit -y` end to end with and without prespawning gemini.
+#
+# The fake `gemini` takes a while to boot before it reads its prompt, like
+# the real Node CLI, so prespawning it hides that time behind git's work.
+#
+#   python benchmarks/bench_startup.py [--files 200] [--boot 0.5] [--runs 3]
+
+import argparse
+import json
+import os
+import stat
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+FAKE_GEMINI = """#!{python}
+import sys, time
+time.sleep({boot})
+sys.stdin.read()
+print("feat: Benchmark commit message")
+"""
+
+
+def git(repo, *args):
+    subprocess.run(["git"] + list(args), cwd=repo, check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark gemmit -y with and without prespawning gemini."
+    )
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--boot", type=float, default=0.5)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = os.path.join(tmp, "bin")
+        home = os.path.join(tmp, "home")
+        repo = os.path.join(tmp, "repo")
+        for path in (bin_dir, os.path.join(home, ".gemmit"), repo):
+            os.makedirs(path)
+        gemini = os.path.join(bin_dir, "gemini")
+        with open(gemini, "w") as f:
+            f.write(FAKE_GEMINI.format(python=sys.executable, boot=args.boot))
+        os.chmod(gemini, os.stat(gemini).st_mode | stat.S_IEXEC)
+
+        env = dict(os.environ)
+        env.update(
+            HOME=home,
+            PATH=bin_dir + os.pathsep + env["PATH"],
+            PYTHONPATH=REPO_ROOT,
+            GIT_AUTHOR_NAME="b",
+            GIT_AUTHOR_EMAIL="b@b",
+            GIT_COMMITTER_NAME="b",
+            GIT_COMMITTER_EMAIL="b@b",
+        )
+        git(repo, "init", "-q")
+        for i in range(args.files):
+            with open(os.path.join(repo, f"f{i}.py"), "w") as f:
+                f.write(f"value = {i}\n" * 20)
+        git(repo, "add", ".")
+        git(repo, "-c", "user.name=b", "-c", "user.email=b@b", "commit", "-qm", "init")
+        for i in range(args.files):
+            with open(os.path.join(repo, f"f{i}.py"), "a") as f:
+                f.write("changed = True\n")
+
+        # Create the default config, then switch prespawning per mode.
+        subprocess.run(
+            [sys.executable, "-m", "gemmit.gemmit", "--set-default", "kernel"],
+            cwd=repo,
+            env=env,
+            capture_output=True,
+        )
+        config_file = os.path.join(home, ".gemmit", "config.json")
+
+        print(f"{'prespawn':>9} {'median_s':>9}")
+        for prespawn in (False, True):
+            with open(config_file) as f:
+                config = json.load(f)
+            config["startup"] = {"prespawn_gemini": prespawn}
+            with open(config_file, "w") as f:
+                json.dump(config, f)
+
+            times = []
+            for _ in range(args.runs):
+                git(repo, "add", ".")
+                start = time.perf_counter()
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "gemmit.gemmit",
+                        "kernel",
+                        "-y",
+                        "--no-cache",
+                    ],
+                    cwd=repo,
+                    env=env,
+                    check=True,
+                    capture_output=True,
+                )
+                times.append(time.perf_counter() - start)
+                git(repo, "reset", "-q", "--soft", "HEAD~1")
+            print(f"{str(prespawn):>9} {statistics.median(times):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Shared fixtures for the benchmark suite: a configurable fake `gemini`
+# executable and synthetic repositories with staged diffs of a given size.
+
+import os
+import stat
+import subprocess
+import sys
+
+# Reads the prompt from stdin (or argv), waits, then fails or answers.
+FAKE_GEMINI = """#!{python}
+import random, sys, time
+time.sleep({boot})
+prompt = sys.argv[-1] if len(sys.argv) > 1 else sys.stdin.read()
+time.sleep({latency} + {per_kb_latency} * len(prompt) / 1024)
+if random.random() < {failure_rate}:
+    sys.stderr.write("503 Service Unavailable\\n")
+    sys.exit(1)
+print("feat: Benchmark commit message", flush=True)
+print(flush=True)
+for i in range({lines}):
+    print("- " + ("change %d " % i).ljust({line_bytes} - 2, "."), flush=True)
+"""
+
+SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+# Git identity for the repositories and the commits gemmit makes in them.
+GIT_IDENTITY = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+}
+
+
+def install_fake_gemini(
+    bin_dir,
+    latency=0.2,
+    boot=0.0,
+    per_kb_latency=0.0,
+    lines=8,
+    line_bytes=60,
+    failure_rate=0.0,
+):
+    """Writes a fake `gemini` into bin_dir and returns its path.
+
+    It takes boot seconds to start, latency seconds (plus per_kb_latency
+    per KB of prompt) to answer, and prints a message of lines body lines
+    of line_bytes each. A failure_rate share of calls fails with a 503,
+    which gemmit retries.
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, "gemini")
+    with open(path, "w") as f:
+        f.write(
+            FAKE_GEMINI.format(
+                python=sys.executable,
+                boot=boot,
+                latency=latency,
+                per_kb_latency=per_kb_latency,
+                failure_rate=failure_rate,
+                lines=lines,
+                line_bytes=max(line_bytes, 3),
+            )
+        )
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def parse_size(text):
+    """Parses sizes such as 512, 1K, 10M or 1G into bytes."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    for unit in ("G", "M", "K"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return str(size)
+
+
+def git(repo, *args, env=None):
+    subprocess.run(
+        ["git"] + list(args), cwd=repo, check=True, capture_output=True, env=env
+    )
+
+
+def make_repo(path, diff_bytes, max_files=200, file_bytes=64 * 1024):
+    """Creates a repository at path whose staged diff adds about diff_bytes.
+
+    The change is spread over files of about file_bytes each, at most
+    max_files of them, all committed once before being modified.
+    """
+    env = dict(os.environ, **GIT_IDENTITY)
+    os.makedirs(path, exist_ok=True)
+    git(path, "init", "-q", env=env)
+    files = max(1, min(max_files, diff_bytes // file_bytes))
+    for i in range(files):
+        with open(os.path.join(path, f"src{i}.py"), "w") as f:
+            f.write(f"# module {i}\n")
+    git(path, "add", ".", env=env)
+    git(path, "commit", "-qm", "init", env=env)
+
+    per_file = diff_bytes // files
+    line = "value = 'generated benchmark content'  # padding\n"
+    block = line * (64 * 1024 // len(line))
+    for i in range(files):
+        with open(os.path.join(path, f"src{i}.py"), "a") as f:
+            remaining = per_file
+            while remaining > 0:
+                piece = block[: (remaining // len(line) + 1) * len(line)]
+                f.write(piece)
+                remaining -= len(piece)
+    git(path, "add", ".", env=env)
+    return path
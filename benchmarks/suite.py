@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# Benchmark suite: measures `gemmit -y` end to end and phase by phase on
+# synthetic repositories, against a fake `gemini` on PATH, and writes the
+# results as JSON so that revisions can be compared.
+#
+# For each diff size, a repository with that much staged change is created in
+# a temporary directory, with its own HOME and ~/.gemmit. Each run is a fresh
+# Python process, which records its own peak RSS and the subprocesses it
+# started (by program). The shared rate limiter and the message cache are
+# off, so that every run does the same work.
+#
+#   python benchmarks/suite.py [--sizes 1K,100K,1M,10M] [--runs 3] \
+#       [--latency 0.2] [--failure-rate 0] [--output results.json] \
+#       [--compare baseline.json [--max-regression 10]]
+#
+# Sizes of hundreds of MB (such as 256M) work, but take a while to set up.
+
+import argparse
+import atexit
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import (  # noqa: E402
+    GIT_IDENTITY,
+    format_size,
+    git,
+    install_fake_gemini,
+    make_repo,
+    parse_size,
+)
+
+PHASES = ["config_load", "repo_state", "staged_diff", "prompt", "ai_call", "commit"]
+
+
+# --- Driver: runs inside each measured process. ---
+
+
+class ProcessStats:
+    """Counts the subprocesses this process starts, by program."""
+
+    def __init__(self):
+        self.spawned = {}
+        original = subprocess.Popen.__init__
+        stats = self
+
+        def counting_init(popen, *args, **kwargs):
+            argv = args[0] if args else kwargs.get("args")
+            program = argv if isinstance(argv, str) else argv[0]
+            name = os.path.basename(program)
+            stats.spawned[name] = stats.spawned.get(name, 0) + 1
+            original(popen, *args, **kwargs)
+
+        subprocess.Popen.__init__ = counting_init
+
+    def total(self):
+        return sum(self.spawned.values())
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def drive_e2e(args):
+    """Runs `gemmit <template> -y --no-cache`, recording stats when it exits."""
+    stats = ProcessStats()
+
+    def dump():
+        with open(args.stats_file, "w") as f:
+            json.dump({"subprocesses": stats.spawned, "peak_rss_kb": peak_rss_kb()}, f)
+
+    atexit.register(dump)
+    from gemmit.gemmit import main
+
+    sys.argv = ["gemmit", args.template, "-y", "--no-cache"]
+    main()
+
+
+def drive_phases(args):
+    """Runs the steps of `gemmit -y` one by one, timing each."""
+    stats = ProcessStats()
+    phases = {}
+
+    def phase(name, fn):
+        spawned = stats.total()
+        start = time.perf_counter()
+        result = fn()
+        phases[name] = {
+            "seconds": time.perf_counter() - start,
+            "subprocesses": stats.total() - spawned,
+            "peak_rss_kb": peak_rss_kb(),
+        }
+        return result
+
+    from gemmit.core.ai import generate_commit_message
+    from gemmit.core.compact import get_diff_level
+    from gemmit.core.config import get_template, load_config
+    from gemmit.core.git import RepoState, get_staged_diff
+    from gemmit.core.prompt import build_staged_prompt
+
+    def load():
+        load_config()
+        return get_template(args.template)
+
+    template = phase("config_load", load)
+    state = phase("repo_state", RepoState.collect)
+    phase("staged_diff", lambda: get_staged_diff(get_diff_level(template)))
+    prompt = phase(
+        "prompt", lambda: build_staged_prompt(template, state, use_cache=False)
+    )
+    message = phase("ai_call", lambda: generate_commit_message(prompt, use_cache=False))
+    phase(
+        "commit",
+        lambda: subprocess.run(["git", "commit", "-q", "-m", message], check=True),
+    )
+    with open(args.stats_file, "w") as f:
+        json.dump({"phases": phases}, f)
+
+
+# --- Orchestrator. ---
+
+
+def revision():
+    """Returns the benchmarked revision of gemmit, marked if the tree is dirty."""
+    try:
+        head = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return head + ("-dirty" if dirty else "")
+
+
+def write_config(home):
+    with open(os.path.join(ROOT, "gemmit", "config.json")) as f:
+        config = json.load(f)
+    config["rate_limit"] = {"enabled": False}
+    config["timings"] = {"enabled": False}
+    os.makedirs(os.path.join(home, ".gemmit"), exist_ok=True)
+    with open(os.path.join(home, ".gemmit", "config.json"), "w") as f:
+        json.dump(config, f)
+
+
+def run_driver(mode, repo, env, template):
+    """Runs one measured process; returns (seconds, stats) or (seconds, None) on failure."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        stats_file = f.name
+    head = subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=repo, capture_output=True, text=True
+    ).stdout.strip()
+    try:
+        start = time.perf_counter()
+        result = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--driver",
+                mode,
+                "--stats-file",
+                stats_file,
+                "--template",
+                template,
+            ],
+            cwd=repo,
+            env=env,
+            capture_output=True,
+        )
+        elapsed = time.perf_counter() - start
+        with open(stats_file) as f:
+            stats = json.load(f) if result.returncode == 0 else None
+    except (OSError, ValueError):
+        stats = None
+    finally:
+        os.remove(stats_file)
+        # Undo the commit, keeping the changes staged for the next run.
+        git(repo, "reset", "-q", "--soft", head)
+    return elapsed, stats
+
+
+def measure_size(size, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = os.path.join(tmp, "bin")
+        home = os.path.join(tmp, "home")
+        repo = os.path.join(tmp, "repo")
+        install_fake_gemini(
+            bin_dir,
+            latency=args.latency,
+            boot=args.boot,
+            per_kb_latency=args.per_kb_latency,
+            lines=args.lines,
+            line_bytes=args.line_bytes,
+            failure_rate=args.failure_rate,
+        )
+        write_config(home)
+        make_repo(repo, size)
+        env = dict(os.environ, **GIT_IDENTITY)
+        env.update(
+            HOME=home,
+            PATH=bin_dir + os.pathsep + env["PATH"],
+            PYTHONPATH=ROOT,
+        )
+
+        e2e_times, rss, spawned, failed = [], [], {}, 0
+        phase_runs = []
+        for _ in range(args.runs):
+            seconds, stats = run_driver("e2e", repo, env, args.template)
+            if stats is None:
+                failed += 1
+                continue
+            e2e_times.append(seconds)
+            rss.append(stats["peak_rss_kb"])
+            spawned = stats["subprocesses"]
+            _, stats = run_driver("phases", repo, env, args.template)
+            if stats is not None:
+                phase_runs.append(stats["phases"])
+
+    result = {"diff_bytes": size, "failed_runs": failed}
+    if e2e_times:
+        result["e2e"] = {
+            "median_s": statistics.median(e2e_times),
+            "min_s": min(e2e_times),
+            "runs_s": e2e_times,
+            "peak_rss_kb": max(rss),
+            "subprocesses": spawned,
+        }
+    if phase_runs:
+        result["phases"] = {
+            name: {
+                "median_s": statistics.median(
+                    run[name]["seconds"] for run in phase_runs
+                ),
+                "subprocesses": phase_runs[-1][name]["subprocesses"],
+                "peak_rss_kb": max(run[name]["peak_rss_kb"] for run in phase_runs),
+            }
+            for name in PHASES
+        }
+    return result
+
+
+def print_results(results):
+    print(
+        f"{'size':>6} {'e2e_s':>7} {'rss_mb':>7} {'procs':>6}  "
+        + " ".join(f"{name:>11}" for name in PHASES)
+    )
+    for name, size in results["sizes"].items():
+        e2e = size.get("e2e")
+        if not e2e:
+            print(f"{name:>6} {'failed':>7}")
+            continue
+        phases = size.get("phases", {})
+        print(
+            f"{name:>6} {e2e['median_s']:>7.3f} {e2e['peak_rss_kb'] / 1024:>7.1f} "
+            f"{sum(e2e['subprocesses'].values()):>6}  "
+            + " ".join(
+                f"{phases[p]['median_s']:>11.3f}" if p in phases else f"{'-':>11}"
+                for p in PHASES
+            )
+        )
+
+
+def compare(results, baseline, max_regression):
+    """Prints the change of every median against baseline; returns the regressions."""
+    regressions = []
+    print(f"\nAgainst {baseline.get('revision', 'baseline')}:")
+    print(f"{'size':>6} {'metric':>12} {'before':>9} {'after':>9} {'change':>8}")
+    for name, size in results["sizes"].items():
+        old = baseline.get("sizes", {}).get(name)
+        if not old or "e2e" not in size or "e2e" not in old:
+            continue
+        metrics = [("e2e", old["e2e"]["median_s"], size["e2e"]["median_s"])]
+        metrics.append(
+            ("peak_rss_kb", old["e2e"]["peak_rss_kb"], size["e2e"]["peak_rss_kb"])
+        )
+        for phase in PHASES:
+            if phase in size.get("phases", {}) and phase in old.get("phases", {}):
+                metrics.append(
+                    (
+                        phase,
+                        old["phases"][phase]["median_s"],
+                        size["phases"][phase]["median_s"],
+                    )
+                )
+        for metric, before, after in metrics:
+            change = (after - before) / before * 100 if before else 0.0
+            flag = ""
+            if max_regression is not None and change > max_regression:
+                flag = " !"
+                regressions.append((name, metric, change))
+            print(
+                f"{name:>6} {metric:>12} {before:>9.3f} {after:>9.3f} "
+                f"{change:>+7.1f}%{flag}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark gemmit -y end to end and by phase."
+    )
+    parser.add_argument(
+        "--sizes", default="1K,100K,1M,10M", help="Staged diff sizes, such as 1K,10M."
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--template", default="kernel")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--boot", type=float, default=0.0)
+    parser.add_argument("--per-kb-latency", type=float, default=0.0)
+    parser.add_argument("--lines", type=int, default=8)
+    parser.add_argument("--line-bytes", type=int, default=60)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare with the results in this file.")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        help="Exit with status 1 if a median grew by more than this percentage.",
+    )
+    parser.add_argument("--driver", choices=["e2e", "phases"], help=argparse.SUPPRESS)
+    parser.add_argument("--stats-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.driver == "e2e":
+        drive_e2e(args)
+        return
+    if args.driver == "phases":
+        drive_phases(args)
+        return
+
+    results = {
+        "revision": revision(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            key: getattr(args, key)
+            for key in (
+                "runs",
+                "template",
+                "latency",
+                "boot",
+                "per_kb_latency",
+                "lines",
+                "line_bytes",
+                "failure_rate",
+            )
+        },
+        "sizes": {},
+    }
+    for text in args.sizes.split(","):
+        size = parse_size(text)
+        print(f"Measuring {format_size(size)}...", file=sys.stderr)
+        results["sizes"][format_size(size)] = measure_size(size, args)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# This module contains the logic for the `batch` command.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from ..core import batch
+from ..core.backend import warm_up_backend
+from ..core.config import load_config
+from ..utils.errors import handle_error
+
+
+def _collect_repositories(paths, depth):
+    """Returns the repositories named by paths, or found under them, without repeats."""
+    repos = []
+    for path in paths:
+        if not os.path.isdir(path):
+            handle_error(f"Not a directory: {path}")
+        for repo in batch.discover_repositories(path, depth):
+            if repo not in repos:
+                repos.append(repo)
+    return repos
+
+
+def _describe(result):
+    if result["status"] == "committed":
+        detail = f"{result['commit'][:10]} {result['subject']}"
+        if result.get("pushed"):
+            detail += " (pushed)"
+        return detail
+    if result["status"] == "failed":
+        return f"failed at {result.get('step', 'start')}: {result.get('error', '')}"
+    return result["status"]
+
+
+def run(args):
+    """Generates messages and commits the staged changes of many repositories."""
+    parser = argparse.ArgumentParser(
+        prog="gemmit batch",
+        description=(
+            "Generate messages and commit in many repositories in parallel. "
+            "Directories that are not repositories are searched for them."
+        ),
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        metavar="PATH",
+        help="Repositories, or directories containing them.",
+    )
+    parser.add_argument(
+        "-t", "--template", help="The template to use (default: the default template)."
+    )
+    parser.add_argument(
+        "-a",
+        "--add",
+        action="store_true",
+        help="Stage all tracked files in each repository first.",
+    )
+    parser.add_argument(
+        "-p",
+        "--push",
+        action="store_true",
+        help="Push each repository after committing.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="N",
+        help="How many repositories to handle at the same time.",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=batch.DEFAULT_DISCOVERY_DEPTH,
+        help="How deep to search directories for repositories.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Bypass the cache of generated messages.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="FILE",
+        help="Write the JSON summary to FILE instead of stdout.",
+    )
+    args = parser.parse_args(args)
+
+    template_name = args.template or load_config().get("default_template")
+    if not template_name:
+        handle_error(
+            "No template specified and no default template set.",
+            "Usage: gemmit batch -t <template> <path>... or gemmit --set-default <template>",
+        )
+    repos = _collect_repositories(args.paths, args.depth)
+    if not repos:
+        handle_error("No git repositories found.")
+
+    max_workers = args.jobs or batch.get_batch_settings().get(
+        "max_workers", batch.DEFAULT_MAX_WORKERS
+    )
+    print(
+        f"Committing in {len(repos)} repositories, {max_workers} at a time...",
+        file=sys.stderr,
+    )
+    # A prespawned gemini only serves the repository it was started in, so
+    # only the first one benefits; an HTTP backend's connections serve all.
+    warm_up_backend(repos[0])
+
+    done = []
+
+    def report(result):
+        done.append(result)
+        print(
+            f"[{len(done)}/{len(repos)}] {result['repo']}: {_describe(result)} "
+            f"({result['total_seconds']:.1f}s)",
+            file=sys.stderr,
+            flush=True,
+        )
+
+    start = time.monotonic()
+    results = batch.run_batch(
+        repos,
+        template_name,
+        add=args.add,
+        push=args.push,
+        use_cache=args.use_cache,
+        max_workers=max_workers,
+        on_result=report,
+    )
+    summary = batch.summarize(results, time.monotonic() - start)
+
+    text = json.dumps(summary, indent=2)
+    if args.output:
+        try:
+            with open(args.output, "w") as f:
+                f.write(text + "\n")
+        except OSError as e:
+            handle_error(f"writing the summary to {args.output}", e)
+    else:
+        print(text)
+
+    counts = summary["counts"]
+    print(
+        ", ".join(f"{count} {status}" for status, count in sorted(counts.items())),
+        file=sys.stderr,
+    )
+    if counts.get("failed") or counts.get("cancelled"):
+        sys.exit(1)
@@ -0,0 +1,56 @@
+# This module contains the logic for the `daemon` command.
+
+import argparse
+import signal
+import sys
+
+from ..core import daemon
+from ..utils.errors import handle_error
+
+
+def run(args):
+    """Runs the gemmit daemon in the foreground, or stops or queries a running one."""
+    parser = argparse.ArgumentParser(
+        prog="gemmit daemon",
+        description="Keep gemmit loaded so that commits skip its start-up cost.",
+    )
+    parser.add_argument("--stop", action="store_true", help="Stop the running daemon.")
+    parser.add_argument(
+        "--status", action="store_true", help="Show whether the daemon is running."
+    )
+    args = parser.parse_args(args)
+
+    if args.stop:
+        if daemon.stop():
+            print("Daemon stopped.")
+        else:
+            print("No daemon is running.")
+        return
+
+    if args.status:
+        status = daemon.ping()
+        if status is None:
+            print("No daemon is running.")
+            sys.exit(1)
+        print(
+            f"Daemon running (pid {status['pid']}, {status['queued']} queued request(s))."
+        )
+        return
+
+    settings = daemon.get_daemon_settings()
+    server = daemon.Daemon(
+        workers=settings.get("workers", daemon.DEFAULT_WORKERS),
+        queue_size=settings.get("queue_size", daemon.DEFAULT_QUEUE_SIZE),
+    )
+    try:
+        if not server.bind():
+            handle_error(f"A daemon is already listening on {server.path}.")
+    except OSError as e:
+        handle_error(f"binding the daemon socket at {server.path}", e)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    print(f"gemmit daemon listening on {server.path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -3,17 +3,22 @@
 import sys
 import subprocess
 import tempfile
+import threading
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from rich.console import Console
 
-from ..core.ai import generate_commit_message
+from ..core.ai import generate_commit_message, open_session
 from ..core.config import get_template, load_config
-from ..core.git import get_staged_diff
+from ..core.git import RepoState
+from ..core.prompt import build_staged_prompt
+from ..core.prefetch import DEFAULT_MAX_CANDIDATES, Prefetcher
 from ..utils.errors import handle_error
+from ..utils.trace import span
 
 
-def run(args):
-    """Generates a commit message and provides options to accept, edit, or regenerate."""
+def _build_prompt(args, state, use_cache=True):
+    """Builds the prompt from the template in args (or the default) and the staged diff."""
     if not args:
         config = load_config()
         template_name = config.get("default_template")
@@ -22,58 +27,197 @@ def run(args):
                 "No template specified and no default template set.",
                 "Usage: gemmit add <template> or gemmit --set-default <template>",
             )
-            return
+            return None
     else:
         template_name = args[0]
 
     template = get_template(template_name)
-    diff = get_staged_diff()
-
-    if not diff:
+    if not state.has_staged_changes:
         print("No staged changes found.")
         sys.exit(0)
+    return build_staged_prompt(template, state, use_cache=use_cache)
+
+
+def _print_line(console, highlight_color, line):
+    """Prints a line of a commit message as is, without rich markup."""
+    console.print(line, style=highlight_color, markup=False, highlight=False)
+
+
+def _stream_message(console, highlight_color, prompt, **kwargs):
+    """Generates a message, printing each line as soon as the model writes it."""
+    status = console.status("Generating commit message...")
+    status.start()
+
+    def show(line):
+        status.stop()
+        _print_line(console, highlight_color, line)
+
+    try:
+        return generate_commit_message(prompt, on_line=show, **kwargs)
+    finally:
+        status.stop()
+
+
+def run(args, use_cache=True, state=None, first_message=None):
+    """Generates a commit message and provides options to accept, edit, or regenerate.
+
+    A first_message prepared beforehand (by `gemmit watch`) is shown first
+    instead of generating one.
+    """
+    with span("prompt"):
+        state = state or RepoState.collect()
+        prompt = _build_prompt(args, state, use_cache)
+    if prompt is None:
+        return
 
     console = Console()
     commit_message = ""
+    regenerate = False
 
-    while True:
-        prompt = template.get("prompt", "") + "\n\n" + diff
-        commit_message = generate_commit_message(prompt)
+    config = load_config()
+    highlight_color = config.get("highlight_color", "green")
+    # Regenerated messages are follow-ups in one session, so that a backend
+    # that keeps the conversation does not receive the whole diff again.
+    session = open_session(prompt, state.cwd)
+    prefetch = config.get("prefetch", {})
+    prefetcher = None
+    if prefetch.get("enabled", False):
+        prefetcher = Prefetcher(
+            prompt, prefetch.get("max_candidates", DEFAULT_MAX_CANDIDATES), session
+        )
 
-        config = load_config()
-        highlight_color = config.get("highlight_color", "green")
+    try:
+        while True:
+            console.print(
+                f"[{highlight_color}]--- Generated Commit Message ---[/{highlight_color}]\n"
+            )
+            with span("message", regenerate=regenerate) as traced:
+                commit_message = (
+                    prefetcher.take() if regenerate and prefetcher else None
+                )
+                traced.set(prefetched=commit_message is not None)
+                if not regenerate and first_message:
+                    commit_message = first_message
+                    traced.set(ready=True)
+                if commit_message is None:
+                    # A regenerated message must come from the model, not the cache.
+                    commit_message = _stream_message(
+                        console,
+                        highlight_color,
+                        prompt,
+                        use_cache=use_cache,
+                        refresh_cache=regenerate,
+                        session=session,
+                    )
+                else:
+                    for line in commit_message.split("\n"):
+                        _print_line(console, highlight_color, line)
+            console.print()
+            console.print(
+                f"[{highlight_color}]--------------------------------[/{highlight_color}]\n"
+            )
 
-        console.print(
-            f"[{highlight_color}]--- Generated Commit Message ---[/{highlight_color}]\n"
-        )
-        console.print(f"[{highlight_color}]{commit_message}[/{highlight_color}]\n")
-        console.print(
-            f"[{highlight_color}]--------------------------------[/{highlight_color}]\n"
+            # Once the user has asked for another message, let the next one
+            # generate while they read this one. Until then, they are likely
+            # to take the first, and a candidate would only spend quota.
+            if prefetcher and regenerate:
+                prefetcher.start()
+
+            with span("user.input"):
+                answer = console.input(
+                    "Use this message? [Y]es, [E]dit, [R]egenerate, [N]o: "
+                ).lower()
+
+            if answer in ["y", "yes", ""]:
+                break
+            elif answer in ["e", "edit"]:
+                if prefetcher:
+                    prefetcher.cancel()
+                editor = os.getenv("EDITOR", "vim")
+                with tempfile.NamedTemporaryFile(
+                    mode="w+", delete=False, suffix=".md"
+                ) as tmpfile:
+                    tmpfile.write(commit_message)
+                    tmpfile.flush()
+                    with span("editor"):
+                        subprocess.run(editor.split() + [tmpfile.name])
+                    tmpfile.seek(0)
+                    commit_message = tmpfile.read().strip()
+                break
+            elif answer in ["r", "regenerate"]:
+                console.print("[yellow]Regenerating...[/yellow]")
+                regenerate = True
+                continue
+            elif answer in ["n", "no"]:
+                console.print("[red]Commit aborted.[/red]")
+                sys.exit(1)
+    finally:
+        if prefetcher:
+            prefetcher.cancel()
+        session.close()
+
+    # Return the final commit message.
+    return commit_message
+
+
+def run_candidates(args, count, use_cache=True, state=None):
+    """Generates several candidate messages in parallel and lets the user pick one."""
+    state = state or RepoState.collect()
+    prompt = _build_prompt(args, state, use_cache)
+    if prompt is None:
+        return
+
+    config = load_config()
+    highlight_color = config.get("highlight_color", "green")
+    max_workers = config.get("candidates", {}).get("max_workers", 4)
+
+    console = Console()
+    console.print(f"[yellow]Generating {count} candidates...[/yellow]")
+
+    # Only the first candidate may be served from the cache; the others
+    # must be fresh, or they would all be the same message.
+    cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(count, max_workers)))
+    futures = [
+        executor.submit(
+            generate_commit_message,
+            prompt,
+            use_cache=use_cache and i == 0,
+            cancel=cancel,
+            cwd=state.cwd,
         )
+        for i in range(count)
+    ]
 
+    candidates = []
+    try:
+        for future in as_completed(futures):
+            try:
+                commit_message = future.result()
+            except SystemExit:
+                # The error has already been reported; keep the other candidates.
+                continue
+            candidates.append(commit_message)
+            console.print(
+                f"[{highlight_color}]--- Candidate {len(candidates)} ---[/{highlight_color}]\n"
+            )
+            for line in commit_message.split("\n"):
+                _print_line(console, highlight_color, line)
+            console.print()
+    finally:
+        cancel.set()
+        executor.shutdown(wait=True)
+
+    if not candidates:
+        handle_error("All candidate generations failed.")
+        return
+
+    while True:
         answer = console.input(
-            "Use this message? [Y]es, [E]dit, [R]egenerate, [N]o: "
+            f"Use which message? [1-{len(candidates)}], [N]o: "
         ).lower()
-
-        if answer in ["y", "yes", ""]:
-            break
-        elif answer in ["e", "edit"]:
-            editor = os.getenv("EDITOR", "vim")
-            with tempfile.NamedTemporaryFile(
-                mode="w+", delete=False, suffix=".md"
-            ) as tmpfile:
-                tmpfile.write(commit_message)
-                tmpfile.flush()
-                subprocess.run(editor.split() + [tmpfile.name])
-                tmpfile.seek(0)
-                commit_message = tmpfile.read().strip()
-            break
-        elif answer in ["r", "regenerate"]:
-            console.print("[yellow]Regenerating...[/yellow]")
-            continue
-        elif answer in ["n", "no"]:
+        if answer in ["n", "no"]:
             console.print("[red]Commit aborted.[/red]")
             sys.exit(1)
-
-    # Return the final commit message.
-    return commit_message
+        if answer.isdigit() and 1 <= int(answer) <= len(candidates):
+            return candidates[int(answer) - 1]
@@ -0,0 +1,129 @@
+# This module contains the logic for the `reword` command.
+
+import argparse
+import subprocess
+import sys
+from rich.console import Console
+
+from ..core import reword
+from ..core.backend import warm_up_backend
+from ..core.compact import get_diff_level
+from ..core.config import get_template, load_config
+from ..utils.errors import handle_error
+from ..utils.trace import span
+
+
+def run(args):
+    """Regenerates the messages of a range of commits and rewrites the range."""
+    parser = argparse.ArgumentParser(
+        prog="gemmit reword",
+        description=(
+            "Regenerate the messages of a range of commits ending at HEAD, "
+            "such as main..HEAD or HEAD~5.."
+        ),
+    )
+    parser.add_argument("range", help="The commits to reword, such as main..HEAD.")
+    parser.add_argument(
+        "-t", "--template", help="The template to use (default: the default template)."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="N",
+        help="How many messages to generate at the same time.",
+    )
+    parser.add_argument(
+        "-y", "--yes", action="store_true", help="Rewrite without asking first."
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Show the new messages without rewriting anything.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Bypass the cache of generated messages.",
+    )
+    args = parser.parse_args(args)
+
+    config = load_config()
+    highlight_color = config.get("highlight_color", "green")
+    template_name = args.template or config.get("default_template")
+    if not template_name:
+        handle_error(
+            "No template specified and no default template set.",
+            "Usage: gemmit reword -t <template> <range> or gemmit --set-default <template>",
+        )
+    template = get_template(template_name)
+    head = subprocess.run(
+        ["git", "rev-parse", "-q", "--verify", "HEAD"], capture_output=True, text=True
+    ).stdout.strip()
+    if not head:
+        handle_error("There are no commits to reword.")
+    # Checked before generating anything, so that no quota is wasted.
+    tip = subprocess.run(
+        ["git", "rev-list", "--topo-order", "-n", "1", args.range, "--"],
+        capture_output=True,
+        text=True,
+    )
+    if tip.returncode:
+        handle_error(f"reading the commits of {args.range}", tip.stderr)
+    if not tip.stdout.strip():
+        print(f"No commits in {args.range}.")
+        return
+    if tip.stdout.strip() != head:
+        handle_error(
+            f"The range {args.range} does not end at HEAD.",
+            "Only the commits of the current branch, up to HEAD, can be reworded.",
+        )
+
+    max_workers = args.jobs or reword.get_reword_settings().get(
+        "max_workers", reword.DEFAULT_MAX_WORKERS
+    )
+    console = Console()
+    warm_up_backend()
+
+    def show(commit, message):
+        console.print(
+            f"{commit.sha[:10]} {commit.subject}",
+            style="dim",
+            markup=False,
+            highlight=False,
+        )
+        subject = message.split("\n", 1)[0]
+        console.print(
+            f"        {subject}", style=highlight_color, markup=False, highlight=False
+        )
+
+    with span("reword.generate"):
+        commits, messages = reword.generate_messages(
+            reword.iter_commits(args.range, get_diff_level(template)),
+            template,
+            use_cache=args.use_cache,
+            max_workers=max_workers,
+            on_message=show,
+        )
+    if args.dry_run:
+        return
+    if not messages:
+        print("No commits to reword: the range has only merges or empty commits.")
+        return
+
+    if not args.yes:
+        answer = console.input(
+            f"Rewrite {len(messages)} of {len(commits)} commit message(s)? [Y]es, [N]o: "
+        ).lower()
+        if answer not in ["y", "yes", ""]:
+            console.print("[red]Reword aborted.[/red]")
+            sys.exit(1)
+
+    rewritten = reword.rewrite(commits, messages)
+    reword.update_head(head, rewritten[head], args.range)
+    console.print(
+        f"[{highlight_color}]Reworded {len(messages)} commit(s); "
+        f"HEAD is now {rewritten[head][:10]} (was {head[:10]}).[/{highlight_color}]"
+    )
@@ -0,0 +1,51 @@
+# This module contains the logic for --split, which commits the staged changes
+# as several commits.
+
+import sys
+from rich.console import Console
+
+from ..core import split
+from ..core.config import get_template, load_config
+from ..core.git import get_staged_changes
+
+
+def run(template_name, state, yes=False, use_cache=True):
+    """Splits the staged changes into groups and commits each with its own message.
+
+    Without yes, the groups and their messages are shown for confirmation
+    first. Returns the hashes of the new commits.
+    """
+    config = load_config()
+    highlight_color = config.get("highlight_color", "green")
+    console = Console()
+
+    template = get_template(template_name)
+    groups = split.group_changes(get_staged_changes(state.cwd), state.numstat)
+    console.print(
+        f"[yellow]Generating {len(groups)} commit message(s) for: "
+        f"{', '.join(name for name, _ in groups)}...[/yellow]"
+    )
+    with console.status("Generating commit messages..."):
+        messages = split.generate_group_messages(template, state, groups, use_cache)
+
+    for i, ((name, changes), message) in enumerate(zip(groups, messages), 1):
+        console.print(
+            f"[{highlight_color}]--- Commit {i}/{len(groups)}: {name} "
+            f"({len(changes)} file(s)) ---[/{highlight_color}]\n"
+        )
+        console.print(message, style=highlight_color, markup=False, highlight=False)
+        console.print()
+
+    if not yes:
+        answer = console.input(
+            f"Create these {len(groups)} commits? [Y]es, [N]o: "
+        ).lower()
+        if answer not in ["y", "yes", ""]:
+            console.print("[red]Commit aborted.[/red]")
+            sys.exit(1)
+
+    commits = split.commit_groups(groups, messages, state.cwd)
+    for commit, message in zip(commits, messages):
+        subject = message.split("\n", 1)[0]
+        print(f"{commit[:10]} {subject}")
+    return commits
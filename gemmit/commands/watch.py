@@ -0,0 +1,160 @@
+# This module contains the logic for the `watch` command.
+
+import argparse
+import os
+import shlex
+import signal
+import stat
+import sys
+import threading
+import time
+
+from ..core import watch
+from ..core.config import load_config
+from ..core.git import get_index_path, run_git
+from ..utils.errors import handle_error
+
+HOOK_NAME = "prepare-commit-msg"
+# Identifies a hook installed by gemmit, which may be replaced.
+HOOK_MARKER = "# Installed by gemmit watch."
+
+
+def _install_hook():
+    """Installs a prepare-commit-msg hook that fills in the ready message."""
+    hooks = os.path.abspath(run_git(["rev-parse", "--git-path", "hooks"]))
+    path = os.path.join(hooks, HOOK_NAME)
+    if os.path.exists(path):
+        with open(path) as f:
+            if HOOK_MARKER not in f.read():
+                handle_error(
+                    f"A {HOOK_NAME} hook already exists at {path}.",
+                    "Remove it, or call `gemmit watch --prepare-commit-msg` from it.",
+                )
+    os.makedirs(hooks, exist_ok=True)
+    with open(path, "w") as f:
+        f.write(
+            "#!/bin/sh\n"
+            f"{HOOK_MARKER}\n"
+            f"exec {shlex.quote(sys.executable)} -m gemmit.gemmit watch "
+            '--prepare-commit-msg "$@"\n'
+        )
+    mode = os.stat(path).st_mode
+    os.chmod(path, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    print(f"Installed the {HOOK_NAME} hook at {path}.")
+
+
+def _prepare_commit_msg(hook_args):
+    """Puts the ready message, if still current, in front of git's commit template.
+
+    Runs as the prepare-commit-msg hook, so it never fails the commit. A
+    message given with -m or -F, a merge, a squash or an amend is kept.
+    """
+    path = hook_args[0]
+    source = hook_args[1] if len(hook_args) > 1 else ""
+    if source:
+        return
+    try:
+        message = watch.read_ready_message()
+        if not message:
+            return
+        with open(path) as f:
+            template = f.read()
+        with open(path, "w") as f:
+            f.write(message.strip() + "\n" + template)
+    except (OSError, SystemExit):
+        return
+
+
+def _report(event, key, message=None):
+    tree = key[1][:10] if key else ""
+    subject = (message or "").split("\n", 1)[0]
+    line = {
+        "generating": f"Index changed (tree {tree}); generating a message...",
+        "cancelled": f"Cancelled the message for tree {tree}: the index changed.",
+        "failed": f"Could not generate a message for tree {tree}.",
+        "empty": "Nothing staged.",
+        "ready": f"Message ready for tree {tree}: {subject}",
+    }[event]
+    print(f"[{time.strftime('%H:%M:%S')}] {line}", file=sys.stderr)
+
+
+def run(args):
+    """Watches the index and keeps a message ready for the staged changes."""
+    parser = argparse.ArgumentParser(
+        prog="gemmit watch",
+        description=(
+            "Generate the commit message in the background while you stage, "
+            "so that it is ready when you commit."
+        ),
+    )
+    parser.add_argument(
+        "-t", "--template", help="The template to use (default: the default template)."
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        metavar="SECONDS",
+        help="How long the index must stay unchanged before generating.",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll the index for changes instead of using inotify.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Bypass the cache of generated messages.",
+    )
+    parser.add_argument(
+        "--install-hook",
+        action="store_true",
+        help=f"Install a {HOOK_NAME} hook so that `git commit` uses the ready message.",
+    )
+    parser.add_argument(
+        "--prepare-commit-msg",
+        nargs="+",
+        metavar="ARG",
+        help=argparse.SUPPRESS,
+    )
+    args = parser.parse_args(args)
+
+    if args.prepare_commit_msg:
+        _prepare_commit_msg(args.prepare_commit_msg)
+        return
+    if args.install_hook:
+        _install_hook()
+        return
+
+    config = load_config()
+    template_name = args.template or config.get("default_template")
+    if not template_name:
+        handle_error(
+            "No template specified and no default template set.",
+            "Usage: gemmit watch -t <template> or gemmit --set-default <template>",
+        )
+    settings = watch.get_watch_settings()
+    debounce = args.debounce
+    if debounce is None:
+        debounce = settings.get("debounce_seconds", watch.DEFAULT_DEBOUNCE_SECONDS)
+
+    watcher = watch.Watcher(
+        template_name, debounce=debounce, use_cache=args.use_cache, on_event=_report
+    )
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    print(
+        f"Watching {get_index_path()} (template {template_name}); Ctrl-C to stop.",
+        file=sys.stderr,
+    )
+    try:
+        watcher.run(
+            stop,
+            poll=args.poll or settings.get("poll", False),
+            poll_interval=settings.get(
+                "poll_interval_seconds", watch.DEFAULT_POLL_INTERVAL_SECONDS
+            ),
+        )
+    except KeyboardInterrupt:
+        stop.set()
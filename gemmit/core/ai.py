@@ -1,83 +1,338 @@
-# This module handles the interaction with the Gemini CLI.
+# This module generates commit messages through the configured backend, with
+# caching, retries and hedging on top.
 
-import subprocess
-import shutil
-import time
+import queue
 import sys
-from ..utils.errors import handle_error
+import threading
+import time
+from .backend import get_backend
+from .cache import (
+    cache_key,
+    get_cache_settings,
+    get_cached_message,
+    store_message,
+)
+from .hedge import get_hedge_settings, hedge_delay, record_call
+from .ratelimit import acquire, has_spare_permit, record_quota_error
+from .retry import RetriesExhausted, RetryPolicy
+from .timings import record_timing
+from ..utils.errors import GenerationCancelled, handle_error
+from ..utils.trace import span
 
+# How often a cancellable call checks whether it has been cancelled.
+CANCEL_POLL_INTERVAL = 0.1
 
-# This is a trivial comment to allow a new commit.
-def generate_commit_message(prompt):
-    """Generates a commit message from a prompt, with retries for quota errors."""
-    if not shutil.which("gemini"):
-        handle_error(
-            "gemini not found in PATH",
-            "Please install the gemini agent and ensure it is in your PATH.",
+# Size of the pieces a prompt is sent to the backend in.
+PROMPT_CHUNK_CHARS = 64 * 1024
+
+
+class PromptStream:
+    """A prompt whose body is streamed from a source instead of held in memory.
+
+    open_body is called on every iteration and must return a fresh iterator
+    of str chunks, so that the prompt can be sent again on a retry.
+    """
+
+    def __init__(self, header, open_body):
+        self.header = header
+        self.open_body = open_body
+
+    def __iter__(self):
+        yield self.header + "\n\n"
+        yield from self.open_body()
+
+
+def iter_prompt_chunks(prompt):
+    """Yields a prompt (str or PromptStream) as str chunks of bounded size."""
+    parts = [prompt] if isinstance(prompt, str) else prompt
+    for part in parts:
+        for i in range(0, len(part), PROMPT_CHUNK_CHARS):
+            yield part[i : i + PROMPT_CHUNK_CHARS]
+
+
+class QuotaGate:
+    """Shares quota backoff between concurrent generations.
+
+    When one call hits a quota error, every call waits out the same delay
+    before its next attempt instead of retrying on its own schedule. Calls
+    in this process wait on the gate itself; other gemmit processes learn
+    of the error through the shared rate limiter, which also paces every
+    attempt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open_at = 0.0
+
+    def close_for(self, delay):
+        """Holds back all attempts for at least delay seconds from now."""
+        with self._lock:
+            self._open_at = max(self._open_at, time.monotonic() + delay)
+        record_quota_error(delay)
+
+    def is_open(self):
+        with self._lock:
+            return self._open_at <= time.monotonic()
+
+    def wait(self, cancel=None, reserve=0):
+        """Blocks until the gate is open and the rate limiter grants a permit.
+
+        reserve is passed on to ratelimit.acquire. Raises GenerationCancelled
+        if cancel is set meanwhile.
+        """
+        while True:
+            with self._lock:
+                open_at = self._open_at
+            delay = open_at - time.monotonic()
+            if delay <= 0:
+                break
+            if cancel is None:
+                time.sleep(delay)
+            elif cancel.wait(delay):
+                raise GenerationCancelled()
+            # Only wait again if another call pushed the gate back meanwhile.
+            with self._lock:
+                if self._open_at == open_at:
+                    break
+        acquire(cancel, reserve=reserve)
+
+
+class SpeculativeGate:
+    """The quota gate as seen by speculative calls, which leave a permit spare."""
+
+    def __init__(self, gate):
+        self.gate = gate
+
+    def close_for(self, delay):
+        self.gate.close_for(delay)
+
+    def is_open(self):
+        return self.gate.is_open()
+
+    def wait(self, cancel=None):
+        self.gate.wait(cancel, reserve=1)
+
+
+_quota_gate = QuotaGate()
+
+
+def open_session(prompt, cwd=None):
+    """Opens a backend session for generating several messages from one prompt in cwd.
+
+    Pass it to generate_commit_message, and close it when done.
+    """
+    return get_backend().open_session(prompt, cwd)
+
+
+def generate_commit_message(
+    prompt,
+    use_cache=True,
+    refresh_cache=False,
+    cancel=None,
+    on_line=None,
+    session=None,
+    speculative=False,
+    cwd=None,
+):
+    """Generates a commit message from a prompt, serving repeats from the cache.
+
+    With refresh_cache, the cached message is ignored but replaced by the new one.
+    Setting the optional cancel event kills the running gemini process and
+    raises GenerationCancelled. The optional on_line callback is called with
+    each line of the message as soon as it arrives, MCP lines already removed.
+    With a session opened for the same prompt, messages after the first are
+    asked for as follow-ups in its conversation. A speculative call, which
+    nobody may end up using, never takes the last rate limit permit. cwd is
+    the repository the message is for (default: the current directory).
+    """
+    with span("ai.generate", cached=False) as traced:
+        start = time.monotonic()
+        first_line = []
+
+        def emit(line):
+            if not first_line:
+                first_line.append(time.monotonic() - start)
+            if on_line:
+                on_line(line)
+
+        settings = get_cache_settings() if use_cache else {}
+        if not settings.get("enabled", True):
+            use_cache = False
+
+        key = None
+        if use_cache:
+            backend = session.backend if session else get_backend()
+            key = cache_key(prompt, backend.name, backend.model)
+            if not refresh_cache:
+                cached = get_cached_message(key, settings)
+                if cached:
+                    traced.set(cached=True)
+                    if session:
+                        session.seen(cached)
+                    for line in cached.split("\n"):
+                        emit(line)
+                    record_timing(first_line[0], time.monotonic() - start, cached=True)
+                    return cached
+
+        commit_message = _call_backend(prompt, cancel, emit, session, speculative, cwd)
+        if key:
+            store_message(key, commit_message, settings)
+        if first_line:
+            traced.set(first_line_ms=round(first_line[0] * 1000, 3))
+        record_timing(
+            first_line[0] if first_line else None,
+            time.monotonic() - start,
+            cached=False,
         )
+        return commit_message
 
-    max_retries = 5
-    retry_delay = 1
 
-    # Retry on API quota errors (HTTP 429).
-    for i in range(max_retries):
-        try:
-            process = subprocess.run(
-                ["gemini", "-p", prompt], capture_output=True, text=True, check=True
-            )
-            # Filter out unwanted lines from the output.
-            lines = process.stdout.strip().split("\n")
-            filtered_lines = [
-                line for line in lines if "MCP" not in line.strip() and line.strip()
-            ]
-            return "\n".join(filtered_lines)
-        except subprocess.CalledProcessError as e:
-            # Filter out informational MCP lines from stderr, but preserve MCPERR.
-            stderr_lines = e.stderr.strip().split("\n")
-            filtered_stderr_lines = [
-                line
-                for line in stderr_lines
-                if not line.strip().startswith("MCP")
-                or line.strip().startswith("MCPERR")
-            ]
-
-            filtered_stderr = "\n".join(filtered_stderr_lines)
-
-            if "429" in e.stderr or "Quota exceeded" in e.stderr:
-                if i < max_retries - 1:
-                    print(
-                        f"API quota error (429). Retrying in {retry_delay}s... [{i+1}/{max_retries}]",
-                        file=sys.stderr,
-                    )
-                    time.sleep(retry_delay)
-                else:
-                    handle_error(
-                        "API quota exceeded after maximum retries.", filtered_stderr
-                    )
-            elif not filtered_stderr.strip():
-                # Stderr only contained MCP lines, so we can treat it as a success.
-                # Filter stdout from the exception and return it.
-                stdout_lines = e.stdout.strip().split("\n")
-                filtered_stdout_lines = [
-                    line
-                    for line in stdout_lines
-                    if "MCP" not in line.strip() and line.strip()
-                ]
-                commit_message = "\n".join(filtered_stdout_lines)
-                if commit_message.strip():
-                    return commit_message
-                else:
-                    handle_error(
-                        "Command failed with only MCP errors, but produced no output on stdout."
-                    )
+def is_message_line(line):
+    """Tells whether a line of the model's output belongs to the message."""
+    return "MCP" not in line.strip() and bool(line.strip())
+
+
+def _run_hedged(call, cancel, on_line, timeout, hedge_after):
+    """Runs a prompt, and an identical second call if the first is slow to start.
+
+    If the first call has printed no message line after hedge_after seconds,
+    a second one is started, provided the rate limiter has a permit to spare. Whichever prints a line first wins: only its
+    lines reach on_line, and the other call is killed at once. If one call
+    fails, the result of the other is used. Returns (text, hedged).
+    """
+    start = time.monotonic()
+    results = queue.Queue()
+    cancels = [threading.Event(), threading.Event()]
+    lock = threading.Lock()
+    winner = []
+
+    def launch(index, call_timeout):
+        def forward(line):
+            with lock:
+                if not winner:
+                    winner.append(index)
+                    cancels[1 - index].set()
+            if winner[0] == index and on_line:
+                on_line(line)
+
+        def target():
+            try:
+                text = call(cancels[index], forward, call_timeout)
+            except BaseException as e:
+                results.put((index, None, e))
             else:
-                handle_error(
-                    "An unexpected error occurred while calling the Gemini CLI.",
-                    filtered_stderr,
+                results.put((index, text, None))
+
+        threading.Thread(target=target, daemon=True).start()
+
+    launch(0, timeout)
+    running = 1
+    hedged = False
+    error = None
+    while running:
+        try:
+            index, text, e = results.get(timeout=CANCEL_POLL_INTERVAL)
+        except queue.Empty:
+            if cancel is not None and cancel.is_set():
+                for event in cancels:
+                    event.set()
+            elapsed = time.monotonic() - start
+            with lock:
+                hedge = not hedged and not winner and elapsed >= hedge_after
+            # A hedge is as speculative as a prefetch: it takes a permit
+            # from the shared limiter, and only while another one is spare.
+            if (
+                hedge
+                and elapsed < timeout
+                and _quota_gate.is_open()
+                and has_spare_permit()
+            ):
+                acquire(reserve=1)
+                print(
+                    f"No answer after {elapsed:.1f}s, hedging with a second call...",
+                    file=sys.stderr,
                 )
-        except FileNotFoundError:
-            handle_error(
-                "'gemini' command not found. Make sure it is installed and in your PATH."
-            )
+                hedged = True
+                running += 1
+                launch(1, timeout - elapsed)
+            continue
+
+        running -= 1
+        if e is None:
+            with lock:
+                if not winner or winner[0] == index:
+                    winner[:] = [index]
+                    cancels[1 - index].set()
+                    return text, hedged
+            continue
+        if isinstance(e, GenerationCancelled) and cancels[index].is_set():
+            # The loser, or both when the caller cancelled.
+            if cancel is not None and cancel.is_set():
+                error = e
+            continue
+        with lock:
+            lost_stream = winner and winner[0] == index
+        if error is None or lost_stream:
+            error = e
+        if lost_stream:
+            # Its lines are already on screen; the other call was killed.
+            break
+    raise error
+
+
+def _call_backend(
+    prompt, cancel=None, on_line=None, session=None, speculative=False, cwd=None
+):
+    """Runs a prompt through the configured backend under the retry policy.
+
+    Quota and transient errors (see retry.classify_error) and attempts that
+    time out are retried with backoff; other errors fail at once. Message
+    lines are passed to on_line as they stream in. Backends produce no
+    output for the errors they are retried for, so a retried attempt emits
+    none. With a session, its next turn is run instead of the bare prompt.
+    """
+
+    def emit(line):
+        if on_line and is_message_line(line):
+            on_line(line)
 
-    handle_error("Failed to generate commit message after all retries.")
+    if session:
+        backend = session.backend
+        call = session.generate
+    else:
+        backend = get_backend()
+
+        def call(cancel, on_line, timeout):
+            return backend.generate(prompt, cancel, on_line, timeout, cwd)
+
+    backend.check()
+    hedge_settings = get_hedge_settings()
+
+    def attempt(timeout):
+        start = time.monotonic()
+        # Follow-ups are quicker than full prompts, so they stay out of the
+        # latency history.
+        full_prompt = not session or not session.replies
+        # A session's turns build on each other, so one never runs twice at once.
+        hedge_after = None if session else hedge_delay(hedge_settings)
+        with span("backend.call", backend=backend.name, follow_up=not full_prompt) as s:
+            if hedge_after is None:
+                text, hedged = call(cancel, emit, timeout), False
+            else:
+                text, hedged = _run_hedged(call, cancel, emit, timeout, hedge_after)
+            s.set(hedged=hedged)
+        if hedge_settings.get("enabled", False) and full_prompt:
+            record_call(time.monotonic() - start, hedged, hedge_settings)
+        # Filter out unwanted lines from the output.
+        lines = text.strip().split("\n")
+        return "\n".join(line for line in lines if is_message_line(line))
+
+    try:
+        gate = SpeculativeGate(_quota_gate) if speculative else _quota_gate
+        return RetryPolicy.from_settings().run(attempt, cancel, gate)
+    except RetriesExhausted as e:
+        last_error = e.last_error
+        handle_error(
+            f"Failed to generate commit message. {e}",
+            getattr(last_error, "details", None) or last_error,
+        )
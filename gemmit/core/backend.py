@@ -0,0 +1,136 @@
+# This module defines the interface of the backends that generate commit
+# messages, and selects the one named in the config.
+
+import importlib
+import json
+import threading
+import time
+from .config import load_config
+
+DEFAULT_BACKEND = "cli"
+
+# How often a running request checks for cancellation and its timeout.
+WATCH_INTERVAL = 0.1
+
+# What a session sends, instead of the whole prompt, for each message after
+# the first.
+FOLLOW_UP = (
+    "Write a different commit message for the same changes, following the "
+    "same instructions. Reply with the commit message only."
+)
+
+# Maps backend names to (module, class); modules are only imported when used.
+BACKENDS = {
+    "cli": ("gemini_cli", "GeminiCliBackend"),
+    "http": ("gemini_http", "GeminiHttpBackend"),
+}
+
+_lock = threading.Lock()
+_instances = {}
+
+
+class Backend:
+    """A way of running a prompt through the model.
+
+    generate() makes a single attempt; retries, hedging and caching are
+    layered on top of it by core/ai, the same for every backend.
+    """
+
+    name = None
+    # The model requests go to, where known; messages are cached per model.
+    model = None
+
+    def check(self):
+        """Exits with an error if the backend cannot be used at all."""
+
+    def warm_up(self, cwd=None):
+        """Prepares for a generation that is about to be requested in cwd."""
+
+    def generate(self, prompt, cancel=None, on_line=None, timeout=None, cwd=None):
+        """Runs a prompt (str or PromptStream) and returns the model's raw text.
+
+        Each line is passed to on_line as soon as it arrives. Setting cancel
+        stops the request with GenerationCancelled. Retryable failures,
+        including running past timeout seconds, raise retry.TransientError;
+        others exit through handle_error. cwd is the repository the request
+        is for, where a local agent must run (default: the current directory).
+        """
+        raise NotImplementedError
+
+    def open_session(self, prompt, cwd=None):
+        """Returns a Session for generating several messages from one prompt."""
+        return Session(self, prompt, cwd)
+
+    def close(self):
+        """Releases what the backend holds, such as pooled connections."""
+
+
+class Session:
+    """A conversation about one prompt, kept open across Regenerate.
+
+    The first generate() sends the whole prompt. Backends that can keep the
+    conversation on their side send only FOLLOW_UP after that; this default
+    sends the whole prompt again every time, as a stateless backend must.
+    A session is used by one call at a time and must be closed.
+    """
+
+    def __init__(self, backend, prompt, cwd=None):
+        self.backend = backend
+        self.prompt = prompt
+        self.cwd = cwd
+        self.replies = []
+
+    def generate(self, cancel=None, on_line=None, timeout=None):
+        """Generates the next message, like Backend.generate."""
+        text = self.backend.generate(self.prompt, cancel, on_line, timeout, self.cwd)
+        self.replies.append(text)
+        return text
+
+    def seen(self, message):
+        """Records a message the user was shown that did not come from here."""
+        self.replies.append(message)
+
+    def close(self):
+        """Releases what the conversation holds on the backend's side."""
+
+
+def watch(stop, cancel, deadline, finished, reasons):
+    """Calls stop() once cancel is set or the deadline passes, unless finished first.
+
+    The reason, "cancelled" or "timeout", is appended to reasons.
+    """
+    while not finished.wait(WATCH_INTERVAL):
+        if cancel is not None and cancel.is_set():
+            reasons.append("cancelled")
+        elif deadline is not None and time.monotonic() >= deadline:
+            reasons.append("timeout")
+        else:
+            continue
+        stop()
+        return
+
+
+def get_backend(config=None):
+    """Returns the backend selected in the config.
+
+    Instances are reused for as long as their settings don't change, so that
+    what they hold (such as open connections) outlives a single request.
+    """
+    if config is None:
+        config = load_config()
+    name = config.get("backend", DEFAULT_BACKEND)
+    settings = config.get(f"{name}_backend", {})
+    key = (name, json.dumps(settings, sort_keys=True))
+    with _lock:
+        backend = _instances.get(key)
+        if backend is None:
+            module_name, class_name = BACKENDS[name]
+            module = importlib.import_module(f".{module_name}", __package__)
+            backend = getattr(module, class_name)(settings)
+            _instances[key] = backend
+    return backend
+
+
+def warm_up_backend(cwd=None):
+    """Lets the selected backend prepare for a generation that is coming in cwd."""
+    get_backend().warm_up(cwd)
@@ -0,0 +1,215 @@
+# This module generates and commits messages across many repositories at once,
+# for `gemmit batch`.
+#
+# Repositories are handled by a bounded pool of threads in one process, so they
+# share the backend (and its open connections), the quota backoff and the
+# cross-process rate limiter.
+
+import os
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .ai import generate_commit_message
+from .config import get_template, load_config
+from .git import RepoState, stage_all_files
+from .prompt import build_staged_prompt
+from ..utils.errors import GenerationCancelled
+from ..utils.trace import span
+
+DEFAULT_MAX_WORKERS = 4
+
+# How deep under a directory repositories are looked for.
+DEFAULT_DISCOVERY_DEPTH = 3
+
+# Directories never searched for repositories.
+SKIPPED_DIRS = {"node_modules", "vendor", "__pycache__"}
+
+
+def get_batch_settings():
+    """Returns the batch section of the config."""
+    return load_config().get("batch", {})
+
+
+def is_repository(path):
+    """Tells whether path is the top of a git working tree (or a linked worktree)."""
+    return os.path.exists(os.path.join(path, ".git"))
+
+
+def discover_repositories(root, max_depth=DEFAULT_DISCOVERY_DEPTH):
+    """Returns the repositories at or under root, in sorted order.
+
+    The search does not descend into repositories it found, hidden
+    directories, or dependency trees such as node_modules.
+    """
+    root = os.path.abspath(root)
+    if is_repository(root):
+        return [root]
+    found = []
+    base_depth = root.rstrip(os.sep).count(os.sep)
+    for dirpath, dirnames, _ in os.walk(root):
+        depth = dirpath.rstrip(os.sep).count(os.sep) - base_depth
+        kept = []
+        for name in sorted(dirnames):
+            if name.startswith(".") or name in SKIPPED_DIRS:
+                continue
+            path = os.path.join(dirpath, name)
+            if is_repository(path):
+                found.append(path)
+            elif depth + 1 < max_depth:
+                kept.append(name)
+        dirnames[:] = kept
+    return sorted(found)
+
+
+def _git(cwd, *args):
+    """Runs a git command in cwd, returning its output; raises CalledProcessError."""
+    result = subprocess.run(
+        ["git"] + list(args), cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode:
+        raise subprocess.CalledProcessError(
+            result.returncode, result.args, result.stdout, result.stderr
+        )
+    return result.stdout
+
+
+class _Step:
+    """Times one step of a repository's run into its result."""
+
+    def __init__(self, result, name):
+        self.result = result
+        self.name = name
+
+    def __enter__(self):
+        self.result["step"] = self.name
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.result["seconds"][self.name] = round(time.monotonic() - self.start, 3)
+        return False
+
+
+def commit_repository(
+    path, template_name, add=False, push=False, use_cache=True, cancel=None
+):
+    """Generates a message for the staged changes in path and commits them.
+
+    Returns a result dict whose status is "committed", "empty" (nothing
+    staged), "failed" or "cancelled". Failures are reported in the result
+    rather than raised, so that one repository cannot stop the others.
+    """
+    result = {"repo": path, "status": "failed", "seconds": {}}
+    start = time.monotonic()
+    try:
+        with span("batch.repo", repo=path):
+            _commit(result, path, template_name, add, push, use_cache, cancel)
+    except GenerationCancelled:
+        result["status"] = "cancelled"
+    except subprocess.CalledProcessError as e:
+        result["error"] = (e.stderr or "").strip() or str(e)
+    except SystemExit:
+        # handle_error has already printed the details.
+        result["error"] = f"{result['step']} failed; see the errors above."
+    except Exception as e:
+        result["error"] = str(e)
+    result["total_seconds"] = round(time.monotonic() - start, 3)
+    if result["status"] != "failed":
+        result.pop("step", None)
+    return result
+
+
+def _commit(result, path, template_name, add, push, use_cache, cancel):
+    if add:
+        with _Step(result, "stage"):
+            stage_all_files(path)
+    with _Step(result, "generate"):
+        state = RepoState.collect(path)
+        if not state.has_staged_changes:
+            result["status"] = "empty"
+            return
+        template = get_template(template_name)
+        prompt = build_staged_prompt(template, state, use_cache=use_cache)
+        message = generate_commit_message(
+            prompt, use_cache=use_cache, cancel=cancel, cwd=path
+        )
+    if cancel is not None and cancel.is_set():
+        raise GenerationCancelled()
+    with _Step(result, "commit"):
+        _git(path, "commit", "-q", "-m", message)
+        result["commit"] = _git(path, "rev-parse", "HEAD").strip()
+        result["subject"] = message.split("\n", 1)[0]
+    if push:
+        with _Step(result, "push"):
+            _git(path, "push", "-q", "-u", "origin", state.branch)
+        result["pushed"] = True
+    result["status"] = "committed"
+
+
+def run_batch(
+    repos,
+    template_name,
+    add=False,
+    push=False,
+    use_cache=True,
+    max_workers=DEFAULT_MAX_WORKERS,
+    on_result=None,
+):
+    """Commits every repository in repos on a pool of max_workers threads.
+
+    on_result is called with each result as soon as its repository is done.
+    Returns the results in the order of repos. On KeyboardInterrupt, the
+    running generations are cancelled, and they and the repositories not
+    started yet are reported as cancelled.
+    """
+    cancel = threading.Event()
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, min(len(repos) or 1, max_workers)))
+    futures = {
+        executor.submit(
+            commit_repository, repo, template_name, add, push, use_cache, cancel
+        ): repo
+        for repo in repos
+    }
+    try:
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_result:
+                on_result(result)
+    except KeyboardInterrupt:
+        cancel.set()
+        for future in futures:
+            future.cancel()
+    finally:
+        executor.shutdown(wait=True)
+    # Repositories that were running when interrupted have finished by now.
+    for future, repo in futures.items():
+        if repo not in results and future.done() and not future.cancelled():
+            results[repo] = future.result()
+    return [
+        results.get(repo, {"repo": repo, "status": "cancelled", "seconds": {}})
+        for repo in repos
+    ]
+
+
+def summarize(results, wall_seconds):
+    """Returns the JSON summary of a batch: counts, latencies and each result."""
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    latencies = [r["total_seconds"] for r in results if r["status"] == "committed"]
+    summary = {
+        "repos": len(results),
+        "counts": counts,
+        "wall_seconds": round(wall_seconds, 3),
+        "results": results,
+    }
+    if latencies:
+        summary["latency"] = {
+            "median_seconds": round(statistics.median(latencies), 3),
+            "max_seconds": max(latencies),
+        }
+    return summary
@@ -0,0 +1,160 @@
+# This module implements the on-disk cache of generated commit messages.
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from .config import load_config
+
+CACHE_DIR = os.path.expanduser("~/.gemmit/cache")
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+# Entries expire after this long without being read. Their mtime is the time
+# of last use, for both expiry and least recently used eviction.
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def get_cache_settings():
+    """Returns the cache section of the config."""
+    return load_config().get("cache", {})
+
+
+def cache_key(prompt, backend=None, model=None):
+    """Returns the content address of a prompt (template prompt plus staged diff).
+
+    The prompt may be a str or an iterable of str chunks; both hash the same.
+    The backend and model names are part of the key, so that switching
+    either does not serve messages the other one wrote.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([backend, model]).encode() + b"\0")
+    for chunk in [prompt] if isinstance(prompt, str) else prompt:
+        digest.update(chunk.encode())
+    return digest.hexdigest()
+
+
+def _entry_path(directory, key):
+    return os.path.join(directory, key + ".json")
+
+
+def get_cached_message(key, settings=None):
+    """Returns the cached message for a key, or None on a miss or expired entry."""
+    if settings is None:
+        settings = get_cache_settings()
+    entry = read_entry(CACHE_DIR, key, settings)
+    return entry.get("message") if entry else None
+
+
+def store_message(key, message, settings=None):
+    """Atomically writes a message to the cache and evicts old entries."""
+    if settings is None:
+        settings = get_cache_settings()
+    write_entry(CACHE_DIR, key, {"message": message}, settings)
+
+
+def clear_cache(directory=None):
+    """Removes every cached entry and returns the number of entries removed."""
+    removed = 0
+    for path, _ in _list_entries(directory or CACHE_DIR):
+        if _remove(path):
+            removed += 1
+    return removed
+
+
+def read_entry(directory, key, settings):
+    """Returns the entry stored under key in directory, or None if missing or expired.
+
+    Reading an entry marks it as recently used. settings gives the
+    ttl_seconds, as in the cache section of the config: an entry expires
+    when it has not been read or written for that long.
+    """
+    path = _entry_path(directory, key)
+    ttl = settings.get("ttl_seconds", DEFAULT_TTL_SECONDS)
+    try:
+        with open(path, "r") as f:
+            expired = time.time() - os.fstat(f.fileno()).st_mtime > ttl
+            entry = None if expired else json.load(f)
+    except (OSError, ValueError):
+        return None
+    if expired:
+        _remove(path)
+        return None
+
+    # Bump the mtime so that eviction drops the least recently used entries.
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+
+def write_entry(directory, key, data, settings):
+    """Atomically stores the dict data under key in directory, then evicts old entries.
+
+    settings gives the caps (max_entries, max_bytes, ttl_seconds), as in
+    the cache section of the config.
+    """
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Write to a private temp file and rename it into place, so that
+        # concurrent invocations never observe a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, _entry_path(directory, key))
+    except OSError:
+        # The cache is an optimization; never fail a commit because of it.
+        return
+    _evict(directory, settings)
+
+
+def _list_entries(directory):
+    """Returns (path, stat) pairs for all entries in directory, oldest access first."""
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    entries.append((entry.path, entry.stat()))
+                except OSError:
+                    continue
+    except OSError:
+        return []
+    entries.sort(key=lambda item: item[1].st_mtime)
+    return entries
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def _evict(directory, settings):
+    """Drops expired entries, then least recently used ones until under the caps.
+
+    Like read_entry, it takes an entry's mtime as the time it was last used.
+    """
+    max_entries = settings.get("max_entries", DEFAULT_MAX_ENTRIES)
+    max_bytes = settings.get("max_bytes", DEFAULT_MAX_BYTES)
+    ttl = settings.get("ttl_seconds", DEFAULT_TTL_SECONDS)
+
+    now = time.time()
+    live = []
+    for path, st in _list_entries(directory):
+        if now - st.st_mtime > ttl:
+            _remove(path)
+        else:
+            live.append((path, st))
+
+    total_bytes = sum(st.st_size for _, st in live)
+    while live and (len(live) > max_entries or total_bytes > max_bytes):
+        path, st = live.pop(0)
+        _remove(path)
+        total_bytes -= st.st_size
@@ -0,0 +1,89 @@
+# This module fits the staged diff into a template's token budget.
+
+import sys
+from .git import DIFF_LEVEL_ORDER, get_staged_diff, iter_staged_diff
+from .summarize import (
+    DEFAULT_THRESHOLD_BYTES,
+    get_budget_bytes,
+    get_large_diff_settings,
+)
+
+# The level that drops the content of the changes, keeping only their headers.
+HEADERS_ONLY_LEVEL = "stat"
+
+
+def get_diff_level(template):
+    """Returns the compaction level a template asks for."""
+    return template.get("diff_level", "full")
+
+
+def fit_to_budget(template, diff, diff_filter, cwd=None, paths=None):
+    """Compacts a diff level by level until the prompt fits the template's token budget.
+
+    diff is the (filtered) staged diff at the template's level, either as a str
+    or as a function returning its lines; the result has the same form. When
+    large diffs are summarized (large_diff.threshold_bytes), compaction stops
+    short of the headers-only stat level: if no other level fits, the diff is
+    returned as given, for build_prompt to summarize. Otherwise the most
+    compact level is returned. paths limits the diff, as in get_staged_diff.
+    """
+    limit = get_budget_bytes(template)
+    if limit is None:
+        return diff
+
+    level = get_diff_level(template)
+    levels = DIFF_LEVEL_ORDER[DIFF_LEVEL_ORDER.index(level) :]
+    threshold = get_large_diff_settings().get(
+        "threshold_bytes", DEFAULT_THRESHOLD_BYTES
+    )
+    summarizing = bool(threshold) and levels[0] != HEADERS_ONLY_LEVEL
+    if summarizing:
+        levels = [level for level in levels if level != HEADERS_ONLY_LEVEL]
+    given = diff
+    for i, level in enumerate(levels):
+        if i > 0:
+            if isinstance(diff, str):
+                diff = diff_filter.wrap(get_staged_diff(level, cwd, paths))
+            else:
+                diff = diff_filter.wrap(
+                    lambda level=level: iter_staged_diff(level, cwd, paths)
+                )
+            print(
+                f"Diff over the token budget, compacting to '{level}'...",
+                file=sys.stderr,
+            )
+
+        fitted = _read_within(diff, limit)
+        if fitted is not None:
+            return fitted
+    if summarizing:
+        print(
+            "Diff still over the token budget, summarizing it instead...",
+            file=sys.stderr,
+        )
+        return given
+    return diff
+
+
+def _read_within(diff, limit):
+    """Returns the diff as a str if it is at most limit bytes, otherwise None.
+
+    A streamed diff is read only up to the limit, then abandoned.
+    """
+    if isinstance(diff, str):
+        return diff if len(diff) <= limit else None
+
+    lines = diff()
+    parts = []
+    size = 0
+    try:
+        for line in lines:
+            size += len(line)
+            if size > limit:
+                return None
+            parts.append(line)
+    finally:
+        # Stop git instead of letting it produce the rest of the diff.
+        if hasattr(lines, "close"):
+            lines.close()
+    return "".join(parts)
@@ -2,27 +2,102 @@
 
 import json
 import os
+import threading
+from .git import DIFF_LEVELS
 from ..utils.errors import handle_error
+from ..utils.trace import span
 
 CONFIG_FILE = os.path.expanduser("~/.gemmit/config.json")
 
+# The parsed config, reused until the file's mtime or size changes.
+_config_cache = {"path": None, "stamp": None, "config": None}
+_config_lock = threading.Lock()
 
-def load_config():
-    """Loads the configuration file, creating it if it doesn't exist."""
-    if not os.path.exists(CONFIG_FILE):
-        print(f"Configuration file not found at {CONFIG_FILE}. Creating a default one.")
-        os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-        default_config_path = os.path.join(
-            os.path.dirname(__file__), "..", "config.json"
-        )
-        with open(default_config_path, "r") as src, open(CONFIG_FILE, "w") as dest:
-            dest.write(src.read())
 
+def _stat_config():
+    """Returns the (mtime, size) stamp of the config file, or None if it is missing."""
     try:
-        with open(CONFIG_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        handle_error(f"reading or parsing config file at {CONFIG_FILE}", e)
+        st = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def load_config():
+    """Loads the configuration file, creating it if it doesn't exist.
+
+    The parsed and validated config is cached in memory and only re-read when
+    the file changes on disk. Callers must not modify the returned dict.
+    """
+    with _config_lock:
+        stamp = _stat_config()
+        if (
+            stamp is not None
+            and _config_cache["path"] == CONFIG_FILE
+            and _config_cache["stamp"] == stamp
+        ):
+            return _config_cache["config"]
+
+        if stamp is None:
+            print(
+                f"Configuration file not found at {CONFIG_FILE}. Creating a default one."
+            )
+            default_config_path = os.path.join(
+                os.path.dirname(__file__), "..", "config.json"
+            )
+            try:
+                os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
+                with open(default_config_path, "r") as src, open(
+                    CONFIG_FILE, "w"
+                ) as dest:
+                    dest.write(src.read())
+            except OSError as e:
+                handle_error(f"creating default config file at {CONFIG_FILE}", e)
+            stamp = _stat_config()
+
+        with span("config.load"):
+            try:
+                with open(CONFIG_FILE, "r") as f:
+                    config = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                handle_error(f"reading or parsing config file at {CONFIG_FILE}", e)
+
+            validate_config(config)
+        _config_cache.update(path=CONFIG_FILE, stamp=stamp, config=config)
+        return config
+
+
+def validate_config(config):
+    """Checks the config and its templates, so that mistakes surface at load time."""
+    if not isinstance(config, dict):
+        handle_error(f"Config file at {CONFIG_FILE} must contain a JSON object.")
+    from .backend import BACKENDS, DEFAULT_BACKEND
+
+    backend = config.get("backend", DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        handle_error(
+            f"Unknown backend '{backend}' in {CONFIG_FILE}.",
+            f"Valid backends are: {', '.join(BACKENDS)}",
+        )
+    templates = config.get("templates", {})
+    if not isinstance(templates, dict):
+        handle_error(f"'templates' in {CONFIG_FILE} must be an object.")
+    for name, template in templates.items():
+        if not isinstance(template, dict) or not isinstance(
+            template.get("prompt"), str
+        ):
+            handle_error(f"Template '{name}' must be an object with a 'prompt' string.")
+        level = template.get("diff_level", "full")
+        if level not in DIFF_LEVELS:
+            handle_error(
+                f"Template '{name}' has an unknown diff_level '{level}'.",
+                f"Valid levels are: {', '.join(DIFF_LEVELS)}",
+            )
+        budget = template.get("token_budget", 0)
+        if not isinstance(budget, int) or budget < 0:
+            handle_error(
+                f"Template '{name}' must have a non-negative integer token_budget."
+            )
 
 
 def get_template(template_name):
@@ -41,11 +116,14 @@ def save_config(config):
             json.dump(config, f, indent=2)
     except IOError as e:
         handle_error(f"writing to config file at {CONFIG_FILE}", e)
+    # Don't rely on the mtime alone: a quick rewrite can keep the same stamp.
+    with _config_lock:
+        _config_cache["stamp"] = None
 
 
 def set_default_template(template_name):
     """Sets the default template in the config."""
-    config = load_config()
+    config = dict(load_config())
     config["default_template"] = template_name
     save_config(config)
     print(f"Default template set to '{template_name}'.")
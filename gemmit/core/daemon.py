@@ -0,0 +1,263 @@
+# This module implements the resident gemmit daemon and its thin client.
+#
+# The daemon keeps the config, the caches and the quota backoff loaded across
+# commits. Clients send a JSON request line over a Unix socket and read back a
+# single JSON reply line.
+
+import json
+import os
+import queue
+import socket
+import threading
+
+SOCKET_PATH = os.path.expanduser("~/.gemmit/daemon.sock")
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 8
+
+# How long a client waits to connect, and the daemon waits for a request line.
+CONNECT_TIMEOUT = 1.0
+REQUEST_TIMEOUT = 5.0
+
+# A client in one of these environments (such as a git hook, which sets
+# GIT_INDEX_FILE) sees a different repository than its cwd alone describes.
+GIT_ENVIRONMENT = ("GIT_DIR", "GIT_WORK_TREE", "GIT_INDEX_FILE")
+
+
+def get_daemon_settings():
+    """Returns the daemon section of the config."""
+    from .config import load_config
+
+    return load_config().get("daemon", {})
+
+
+def _send(request, path=None, timeout=None):
+    """Sends a request to the daemon and returns its reply.
+
+    Raises OSError or ValueError if the daemon cannot be reached or replies
+    with something other than a JSON line.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path or SOCKET_PATH)
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("the daemon closed the connection")
+    return json.loads(line)
+
+
+def daemon_available(path=None):
+    """Tells whether a client here may ask a daemon, without connecting to it."""
+    if any(name in os.environ for name in GIT_ENVIRONMENT):
+        return False
+    return os.path.exists(path or SOCKET_PATH)
+
+
+def request_generation(cwd, template_name, use_cache=True, path=None):
+    """Asks the daemon for a commit message for the staged changes in cwd.
+
+    Returns the daemon's reply, a dict whose "status" is "ok" (with the
+    "message"), "empty" or "error" (with the "error"). Returns None when the
+    message should be generated in-process instead: no daemon is running,
+    its queue is full, or the environment points git somewhere else.
+    """
+    path = path or SOCKET_PATH
+    if not daemon_available(path):
+        return None
+    try:
+        reply = _send(
+            {
+                "op": "generate",
+                "cwd": os.path.abspath(cwd),
+                "template": template_name,
+                "use_cache": use_cache,
+            },
+            path,
+        )
+    except (OSError, ValueError):
+        return None
+    if reply.get("status") == "busy":
+        return None
+    return reply
+
+
+def ping(path=None):
+    """Returns the daemon's status, or None if it is not running."""
+    try:
+        return _send({"op": "ping"}, path, timeout=CONNECT_TIMEOUT)
+    except (OSError, ValueError):
+        return None
+
+
+def stop(path=None):
+    """Asks a running daemon to shut down; returns False if none was running."""
+    try:
+        _send({"op": "stop"}, path, timeout=CONNECT_TIMEOUT)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def generate_for_repo(cwd, template_name, use_cache=True):
+    """Generates a commit message for the staged changes in cwd, as a reply dict."""
+    from .ai import generate_commit_message
+    from .config import get_template
+    from .git import RepoState
+    from .prompt import build_staged_prompt
+    from .backend import warm_up_backend
+
+    state = RepoState.collect(cwd)
+    if not state.has_staged_changes:
+        return {"status": "empty"}
+    warm_up_backend(cwd)
+    template = get_template(template_name)
+    prompt = build_staged_prompt(template, state, use_cache=use_cache)
+    message = generate_commit_message(prompt, use_cache=use_cache, cwd=cwd)
+    return {"status": "ok", "message": message}
+
+
+class Daemon:
+    """Serves generation requests from a bounded queue with a fixed pool of workers.
+
+    Connections beyond the queue's capacity are answered "busy", and their
+    clients fall back to generating in-process.
+    """
+
+    def __init__(
+        self, path=None, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE
+    ):
+        self.path = path or SOCKET_PATH
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._listener = None
+
+    def bind(self):
+        """Binds the socket, replacing a stale one left by a daemon that died.
+
+        Returns False if another daemon is already listening on it.
+        """
+        if os.path.exists(self.path):
+            if ping(self.path) is not None:
+                return False
+            os.remove(self.path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the owner may ask this daemon to read their repositories. The
+        # socket is created with mode 0600, so it is never open to others.
+        umask = os.umask(0o177)
+        try:
+            listener.bind(self.path)
+        finally:
+            os.umask(umask)
+        listener.listen()
+        # Wake up regularly to notice a stop request.
+        listener.settimeout(0.5)
+        self._listener = listener
+        return True
+
+    def serve_forever(self):
+        """Accepts connections until stop() is called. bind() must be called first."""
+        threads = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn, _ = self._listener.accept()
+                except socket.timeout:
+                    continue
+                try:
+                    self.queue.put_nowait(conn)
+                except queue.Full:
+                    # Read the request first: closing a socket with unread
+                    # data resets it, and the client would lose the reply.
+                    with conn:
+                        if self._read_request(conn) is not None:
+                            self._reply(conn, {"status": "busy"})
+        finally:
+            self._listener.close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            for _ in threads:
+                self.queue.put(None)
+            for thread in threads:
+                thread.join()
+            # Connections nobody got to see their socket close, and fall back.
+            while True:
+                try:
+                    conn = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if conn is not None:
+                    conn.close()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _work(self):
+        while True:
+            conn = self.queue.get()
+            if conn is None:
+                return
+            with conn:
+                self._handle(conn)
+
+    def _read_request(self, conn):
+        """Reads the request line from a connection, or returns None if there is none."""
+        try:
+            conn.settimeout(REQUEST_TIMEOUT)
+            with conn.makefile("rb") as f:
+                request = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        return request if isinstance(request, dict) else None
+
+    def _handle(self, conn):
+        request = self._read_request(conn)
+        if request is None:
+            return
+
+        op = request.get("op")
+        if op == "ping":
+            reply = {"status": "ok", "pid": os.getpid(), "queued": self.queue.qsize()}
+        elif op == "stop":
+            reply = {"status": "ok"}
+            self.stop()
+        elif op == "generate":
+            reply = self._generate(request)
+        else:
+            reply = {"status": "error", "error": f"Unknown request '{op}'."}
+        self._reply(conn, reply)
+
+    def _generate(self, request):
+        try:
+            return generate_for_repo(
+                request.get("cwd"),
+                request.get("template"),
+                use_cache=request.get("use_cache", True),
+            )
+        except SystemExit:
+            # handle_error has already printed the details to the daemon's stderr.
+            return {
+                "status": "error",
+                "error": "Generation failed; see the daemon's output for details.",
+            }
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+
+    def _reply(self, conn, reply):
+        try:
+            conn.settimeout(REQUEST_TIMEOUT)
+            conn.sendall(json.dumps(reply).encode() + b"\n")
+        except OSError:
+            # The client went away; it has fallen back already.
+            pass
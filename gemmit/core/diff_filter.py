@@ -0,0 +1,130 @@
+# This module drops noisy files (lockfiles, generated code, binaries) from diffs.
+
+import fnmatch
+import sys
+from .config import load_config
+from .git import get_attributes, get_staged_numstat
+
+DEFAULT_EXCLUDE = [
+    "*.lock",
+    "package-lock.json",
+    "pnpm-lock.yaml",
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "*_pb2.py",
+    "*.pb.go",
+    "vendor/*",
+    "node_modules/*",
+]
+
+# Rough number of bytes per model token, used to report the savings.
+BYTES_PER_TOKEN = 4
+
+
+def get_diff_filter_settings():
+    """Returns the diff_filter section of the config."""
+    return load_config().get("diff_filter", {})
+
+
+class DiffFilter:
+    """Replaces the diff of excluded files with a one-line numstat summary each."""
+
+    def __init__(self, excluded):
+        # Maps each excluded path to its "added<TAB>deleted<TAB>path" line.
+        self.excluded = excluded
+        self.bytes_saved = 0
+        self._reported = False
+
+    def wrap(self, diff):
+        """Filters a diff given as a str or as a function returning its lines."""
+        if not self.excluded:
+            return diff
+        if isinstance(diff, str):
+            return "".join(self.apply(diff.splitlines(keepends=True)))
+        return lambda: self.apply(diff())
+
+    def apply(self, lines):
+        """Yields the lines of a diff with excluded files collapsed."""
+        saved = 0
+        skipping = False
+        for line in lines:
+            if line.startswith("diff --git "):
+                skipping = self._is_excluded(line)
+            if skipping:
+                saved += len(line)
+            else:
+                yield line
+
+        yield "\n# Omitted from this diff (generated, vendored or binary files):\n"
+        for summary in self.excluded.values():
+            yield "#   " + summary + "\n"
+
+        self.bytes_saved = saved
+        self._report()
+
+    def _is_excluded(self, header):
+        """Matches a 'diff --git a/X b/Y' header against the excluded paths."""
+        header = header.rstrip("\n")
+        # Paths may contain " b/", so try every split point.
+        start = header.find(" b/")
+        while start != -1:
+            if header[start + 3 :] in self.excluded:
+                return True
+            start = header.find(" b/", start + 1)
+        return False
+
+    def _report(self):
+        """Reports the savings once, however often the diff is streamed."""
+        if self._reported:
+            return
+        self._reported = True
+        print(
+            f"Filtered {len(self.excluded)} file(s) from the diff: "
+            f"{self.bytes_saved} bytes (~{self.bytes_saved // BYTES_PER_TOKEN} tokens) saved.",
+            file=sys.stderr,
+        )
+
+
+def load_diff_filter(settings=None, numstat=None, cwd=None):
+    """Builds the filter for the staged changes from config globs and .gitattributes.
+
+    numstat may be passed in when it has already been collected (see RepoState).
+    """
+    if settings is None:
+        settings = get_diff_filter_settings()
+    if not settings.get("enabled", True):
+        return DiffFilter({})
+
+    if numstat is None:
+        numstat = get_staged_numstat(cwd)
+    patterns = settings.get("exclude", DEFAULT_EXCLUDE)
+    generated = set()
+    if settings.get("gitattributes", True) and numstat:
+        attributes = get_attributes(
+            [path for _, _, path in numstat], ["linguist-generated", "diff"], cwd
+        )
+        generated = {
+            path
+            for path, values in attributes.items()
+            if values.get("linguist-generated") in ("set", "true")
+            or values.get("diff") == "unset"
+        }
+
+    excluded = {}
+    for added, deleted, path in numstat:
+        binary = added == "-" and deleted == "-"
+        if binary or path in generated or matches_any(path, patterns):
+            excluded[path] = f"{added}\t{deleted}\t{path}"
+    return DiffFilter(excluded)
+
+
+def matches_any(path, patterns):
+    """Matches a path against globs; globs without a slash match the file name."""
+    name = path.rsplit("/", 1)[-1]
+    for pattern in patterns:
+        if fnmatch.fnmatchcase(path, pattern):
+            return True
+        if "/" not in pattern and fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
@@ -0,0 +1,174 @@
+# This module builds prompts from per-file summaries of the staged diff.
+#
+# Each file's diff is summarized once and cached under the pair of blobs it
+# goes from and to (from `git diff --cached --raw`), so that staging one more
+# file after a first generation only summarizes that file. The summaries are
+# then composed into the prompt for the final message.
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .ai import generate_commit_message
+from .backend import get_backend
+from .cache import read_entry, write_entry
+from .compact import get_diff_level
+from .config import load_config
+from .diff_filter import load_diff_filter
+from .git import get_staged_changes, get_staged_file_diffs
+from .summarize import (
+    DEFAULT_CHUNK_BYTES,
+    get_large_diff_settings,
+    iter_chunks,
+    summarize_chunks,
+)
+from ..utils.trace import span
+
+SUMMARY_DIR = os.path.expanduser("~/.gemmit/summaries")
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_MAX_WORKERS = 4
+
+FILE_SUMMARY_PROMPT = (
+    "Summarize the following git diff of a single file as a short bulleted list "
+    "of the changes it makes and their intent. Do not write a commit message."
+)
+
+SUMMARIES_PREAMBLE = (
+    "Summaries of the staged changes follow, one per file. "
+    "Use them in place of the diff."
+)
+
+# What a file without a diff at the template's level is summarized as.
+NO_CONTENT_CHANGES = "- No content changes at this level of detail."
+
+
+def get_file_summary_settings():
+    """Returns the file_summaries section of the config, with its cache defaults."""
+    settings = {
+        "max_entries": DEFAULT_MAX_ENTRIES,
+        "max_bytes": DEFAULT_MAX_BYTES,
+        "ttl_seconds": DEFAULT_TTL_SECONDS,
+    }
+    settings.update(load_config().get("file_summaries", {}))
+    return settings
+
+
+def summary_key(change, level, backend=None):
+    """Returns the cache key of a file's summary: its blob pair, path and diff level.
+
+    With a backend, its name and model are part of the key, as in cache_key.
+    """
+    old_mode, new_mode, old_sha, new_sha, _, path = change
+    identity = [FILE_SUMMARY_PROMPT, level, path, old_mode, new_mode, old_sha, new_sha]
+    if backend is not None:
+        identity += [backend.name, backend.model]
+    return hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+
+
+def _summarize(path, diff, chunk_bytes, use_cache, cancel, cwd):
+    with span("file_summary", path=path, bytes=len(diff)):
+        if not diff:
+            return NO_CONTENT_CHANGES
+        if len(diff) <= chunk_bytes:
+            return generate_commit_message(
+                FILE_SUMMARY_PROMPT + "\n\n" + diff,
+                use_cache=use_cache,
+                cancel=cancel,
+                cwd=cwd,
+            )
+        # A file too large for one call is summarized in parts.
+        chunks = iter_chunks(diff.splitlines(keepends=True), chunk_bytes)
+        summaries = summarize_chunks(
+            chunks, use_cache=use_cache, cancel=cancel, cwd=cwd
+        )
+        return "\n".join(summaries)
+
+
+def summarize_files(changes, level="full", cwd=None, use_cache=True, settings=None):
+    """Returns {path: summary} for staged changes (see git.get_staged_changes).
+
+    Cached summaries are reused; the other files are diffed by a single git
+    process and summarized in parallel. Without use_cache, every file is
+    summarized again and nothing is stored.
+    """
+    if settings is None:
+        settings = get_file_summary_settings()
+    summaries = {}
+    keys = {}
+    backend = get_backend()
+    for change in changes:
+        path = change[5]
+        keys[path] = summary_key(change, level, backend)
+        entry = read_entry(SUMMARY_DIR, keys[path], settings) if use_cache else None
+        if entry:
+            summaries[path] = entry["summary"]
+    missing = [change[5] for change in changes if change[5] not in summaries]
+
+    print(
+        f"Summarizing {len(missing)} file(s), {len(summaries)} summary(ies) cached.",
+        file=sys.stderr,
+    )
+    if not missing:
+        return summaries
+
+    diffs = get_staged_file_diffs(missing, level, cwd)
+    chunk_bytes = get_large_diff_settings().get("chunk_bytes", DEFAULT_CHUNK_BYTES)
+    max_workers = max(1, settings.get("max_workers", DEFAULT_MAX_WORKERS))
+    cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(missing)))
+    try:
+        futures = {
+            path: executor.submit(
+                _summarize,
+                path,
+                diffs.get(path, ""),
+                chunk_bytes,
+                use_cache,
+                cancel,
+                cwd,
+            )
+            for path in missing
+        }
+        for path, future in futures.items():
+            summaries[path] = future.result()
+            if use_cache:
+                write_entry(
+                    SUMMARY_DIR, keys[path], {"summary": summaries[path]}, settings
+                )
+    finally:
+        # If one file failed, stop the others instead of waiting for them.
+        cancel.set()
+        executor.shutdown(wait=True)
+    return summaries
+
+
+def build_summarized_prompt(template, state, use_cache=True, paths=None):
+    """Builds the prompt for the staged changes in state from per-file summaries.
+
+    Files left out by the diff filter keep their one-line summary. With
+    paths (relative to the top of the tree), only those files are included.
+    """
+    numstat = state.numstat
+    changes = get_staged_changes(state.cwd)
+    if paths is not None:
+        wanted = set(paths)
+        numstat = [entry for entry in numstat if entry[2] in wanted]
+        changes = [change for change in changes if change[5] in wanted]
+    diff_filter = load_diff_filter(numstat=numstat, cwd=state.cwd)
+    changes = [change for change in changes if change[5] not in diff_filter.excluded]
+    summaries = summarize_files(
+        changes, get_diff_level(template), state.cwd, use_cache=use_cache
+    )
+    parts = [template.get("prompt", ""), SUMMARIES_PREAMBLE]
+    parts += [f"{change[5]}:\n{summaries[change[5]]}" for change in changes]
+    if diff_filter.excluded:
+        parts.append(
+            "Omitted (generated, vendored or binary files):\n"
+            + "\n".join(diff_filter.excluded.values())
+        )
+    return "\n\n".join(parts)
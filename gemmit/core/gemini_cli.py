@@ -0,0 +1,179 @@
+# This module implements the backend that runs the Gemini CLI.
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+from .backend import Backend, watch
+from .retry import TransientError, classify_error, parse_retry_after
+from .warmup import prespawn_gemini, take_prespawned
+from ..utils.errors import GenerationCancelled, handle_error
+
+# core.ai is only imported when a request is made: warming up, which happens
+# before gemmit knows whether anything is staged, must stay cheap.
+
+
+class GeminiCliBackend(Backend):
+    """Runs one `gemini` process per request, with the prompt on its stdin.
+
+    Each request pays for a Node start-up and a TLS handshake, which
+    prespawning hides behind git's work where it can.
+    """
+
+    name = "cli"
+
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+
+    @property
+    def model(self):
+        # gemini picks its own model; GEMINI_MODEL is how one is chosen for it.
+        return os.environ.get("GEMINI_MODEL")
+
+    def check(self):
+        if not shutil.which("gemini"):
+            handle_error(
+                "gemini not found in PATH",
+                "Please install the gemini agent and ensure it is in your PATH.",
+            )
+
+    def warm_up(self, cwd=None):
+        prespawn_gemini(cwd=cwd)
+
+    def generate(self, prompt, cancel=None, on_line=None, timeout=None, cwd=None):
+        from .ai import is_message_line
+
+        try:
+            process = run_gemini(prompt, cancel, on_line, timeout, cwd)
+        except subprocess.TimeoutExpired:
+            raise TransientError(f"gemini did not answer within {timeout:.0f}s")
+        except subprocess.CalledProcessError as e:
+            filtered_stderr = _filter_stderr(e.stderr)
+            if not filtered_stderr.strip():
+                # Stderr only contained MCP lines, so we can treat it as a success.
+                if any(is_message_line(line) for line in e.stdout.split("\n")):
+                    return e.stdout
+                handle_error(
+                    "Command failed with only MCP errors, but produced no output on stdout."
+                )
+
+            kind = classify_error(e.stderr)
+            if kind == "fatal":
+                handle_error(
+                    "An unexpected error occurred while calling the Gemini CLI.",
+                    filtered_stderr,
+                )
+            raise TransientError(
+                "API quota error (429)" if kind == "quota" else "Transient API error",
+                retry_after=parse_retry_after(e.stderr),
+                quota=kind == "quota",
+                details=filtered_stderr,
+            )
+        except FileNotFoundError:
+            handle_error(
+                "'gemini' command not found. Make sure it is installed and in your PATH."
+            )
+        return process.stdout
+
+
+def _feed_prompt(pipe, prompt, errors):
+    """Writes a prompt to a process's stdin, recording any error from its source."""
+    from .ai import iter_prompt_chunks
+
+    try:
+        for chunk in iter_prompt_chunks(prompt):
+            pipe.write(chunk.encode())
+    except BrokenPipeError:
+        # The process exited early; its exit status tells what went wrong.
+        pass
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+
+def run_gemini(prompt, cancel=None, on_line=None, timeout=None, cwd=None):
+    """Runs a single gemini process in cwd, raising CalledProcessError on failure.
+
+    The prompt goes to gemini's stdin from a writer thread, so it is never
+    limited by the size of argv nor copied into one buffer. Its stdout is
+    read line by line, and each line is passed to on_line as it arrives.
+    A process still running after timeout seconds is killed, and
+    subprocess.TimeoutExpired raised.
+    """
+    args = ["gemini"]
+    # A process started ahead of time has already booted while git worked.
+    process = take_prespawned(cwd)
+    if process is None:
+        process = subprocess.Popen(
+            args,
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    feed_errors = []
+    writer = threading.Thread(
+        target=_feed_prompt, args=(process.stdin, prompt, feed_errors), daemon=True
+    )
+    writer.start()
+    # Drain stderr in the background, so that gemini never blocks on it.
+    stderr_parts = []
+    reader = threading.Thread(
+        target=lambda: stderr_parts.append(process.stderr.read()), daemon=True
+    )
+    reader.start()
+    finished = threading.Event()
+    killed_for = []
+    if cancel is not None or timeout is not None:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        threading.Thread(
+            target=watch,
+            args=(process.kill, cancel, deadline, finished, killed_for),
+            daemon=True,
+        ).start()
+
+    stdout_lines = []
+    try:
+        for raw_line in process.stdout:
+            line = raw_line.decode(errors="replace")
+            stdout_lines.append(line)
+            if on_line:
+                on_line(line.rstrip("\r\n"))
+        process.wait()
+    except BaseException:
+        # Don't leave gemini running if the caller gives up on it.
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        finished.set()
+        reader.join()
+        writer.join()
+    if cancel is not None and cancel.is_set():
+        raise GenerationCancelled()
+    if killed_for == ["timeout"]:
+        raise subprocess.TimeoutExpired(args, timeout)
+    if feed_errors:
+        raise feed_errors[0]
+
+    stdout = "".join(stdout_lines)
+    stderr = b"".join(stderr_parts).decode(errors="replace")
+    if process.returncode:
+        raise subprocess.CalledProcessError(
+            process.returncode, args, output=stdout, stderr=stderr
+        )
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+def _filter_stderr(stderr):
+    """Filters out informational MCP lines from stderr, but preserves MCPERR."""
+    return "\n".join(
+        line
+        for line in stderr.strip().split("\n")
+        if not line.strip().startswith("MCP") or line.strip().startswith("MCPERR")
+    )
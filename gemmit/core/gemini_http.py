@@ -0,0 +1,424 @@
+# This module implements the backend that calls the Gemini API directly over
+# HTTP. Connections are kept alive and reused, so that only the first request
+# pays for the TCP and TLS handshakes.
+
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+import urllib.parse
+from .backend import FOLLOW_UP, Backend, Session, watch
+from .diff_filter import BYTES_PER_TOKEN
+from .retry import TransientError, classify_error, parse_retry_after
+from ..utils.errors import GenerationCancelled, handle_error
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+DEFAULT_MODEL = "gemini-2.5-flash"
+DEFAULT_API_KEY_ENV = "GEMINI_API_KEY"
+DEFAULT_MAX_CONNECTIONS = 4
+
+# The API refuses to cache prompts below a model-dependent minimum size.
+DEFAULT_CACHE_MIN_TOKENS = 1024
+DEFAULT_CACHE_TTL_SECONDS = 600
+
+# Statuses the API returns for failures that may go away on their own.
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+
+
+class ConnectionPool:
+    """Keeps up to size idle keep-alive connections to one host.
+
+    Connections are taken with acquire() and handed back with release() once
+    their response has been read in full, or closed with discard() if the
+    request failed half-way.
+    """
+
+    def __init__(self, base_url, size=DEFAULT_MAX_CONNECTIONS):
+        url = urllib.parse.urlsplit(base_url)
+        self.https = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip("/")
+        self.size = size
+        self.opened = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Returns (connection, reused): an idle connection or a new one."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+            self.opened += 1
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port), False
+        return http.client.HTTPConnection(self.host, self.port), False
+
+    def release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def discard(self, conn):
+        conn.close()
+
+    def prefill(self):
+        """Opens a connection ahead of time, handshakes included."""
+        conn, reused = self.acquire()
+        if not reused:
+            try:
+                conn.connect()
+            except OSError:
+                conn.close()
+                return
+        self.release(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def _iter_body(prompt=None, turns=(), **fields):
+    """Yields a JSON request body piece by piece.
+
+    prompt (str or PromptStream) is the first user turn, and each chunk of
+    it is escaped on its own, so that a streamed prompt is never held in
+    memory as a whole. turns are (role, text) pairs that follow it, and
+    fields are added at the top level of the request.
+    """
+    from .ai import iter_prompt_chunks
+
+    yield b"{"
+    for name, value in fields.items():
+        yield f"{json.dumps(name)}: {json.dumps(value)}, ".encode()
+    yield b'"contents": ['
+    if prompt is not None:
+        yield b'{"role": "user", "parts": [{"text": "'
+        for chunk in iter_prompt_chunks(prompt):
+            yield json.dumps(chunk)[1:-1].encode()
+        yield b'"}]}'
+        if turns:
+            yield b", "
+    yield ", ".join(json.dumps(_turn(role, text)) for role, text in turns).encode()
+    yield b"]}"
+
+
+def _turn(role, text):
+    return {"role": role, "parts": [{"text": text}]}
+
+
+def _iter_text(response):
+    """Yields the text pieces of a server-sent event stream of API responses."""
+    for raw_line in response:
+        line = raw_line.decode(errors="replace").strip()
+        if not line.startswith("data:"):
+            continue
+        try:
+            event = json.loads(line[len("data:") :])
+        except ValueError:
+            continue
+        for candidate in event.get("candidates", [])[:1]:
+            for part in candidate.get("content", {}).get("parts", []):
+                if part.get("text"):
+                    yield part["text"]
+
+
+def _read_stream(response, on_line):
+    """Reads a streamed generation, passing each line to on_line as it completes."""
+    text = []
+    pending = ""
+    for piece in _iter_text(response):
+        text.append(piece)
+        *lines, pending = (pending + piece).split("\n")
+        if on_line:
+            for line in lines:
+                on_line(line)
+    if pending and on_line:
+        on_line(pending)
+    return "".join(text)
+
+
+class RequestRejected(Exception):
+    """The API refused a request for a reason that retrying cannot fix."""
+
+    def __init__(self, status, body):
+        super().__init__(f"The Gemini API rejected the request ({status}).")
+        self.status = status
+        self.body = body
+
+
+class GeminiHttpBackend(Backend):
+    """Sends prompts to the Gemini API's streaming endpoint from this process.
+
+    There is no CLI to boot, and pooled connections make every request after
+    the first skip the handshakes.
+    """
+
+    name = "http"
+
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+        self.model = self.settings.get("model", DEFAULT_MODEL)
+        self.api_key_env = self.settings.get("api_key_env", DEFAULT_API_KEY_ENV)
+        self.pool = ConnectionPool(
+            self.settings.get("base_url", DEFAULT_BASE_URL),
+            self.settings.get("max_connections", DEFAULT_MAX_CONNECTIONS),
+        )
+
+    def check(self):
+        if not os.environ.get(self.api_key_env):
+            handle_error(
+                f"{self.api_key_env} is not set",
+                "The http backend needs a Gemini API key in that environment variable.",
+            )
+
+    def warm_up(self, cwd=None):
+        threading.Thread(target=self.pool.prefill, daemon=True).start()
+
+    def open_session(self, prompt, cwd=None):
+        return GeminiHttpSession(self, prompt, cwd)
+
+    def close(self):
+        self.pool.close()
+
+    def generate(self, prompt, cancel=None, on_line=None, timeout=None, cwd=None):
+        try:
+            return self.stream(lambda: _iter_body(prompt), cancel, on_line, timeout)
+        except RequestRejected as e:
+            handle_error(str(e), e.body)
+
+    def stream(self, make_body, cancel=None, on_line=None, timeout=None):
+        """Streams the generation for the request body that make_body() yields.
+
+        Raises RequestRejected if the API refuses the request.
+        """
+        return self.send(
+            "POST",
+            f"models/{self.model}:streamGenerateContent?alt=sse",
+            make_body,
+            lambda response: _read_stream(response, on_line),
+            cancel,
+            timeout,
+        )
+
+    def send(self, method, path, make_body, read, cancel=None, timeout=None):
+        """Makes a request under /v1beta and returns read(response) for its answer.
+
+        make_body returns a fresh iterator of the body's bytes, or is None
+        for a request without one. Statuses other than 200 raise
+        TransientError or RequestRejected. A pooled connection that the
+        server has closed meanwhile is replaced by a fresh one.
+        """
+        path = f"{self.pool.prefix}/v1beta/{path}"
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            conn, reused = self.pool.acquire()
+            try:
+                return self._request(
+                    conn, method, path, make_body, read, cancel, deadline
+                )
+            except _StaleConnection:
+                if not reused:
+                    raise TransientError("The Gemini API closed the connection")
+
+    def _request(self, conn, method, path, make_body, read, cancel, deadline):
+        """Makes one request on conn and returns read(response)."""
+        finished = threading.Event()
+        stopped_for = []
+
+        def stop():
+            # Unblocks a read in progress; the request then fails below.
+            if conn.sock is not None:
+                try:
+                    conn.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+        if cancel is not None or deadline is not None:
+            threading.Thread(
+                target=watch,
+                args=(stop, cancel, deadline, finished, stopped_for),
+                daemon=True,
+            ).start()
+
+        if deadline is not None:
+            # A backstop for connecting, which the watcher cannot interrupt.
+            conn.timeout = max(deadline - time.monotonic(), 0.001)
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+
+        headers = {"x-goog-api-key": os.environ.get(self.api_key_env, "")}
+        if make_body is not None:
+            headers["Content-Type"] = "application/json"
+        response = None
+        sent = False
+        failed = None
+        try:
+            conn.request(
+                method,
+                path,
+                body=make_body() if make_body is not None else None,
+                headers=headers,
+                encode_chunked=make_body is not None,
+            )
+            sent = True
+            response = conn.getresponse()
+            if response.status != 200:
+                failed = (response, response.read().decode(errors="replace"))
+            else:
+                result = read(response)
+            self._finish(conn, response)
+        except (OSError, http.client.HTTPException) as e:
+            self.pool.discard(conn)
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled()
+            if stopped_for == ["timeout"] or isinstance(e, socket.timeout):
+                raise TransientError("The Gemini API did not answer in time")
+            if response is None and (
+                not sent or isinstance(e, http.client.RemoteDisconnected)
+            ):
+                # The server closed an idle connection before seeing the request.
+                raise _StaleConnection() from e
+            raise TransientError(f"Connection to the Gemini API failed: {e}")
+        except BaseException:
+            self.pool.discard(conn)
+            raise
+        finally:
+            finished.set()
+        if failed:
+            self._raise_for_status(*failed)
+        return result
+
+    def _finish(self, conn, response):
+        """Returns conn to the pool once its response has been read in full."""
+        response.read()
+        if response.will_close:
+            self.pool.discard(conn)
+        else:
+            self.pool.release(conn)
+
+    def _raise_for_status(self, response, body):
+        status = response.status
+        if status == 429:
+            try:
+                retry_after = float(response.getheader("Retry-After"))
+            except (TypeError, ValueError):
+                retry_after = parse_retry_after(body)
+            raise TransientError(
+                "API quota error (429)",
+                retry_after=retry_after,
+                quota=True,
+                details=body,
+            )
+        if status in TRANSIENT_STATUSES or classify_error(body) == "transient":
+            raise TransientError(f"Transient API error ({status})", details=body)
+        raise RequestRejected(status, body)
+
+
+class GeminiHttpSession(Session):
+    """A conversation whose prompt is kept in the API's context cache.
+
+    The prompt is cached on the first follow-up, so later requests send only
+    the turns after it. A prompt too small to cache, or a cache that has
+    expired, falls back to sending the whole conversation.
+    """
+
+    def __init__(self, backend, prompt, cwd=None):
+        super().__init__(backend, prompt, cwd)
+        self.turns = []
+        self.cache_name = None
+        settings = backend.settings
+        self._cacheable = settings.get("context_cache", True) and (
+            not isinstance(prompt, str)
+            or len(prompt) // BYTES_PER_TOKEN
+            >= settings.get("cache_min_tokens", DEFAULT_CACHE_MIN_TOKENS)
+        )
+
+    def generate(self, cancel=None, on_line=None, timeout=None):
+        if not self.replies:
+            text = self.backend.generate(self.prompt, cancel, on_line, timeout)
+            self._record(text)
+            return text
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        turns = self.turns + [("user", FOLLOW_UP)]
+        if self._cacheable and self.cache_name is None:
+            self._create_cache(cancel, _remaining(deadline))
+        text = None
+        if self.cache_name:
+            try:
+                text = self.backend.stream(
+                    lambda: _iter_body(turns=turns, cachedContent=self.cache_name),
+                    cancel,
+                    on_line,
+                    _remaining(deadline),
+                )
+            except RequestRejected:
+                # The cache has expired or gone; the session carries on without it.
+                self.cache_name = None
+                self._cacheable = False
+        if text is None:
+            try:
+                text = self.backend.stream(
+                    lambda: _iter_body(self.prompt, turns),
+                    cancel,
+                    on_line,
+                    _remaining(deadline),
+                )
+            except RequestRejected as e:
+                handle_error(str(e), e.body)
+        self._record(text)
+        return text
+
+    def seen(self, message):
+        self._record(message)
+
+    def _record(self, text):
+        if self.turns:
+            self.turns.append(("user", FOLLOW_UP))
+        self.turns.append(("model", text))
+        self.replies.append(text)
+
+    def _create_cache(self, cancel, timeout):
+        """Caches the prompt; the session falls back to full requests if that fails."""
+        ttl = self.backend.settings.get("cache_ttl_seconds", DEFAULT_CACHE_TTL_SECONDS)
+        try:
+            self.cache_name = self.backend.send(
+                "POST",
+                "cachedContents",
+                lambda: _iter_body(
+                    self.prompt, model=f"models/{self.backend.model}", ttl=f"{ttl}s"
+                ),
+                lambda response: json.load(response).get("name"),
+                cancel,
+                timeout,
+            )
+        except (RequestRejected, TransientError, ValueError):
+            self.cache_name = None
+        if self.cache_name is None:
+            self._cacheable = False
+
+    def close(self):
+        if self.cache_name:
+            name, self.cache_name = self.cache_name, None
+            try:
+                self.backend.send(
+                    "DELETE", name, None, lambda response: None, timeout=5
+                )
+            except (RequestRejected, TransientError):
+                # It expires on its own after its TTL.
+                pass
+
+
+def _remaining(deadline):
+    return max(deadline - time.monotonic(), 0) if deadline is not None else None
+
+
+class _StaleConnection(Exception):
+    """A pooled connection failed before the server saw the request."""
@@ -1,22 +1,267 @@
 # This module contains helper functions for interacting with Git.
 
+import os
+import shutil
 import subprocess
+import tempfile
 from ..utils.errors import handle_error
+from ..utils.trace import span
 
 
-def get_staged_diff():
-    """Gets the staged diff from git."""
+# Diff compaction levels, from the most detailed to the most compact. Each
+# level keeps the options of the previous one.
+DIFF_LEVELS = {
+    "full": [],
+    "reduced": ["-U1"],
+    "whitespace": ["-U1", "-w", "-M"],
+    "stat": ["--patch-with-stat", "-U0", "-w", "-M"],
+}
+DIFF_LEVEL_ORDER = ["full", "reduced", "whitespace", "stat"]
+
+
+def _diff_args(level, paths=None):
+    if level not in DIFF_LEVELS:
+        handle_error(
+            f"Unknown diff level '{level}'.",
+            f"Valid levels are: {', '.join(DIFF_LEVEL_ORDER)}",
+        )
+    args = ["git", "diff", "--cached"] + DIFF_LEVELS[level]
+    if paths is not None:
+        args += ["--"] + list(paths)
+    return args
+
+
+def _compact_stat(lines):
+    """Keeps the diffstat and the file and hunk headers (with function names)."""
+    in_patch = False
+    for line in lines:
+        if line.startswith("diff --git "):
+            in_patch = True
+            yield line
+        elif not in_patch or line.startswith("@@ "):
+            yield line
+
+
+def get_staged_diff(level="full", cwd=None, paths=None):
+    """Gets the staged diff from git, at the given compaction level.
+
+    With paths, only the changes to those paths are included.
+    """
+    with span("git.diff", level=level) as traced:
+        try:
+            diff = subprocess.check_output(_diff_args(level, paths), cwd=cwd).decode()
+        except subprocess.CalledProcessError as e:
+            handle_error("getting staged diff", e)
+        traced.set(bytes=len(diff))
+    if level == "stat":
+        diff = "".join(_compact_stat(diff.splitlines(keepends=True)))
+    return diff
+
+
+def iter_staged_diff(level="full", cwd=None, paths=None):
+    """Yields the staged diff line by line, straight from the git pipe.
+
+    The diff is never held in memory as a whole, so this is safe for
+    arbitrarily large changes. With paths, only their changes are included.
+    """
+    process = subprocess.Popen(
+        _diff_args(level, paths),
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        lines = (line.decode(errors="replace") for line in process.stdout)
+        if level == "stat":
+            lines = _compact_stat(lines)
+        yield from lines
+        stderr = process.stderr.read().decode(errors="replace")
+        if process.wait():
+            handle_error("getting staged diff", stderr)
+    finally:
+        # Stop git if the consumer gave up on the diff early.
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def get_staged_file_diffs(paths, level="full", cwd=None):
+    """Returns {path: diff} for the staged changes to paths, all from one git process.
+
+    paths are relative to the top of the tree. Renames are shown as a
+    deletion and an addition, as in get_staged_changes. Files without a
+    diff at this level (such as whitespace-only changes with -w), or whose
+    names git quotes, are missing from the result.
+    """
+    if not paths:
+        return {}
+    headers = {f"diff --git a/{path} b/{path}\n": path for path in paths}
+    args = _diff_args(level) + ["--no-renames", "--"]
+    args += [f":(top,literal){path}" for path in paths]
     try:
-        return subprocess.check_output(["git", "diff", "--cached"]).decode()
+        output = subprocess.check_output(args, cwd=cwd).decode(errors="replace")
     except subprocess.CalledProcessError as e:
         handle_error("getting staged diff", e)
 
+    lines = output.splitlines(keepends=True)
+    if level == "stat":
+        lines = _compact_stat(lines)
+    diffs = {}
+    current = None
+    for line in lines:
+        if line.startswith("diff --git "):
+            current = headers.get(line)
+            if current is not None:
+                diffs[current] = []
+        if current is not None:
+            diffs[current].append(line)
+    return {path: "".join(diff) for path, diff in diffs.items()}
 
-def get_current_branch():
+
+def has_staged_changes(cwd=None):
+    """Returns whether anything is staged, without reading the diff."""
+    result = subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=cwd)
+    if result.returncode not in (0, 1):
+        handle_error("checking for staged changes")
+    return result.returncode == 1
+
+
+def get_git_dir(cwd=None):
+    """Returns the absolute path of the git directory of the repository at cwd."""
+    return find_git_dir(cwd) or run_git(["rev-parse", "--absolute-git-dir"], cwd)
+
+
+def get_index_path(cwd=None):
+    """Returns the path of the index git reads at cwd, honouring GIT_INDEX_FILE."""
+    index = os.environ.get("GIT_INDEX_FILE")
+    if index:
+        # Relative paths are relative to the working directory, as for git.
+        return os.path.abspath(os.path.join(cwd or os.getcwd(), index))
+    return os.path.join(get_git_dir(cwd), "index")
+
+
+def get_staged_tree(cwd=None):
+    """Returns the id of the tree the index would commit, or None if it has none.
+
+    The tree is written from a copy of the index, so that the index itself
+    is never locked: a `git add` running meanwhile must not fail because of
+    it. There is no tree while a merge conflict is unresolved.
+    """
+    index = get_index_path(cwd)
+    try:
+        fd, copy = tempfile.mkstemp(dir=os.path.dirname(index), prefix="gemmit-index-")
+    except OSError:
+        return None
+    try:
+        with os.fdopen(fd, "wb") as f, open(index, "rb") as source:
+            shutil.copyfileobj(source, f)
+        result = subprocess.run(
+            ["git", "write-tree"],
+            cwd=cwd,
+            env=dict(os.environ, GIT_INDEX_FILE=copy),
+            capture_output=True,
+        )
+    except OSError:
+        return None
+    finally:
+        try:
+            os.remove(copy)
+        except OSError:
+            pass
+    if result.returncode:
+        return None
+    return result.stdout.decode().strip()
+
+
+def get_staged_numstat(cwd=None):
+    """Returns (added, deleted, path) for each staged file, "-" counts for binaries."""
+    try:
+        output = subprocess.check_output(
+            ["git", "diff", "--cached", "--numstat", "-z"], cwd=cwd
+        ).decode(errors="replace")
+    except subprocess.CalledProcessError as e:
+        handle_error("getting staged file list", e)
+    return parse_numstat(output)
+
+
+def run_git(args, cwd=None, env=None, input=None):
+    """Runs a git plumbing command and returns its output, exiting on failure."""
+    result = subprocess.run(
+        ["git"] + args, cwd=cwd, env=env, input=input, capture_output=True
+    )
+    if result.returncode:
+        handle_error(f"running git {args[0]}", result.stderr.decode(errors="replace"))
+    return result.stdout.decode(errors="surrogateescape").strip()
+
+
+def get_staged_changes(cwd=None):
+    """Returns the staged changes as (old_mode, new_mode, old_sha, new_sha, status, path).
+
+    Renames are reported as a deletion and an addition. Deleted files have
+    a new mode of "000000".
+    """
+    try:
+        output = subprocess.check_output(
+            ["git", "diff", "--cached", "--raw", "-z", "--no-renames", "--no-abbrev"],
+            cwd=cwd,
+        ).decode(errors="surrogateescape")
+    except subprocess.CalledProcessError as e:
+        handle_error("listing staged changes", e)
+    fields = output.split("\0")
+    changes = []
+    for i in range(0, len(fields) - 1, 2):
+        old_mode, new_mode, old_sha, new_sha, status = fields[i].lstrip(":").split()
+        changes.append((old_mode, new_mode, old_sha, new_sha, status, fields[i + 1]))
+    return changes
+
+
+def parse_numstat(output):
+    """Parses 'git diff --numstat -z' output, using the new path of renames."""
+    fields = output.split("\0")
+    entries = []
+    i = 0
+    while i < len(fields) and fields[i]:
+        added, deleted, path = fields[i].split("\t", 2)
+        if path:
+            i += 1
+        else:
+            # Renames and copies are followed by the old and the new path.
+            path = fields[i + 2]
+            i += 3
+        entries.append((added, deleted, path))
+    return entries
+
+
+def get_attributes(paths, attributes, cwd=None):
+    """Returns {path: {attribute: value}} from .gitattributes for the given paths."""
+    try:
+        output = subprocess.run(
+            ["git", "check-attr", "-z", "--stdin"] + attributes,
+            cwd=cwd,
+            input="\0".join(paths).encode(),
+            capture_output=True,
+            check=True,
+        ).stdout.decode(errors="replace")
+    except subprocess.CalledProcessError as e:
+        handle_error("reading .gitattributes", e.stderr)
+
+    fields = output.split("\0")
+    result = {}
+    for i in range(0, len(fields) - 2, 3):
+        path, attribute, value = fields[i : i + 3]
+        result.setdefault(path, {})[attribute] = value
+    return result
+
+
+def get_current_branch(cwd=None):
     """Gets the current git branch name."""
     try:
         return (
-            subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"])
+            subprocess.check_output(
+                ["git", "rev-parse", "--abbrev-ref", "HEAD"], cwd=cwd
+            )
             .decode()
             .strip()
         )
@@ -24,11 +269,11 @@ def get_current_branch():
         handle_error("getting current branch", e)
 
 
-def get_remote_url():
+def get_remote_url(cwd=None):
     """Gets the URL of the remote repository."""
     try:
         return (
-            subprocess.check_output(["git", "remote", "get-url", "origin"])
+            subprocess.check_output(["git", "remote", "get-url", "origin"], cwd=cwd)
             .decode()
             .strip()
         )
@@ -37,9 +282,91 @@ def get_remote_url():
         return ""
 
 
-def stage_all_files():
+def stage_all_files(cwd=None):
     """Stages all tracked files in the repository."""
+    with span("git.add"):
+        try:
+            subprocess.run(["git", "add", "."], cwd=cwd, check=True)
+        except subprocess.CalledProcessError as e:
+            handle_error("staging all files", e)
+
+
+def find_git_dir(cwd=None):
+    """Finds the git directory by walking up from cwd, without spawning git.
+
+    Returns None when the layout is not a plain one (GIT_DIR set, or no .git
+    found), in which case callers should ask git itself.
+    """
+    if "GIT_DIR" in os.environ:
+        return None
+    path = os.path.abspath(cwd or os.getcwd())
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            # Worktrees and submodules point at their git directory.
+            try:
+                with open(dot_git) as f:
+                    line = f.readline().strip()
+            except OSError:
+                return None
+            if not line.startswith("gitdir: "):
+                return None
+            return os.path.normpath(os.path.join(path, line[len("gitdir: ") :]))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def read_head_branch(git_dir):
+    """Reads the branch name from HEAD, "HEAD" when detached, or None if unreadable."""
     try:
-        subprocess.run(["git", "add", "."], check=True)
-    except subprocess.CalledProcessError as e:
-        handle_error("staging all files", e)
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    if head.startswith("ref: refs/heads/"):
+        return head[len("ref: refs/heads/") :]
+    if head.startswith("ref: "):
+        return None
+    return "HEAD"
+
+
+class RepoState:
+    """A snapshot of the repository, collected once and reused through a run.
+
+    Collecting it costs a single git process (the staged numstat); the branch
+    is read from HEAD directly, and the remote URL, which only pushing needs,
+    is looked up on first use.
+    """
+
+    def __init__(self, cwd, branch, numstat):
+        self.cwd = cwd
+        self.branch = branch
+        self.numstat = numstat
+        self._remote_url = None
+
+    @classmethod
+    def collect(cls, cwd=None):
+        """Collects the state of the repository at cwd."""
+        with span("git.repo_state") as traced:
+            numstat = get_staged_numstat(cwd)
+            git_dir = find_git_dir(cwd)
+            branch = read_head_branch(git_dir) if git_dir else None
+            if branch is None:
+                branch = get_current_branch(cwd)
+            traced.set(files=len(numstat))
+        return cls(cwd, branch, numstat)
+
+    @property
+    def has_staged_changes(self):
+        return bool(self.numstat)
+
+    @property
+    def remote_url(self):
+        """The URL of origin, or an empty string if there is none."""
+        if self._remote_url is None:
+            self._remote_url = get_remote_url(self.cwd)
+        return self._remote_url
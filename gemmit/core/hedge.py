@@ -0,0 +1,85 @@
+# This module keeps the latency history that hedged gemini calls adapt to.
+
+import json
+import os
+import tempfile
+import threading
+from .config import load_config
+
+LATENCY_FILE = os.path.expanduser("~/.gemmit/latency.json")
+
+DEFAULT_PERCENTILE = 95
+DEFAULT_MIN_SAMPLES = 10
+DEFAULT_HISTORY_SIZE = 100
+DEFAULT_MAX_HEDGE_FRACTION = 0.2
+
+_lock = threading.Lock()
+
+
+def get_hedge_settings():
+    """Returns the hedge section of the config."""
+    return load_config().get("hedge", {})
+
+
+def _load():
+    """Returns the recent calls as a list of {"seconds", "hedged"} records."""
+    try:
+        with open(LATENCY_FILE) as f:
+            calls = json.load(f).get("calls", [])
+    except (OSError, ValueError, AttributeError):
+        return []
+    return [c for c in calls if isinstance(c, dict) and "seconds" in c]
+
+
+def record_call(seconds, hedged, settings=None):
+    """Adds a successful call's latency to the history, keeping the newest ones."""
+    if settings is None:
+        settings = get_hedge_settings()
+    size = settings.get("history_size", DEFAULT_HISTORY_SIZE)
+    with _lock:
+        calls = _load()
+        calls.append({"seconds": round(seconds, 3), "hedged": hedged})
+        try:
+            os.makedirs(os.path.dirname(LATENCY_FILE), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(LATENCY_FILE), suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump({"calls": calls[-size:]}, f)
+            os.replace(tmp_path, LATENCY_FILE)
+        except OSError:
+            # The history only tunes hedging; never fail a commit because of it.
+            pass
+
+
+def percentile(values, pct):
+    """Returns the pct-th percentile of values (nearest rank)."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def hedge_delay(settings=None):
+    """Returns after how many seconds a call should be hedged, or None not to hedge.
+
+    The delay is the configured percentile of recent latencies. There is no
+    hedging until the history holds min_samples calls, nor while more than
+    max_fraction of recent calls were hedged. Each call is hedged at most
+    once, so max_fraction is capped at 1: hedging never more than doubles
+    quota use.
+    """
+    if settings is None:
+        settings = get_hedge_settings()
+    if not settings.get("enabled", False):
+        return None
+    with _lock:
+        calls = _load()
+    if len(calls) < settings.get("min_samples", DEFAULT_MIN_SAMPLES):
+        return None
+    max_fraction = min(1.0, settings.get("max_fraction", DEFAULT_MAX_HEDGE_FRACTION))
+    hedged = sum(1 for c in calls if c.get("hedged"))
+    if hedged >= max_fraction * len(calls):
+        return None
+    return percentile(
+        [c["seconds"] for c in calls], settings.get("percentile", DEFAULT_PERCENTILE)
+    )
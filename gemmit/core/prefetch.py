@@ -0,0 +1,64 @@
+# This module pre-generates the next candidate commit message in the background.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .ai import generate_commit_message
+from .ratelimit import has_spare_permit
+from ..utils.errors import GenerationCancelled
+
+DEFAULT_MAX_CANDIDATES = 2
+
+
+class Prefetcher:
+    """Speculatively generates the next candidate on a worker thread.
+
+    At most one candidate is in flight at a time, and at most max_candidates
+    are started over the lifetime of the prefetcher. None is started while
+    the rate limiter has no permit to spare, and a candidate never takes
+    the last one. Candidates are asked for in the optional session, which
+    must not be used elsewhere meanwhile.
+    """
+
+    def __init__(self, prompt, max_candidates=DEFAULT_MAX_CANDIDATES, session=None):
+        self.prompt = prompt
+        self.max_candidates = max_candidates
+        self.session = session
+        self.started = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = None
+        self._cancel = None
+
+    def start(self):
+        """Starts generating the next candidate unless one is pending or the cap is hit."""
+        if self._future is not None or self.started >= self.max_candidates:
+            return
+        if not has_spare_permit():
+            return
+        self.started += 1
+        self._cancel = threading.Event()
+        self._future = self._executor.submit(
+            generate_commit_message,
+            self.prompt,
+            use_cache=False,
+            cancel=self._cancel,
+            session=self.session,
+            speculative=True,
+        )
+
+    def take(self):
+        """Returns the pending candidate, waiting for it if needed, or None."""
+        if self._future is None:
+            return None
+        future, self._future = self._future, None
+        return future.result()
+
+    def cancel(self):
+        """Cancels the pending candidate, killing its gemini process."""
+        if self._future is not None:
+            self._cancel.set()
+            try:
+                self._future.result()
+            except (GenerationCancelled, SystemExit):
+                pass
+            self._future = None
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,33 @@
+# This module builds the prompt for the staged changes of a repository.
+
+from .compact import fit_to_budget, get_diff_level
+from .diff_filter import load_diff_filter
+from .file_summaries import build_summarized_prompt, get_file_summary_settings
+from .git import iter_staged_diff
+from .summarize import build_prompt
+
+
+def build_staged_prompt(template, state, use_cache=True, paths=None):
+    """Builds the prompt for a template from the staged diff of the repository in state.
+
+    The diff is streamed from git rather than loaded, however large it is.
+    With paths (relative to the top of the tree), only the changes to those
+    paths are included. With file_summaries enabled, the prompt is built
+    from cached per-file summaries instead.
+    """
+    if get_file_summary_settings().get("enabled", False):
+        return build_summarized_prompt(
+            template, state, use_cache=use_cache, paths=paths
+        )
+    numstat = state.numstat
+    pathspecs = None
+    if paths is not None:
+        wanted = set(paths)
+        numstat = [entry for entry in numstat if entry[2] in wanted]
+        # The paths are taken literally, wherever in the tree cwd is.
+        pathspecs = [f":(top,literal){path}" for path in paths]
+    level = get_diff_level(template)
+    diff_filter = load_diff_filter(numstat=numstat, cwd=state.cwd)
+    diff = diff_filter.wrap(lambda: iter_staged_diff(level, state.cwd, pathspecs))
+    diff = fit_to_budget(template, diff, diff_filter, state.cwd, pathspecs)
+    return build_prompt(template, diff, use_cache=use_cache, cwd=state.cwd)
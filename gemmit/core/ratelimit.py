@@ -0,0 +1,145 @@
+# This module paces backend calls across every gemmit process of the user, so
+# that concurrent invocations share one quota instead of racing for it.
+#
+# The state is a token bucket in a JSON file, read and written under an
+# exclusive lock. Times in it are wall-clock, as they are compared between
+# processes.
+
+import json
+import os
+import time
+from .config import load_config
+from ..utils.errors import GenerationCancelled
+
+try:
+    import fcntl
+except ImportError:
+    # Without file locks (on Windows), calls are not paced across processes.
+    fcntl = None
+
+RATE_LIMIT_FILE = os.path.expanduser("~/.gemmit/ratelimit.json")
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_BURST = 10
+
+
+def get_rate_limit_settings():
+    """Returns the rate_limit section of the config."""
+    return load_config().get("rate_limit", {})
+
+
+def _update(change):
+    """Applies change(state, now) to the shared state under its lock.
+
+    Returns what change returns, or None if the state file cannot be used.
+    """
+    try:
+        os.makedirs(os.path.dirname(RATE_LIMIT_FILE), exist_ok=True)
+        with open(RATE_LIMIT_FILE, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+            if not isinstance(state, dict):
+                state = {}
+            result = change(state, time.time())
+            f.seek(0)
+            f.truncate()
+            json.dump(state, f)
+            return result
+    except OSError:
+        # Pacing only spares the quota; never fail a commit because of it.
+        return None
+
+
+def _refill(state, now, rate, burst):
+    """Adds the tokens earned since the last update, up to burst."""
+    updated = state.get("updated", now)
+    tokens = state.get("tokens", burst)
+    if now > updated:
+        tokens = min(burst, tokens + (now - updated) * rate)
+    # A quota error sets updated ahead, to when refilling resumes.
+    state["updated"] = max(updated, now)
+    state["tokens"] = tokens
+
+
+def acquire(cancel=None, settings=None, reserve=0):
+    """Waits for a permit to make one backend call.
+
+    Permits are shared by all processes: up to burst calls may start at
+    once, and after that requests_per_minute. While a quota error recorded
+    by any process is being waited out, nobody gets one. With reserve, the
+    permit is only taken while that many more are left for other calls,
+    as speculative calls must never take the last one. Raises
+    GenerationCancelled if cancel is set while waiting.
+    """
+    if settings is None:
+        settings = get_rate_limit_settings()
+    if not settings.get("enabled", True) or fcntl is None:
+        return
+    rate = settings.get("requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE) / 60
+    burst = settings.get("burst", DEFAULT_BURST)
+    needed = min(burst, 1 + reserve)
+
+    def take(state, now):
+        blocked_until = state.get("blocked_until", 0)
+        if now < blocked_until:
+            return blocked_until - now
+        _refill(state, now, rate, burst)
+        if state["tokens"] >= needed:
+            state["tokens"] -= 1
+            return 0
+        return (needed - state["tokens"]) / rate
+
+    while True:
+        delay = _update(take)
+        if not delay:
+            return
+        if cancel is None:
+            time.sleep(delay)
+        elif cancel.wait(delay):
+            raise GenerationCancelled()
+
+
+def has_spare_permit(settings=None, reserve=1):
+    """Tells whether a permit can be taken now with reserve more left over.
+
+    Always true when calls are not paced.
+    """
+    if settings is None:
+        settings = get_rate_limit_settings()
+    if not settings.get("enabled", True) or fcntl is None:
+        return True
+    rate = settings.get("requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE) / 60
+    burst = settings.get("burst", DEFAULT_BURST)
+
+    def peek(state, now):
+        if now < state.get("blocked_until", 0):
+            return False
+        _refill(state, now, rate, burst)
+        return state["tokens"] >= min(burst, 1 + reserve)
+
+    return bool(_update(peek))
+
+
+def record_quota_error(delay, settings=None):
+    """Holds back every process's calls for delay seconds after a quota error.
+
+    When the delay is over, a single call may start at once and the others
+    follow at the configured rate, rather than all retrying together.
+    """
+    if settings is None:
+        settings = get_rate_limit_settings()
+    if not settings.get("enabled", True) or fcntl is None:
+        return
+
+    def block(state, now):
+        until = max(state.get("blocked_until", 0), now + delay)
+        state["blocked_until"] = until
+        state["tokens"] = min(state.get("tokens", 1), 1)
+        state["updated"] = until
+        state["quota_errors"] = state.get("quota_errors", 0) + 1
+
+    _update(block)
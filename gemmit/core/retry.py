@@ -0,0 +1,187 @@
+# This module decides when and how long to wait before retrying a backend call.
+
+import random
+import re
+import sys
+import time
+from .config import load_config
+from ..utils.errors import GenerationCancelled
+from ..utils.trace import span
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY_SECONDS = 1.0
+DEFAULT_MAX_DELAY_SECONDS = 60.0
+DEFAULT_JITTER = 0.5
+DEFAULT_ATTEMPT_TIMEOUT_SECONDS = 180.0
+DEFAULT_DEADLINE_SECONDS = 600.0
+
+QUOTA_PATTERNS = [
+    re.compile(r"\b429\b"),
+    re.compile(r"quota exceeded", re.IGNORECASE),
+    re.compile(r"RESOURCE_EXHAUSTED"),
+    re.compile(r"rate limit", re.IGNORECASE),
+]
+
+TRANSIENT_PATTERNS = [
+    re.compile(r"\b(500|502|503|504)\b"),
+    re.compile(r"UNAVAILABLE|DEADLINE_EXCEEDED"),
+    re.compile(r"overloaded", re.IGNORECASE),
+    re.compile(r"ECONNRESET|ECONNREFUSED|ETIMEDOUT|EAI_AGAIN|socket hang up"),
+]
+
+# Delays servers suggest in their error messages, in seconds.
+RETRY_AFTER_PATTERNS = [
+    re.compile(r"retry-after:?\s*(\d+(?:\.\d+)?)", re.IGNORECASE),
+    re.compile(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"'),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+]
+
+
+class TransientError(Exception):
+    """A failed attempt that may succeed if tried again.
+
+    retry_after is the delay the server asked for, if any. quota marks
+    rate limit errors, whose backoff is shared by concurrent calls. details
+    is the backend's error output, shown if all retries fail.
+    """
+
+    def __init__(self, message, retry_after=None, quota=False, details=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.quota = quota
+        self.details = details
+
+
+class RetriesExhausted(Exception):
+    """Raised when no attempt succeeded within the policy's limits."""
+
+    def __init__(self, message, last_error):
+        super().__init__(message)
+        self.last_error = last_error
+
+
+def get_retry_settings():
+    """Returns the retry section of the config."""
+    return load_config().get("retry", {})
+
+
+def classify_error(output):
+    """Classifies a backend's error output as "quota", "transient" or "fatal"."""
+    if any(pattern.search(output) for pattern in QUOTA_PATTERNS):
+        return "quota"
+    if any(pattern.search(output) for pattern in TRANSIENT_PATTERNS):
+        return "transient"
+    return "fatal"
+
+
+def parse_retry_after(output):
+    """Returns the delay in seconds a server suggested in its error output, or None."""
+    for pattern in RETRY_AFTER_PATTERNS:
+        match = pattern.search(output)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter, bounded per attempt and overall."""
+
+    def __init__(
+        self,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        base_delay=DEFAULT_BASE_DELAY_SECONDS,
+        max_delay=DEFAULT_MAX_DELAY_SECONDS,
+        jitter=DEFAULT_JITTER,
+        attempt_timeout=DEFAULT_ATTEMPT_TIMEOUT_SECONDS,
+        deadline=DEFAULT_DEADLINE_SECONDS,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+
+    @classmethod
+    def from_settings(cls, settings=None):
+        """Builds the policy from the retry section of the config."""
+        if settings is None:
+            settings = get_retry_settings()
+        return cls(
+            max_attempts=settings.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+            base_delay=settings.get("base_delay_seconds", DEFAULT_BASE_DELAY_SECONDS),
+            max_delay=settings.get("max_delay_seconds", DEFAULT_MAX_DELAY_SECONDS),
+            jitter=settings.get("jitter", DEFAULT_JITTER),
+            attempt_timeout=settings.get(
+                "attempt_timeout_seconds", DEFAULT_ATTEMPT_TIMEOUT_SECONDS
+            ),
+            deadline=settings.get("deadline_seconds", DEFAULT_DEADLINE_SECONDS),
+        )
+
+    def backoff(self, attempt, retry_after=None):
+        """Returns how long to wait after the given (zero-based) failed attempt.
+
+        A delay suggested by the server is honoured as is. Otherwise the
+        delay doubles with each attempt up to max_delay, and a random part
+        of up to jitter of it is taken off, so that clients that failed
+        together don't retry together.
+        """
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        return delay * (1 - self.jitter * random.random())
+
+    def run(self, attempt, cancel=None, gate=None):
+        """Calls attempt(timeout) until it returns, retrying TransientErrors.
+
+        timeout is what is left of the attempt timeout and the overall
+        deadline. Quota errors close the shared gate, if one is given, so
+        that concurrent calls back off together. Any other exception is
+        raised as is; RetriesExhausted is raised when the attempts or the
+        deadline run out.
+        """
+        deadline = time.monotonic() + self.deadline
+        last_error = None
+        for i in range(self.max_attempts):
+            if gate:
+                with span("quota.wait"):
+                    gate.wait(cancel)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                with span("retry.attempt", attempt=i + 1):
+                    return attempt(min(self.attempt_timeout, remaining))
+            except TransientError as e:
+                last_error = e
+            if i == self.max_attempts - 1:
+                break
+
+            delay = self.backoff(i, last_error.retry_after)
+            if time.monotonic() + delay >= deadline:
+                raise RetriesExhausted(
+                    f"Giving up: retrying in {delay:.1f}s would pass the "
+                    f"{self.deadline:.0f}s deadline.",
+                    last_error,
+                )
+            print(
+                f"{last_error}. Retrying in {delay:.1f}s... [{i + 1}/{self.max_attempts}]",
+                file=sys.stderr,
+            )
+            # With a gate, the wait happens in gate.wait() before the next
+            # attempt, and is traced there.
+            if gate and last_error.quota:
+                gate.close_for(delay)
+            elif cancel is None:
+                with span("retry.sleep", seconds=round(delay, 3)):
+                    time.sleep(delay)
+            else:
+                with span("retry.sleep", seconds=round(delay, 3)):
+                    if cancel.wait(delay):
+                        raise GenerationCancelled()
+
+        raise RetriesExhausted(
+            f"No attempt succeeded ({self.max_attempts} tries, "
+            f"{self.deadline:.0f}s deadline).",
+            last_error,
+        )
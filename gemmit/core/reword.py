@@ -0,0 +1,188 @@
+# This module regenerates the messages of existing commits, for `gemmit reword`.
+#
+# The diffs of the whole range are read from a single `git log -p` process,
+# and each commit's message is generated on a worker pool as soon as its diff
+# has been read. The range is then rewritten with commit-tree, keeping every
+# tree and author, and the branch is moved once at the end.
+
+import os
+import subprocess
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .ai import generate_commit_message
+from .config import load_config
+from .git import DIFF_LEVELS, run_git
+from .summarize import build_prompt
+from ..utils.errors import handle_error
+from ..utils.trace import span
+
+DEFAULT_MAX_WORKERS = 4
+
+# Each commit's header line in the log starts with two NULs, which diff lines
+# never do, and its fields are separated by \x01.
+LOG_FORMAT = "%x00%x00" + "%x01".join(["%H", "%T", "%P", "%an", "%ae", "%ad", "%s"])
+HEADER_MARKER = "\0\0"
+FIELD_SEPARATOR = "\x01"
+
+
+class Commit:
+    """A commit of the range: what is needed to rewrite it, and its diff while pending."""
+
+    def __init__(
+        self, sha, tree, parents, author_name, author_email, author_date, subject
+    ):
+        self.sha = sha
+        self.tree = tree
+        self.parents = parents
+        self.author_name = author_name
+        self.author_email = author_email
+        self.author_date = author_date
+        self.subject = subject
+        self.diff = []
+
+    @property
+    def is_merge(self):
+        return len(self.parents) > 1
+
+
+def get_reword_settings():
+    """Returns the reword section of the config."""
+    return load_config().get("reword", {})
+
+
+def iter_commits(rev_range, level="full", cwd=None):
+    """Yields the commits of rev_range, oldest first, each with its diff.
+
+    All diffs come from one `git log -p` process, read as a stream. Merges
+    have no diff.
+    """
+    args = [
+        "git",
+        "log",
+        "-p",
+        "--reverse",
+        "--topo-order",
+        "--date=raw",
+        "--no-color",
+        f"--format={LOG_FORMAT}",
+    ]
+    args += DIFF_LEVELS[level] + [rev_range, "--"]
+    process = subprocess.Popen(
+        args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    try:
+        commit = None
+        for raw in process.stdout:
+            line = raw.decode(errors="replace")
+            if line.startswith(HEADER_MARKER):
+                if commit:
+                    yield commit
+                fields = line[len(HEADER_MARKER) :].rstrip("\n").split(FIELD_SEPARATOR)
+                sha, tree, parents, name, email, date, subject = fields
+                commit = Commit(sha, tree, parents.split(), name, email, date, subject)
+            elif commit and (commit.diff or line.strip()):
+                commit.diff.append(line)
+        if commit:
+            yield commit
+        stderr = process.stderr.read().decode(errors="replace")
+        if process.wait():
+            handle_error(f"reading the commits of {rev_range}", stderr)
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def _generate(template, commit, use_cache, cancel):
+    diff = "".join(commit.diff)
+    commit.diff = []
+    with span("reword.commit", commit=commit.sha[:10], bytes=len(diff)):
+        prompt = build_prompt(template, diff, use_cache=use_cache)
+        return generate_commit_message(prompt, use_cache=use_cache, cancel=cancel)
+
+
+def generate_messages(
+    commits,
+    template,
+    use_cache=True,
+    max_workers=DEFAULT_MAX_WORKERS,
+    on_message=None,
+):
+    """Generates a new message for each commit while the commits are still being read.
+
+    commits may be a lazy iterator (see iter_commits); only a few diffs
+    are held in memory at once. Merges and commits without changes keep
+    their message. Returns the
+    commits in order and {sha: message}. on_message is called with each
+    commit and its message as soon as it is ready.
+    """
+    max_workers = max(1, max_workers)
+    cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    read = []
+    futures = {}
+    pending = set()
+    messages = {}
+
+    def collect(done):
+        for future in done:
+            commit = futures[future]
+            messages[commit.sha] = future.result()
+            if on_message:
+                on_message(commit, messages[commit.sha])
+
+    try:
+        for commit in commits:
+            read.append(commit)
+            if commit.is_merge or not commit.diff:
+                continue
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(_generate, template, commit, use_cache, cancel)
+            futures[future] = commit
+            pending.add(future)
+        collect(wait(pending).done)
+        return read, messages
+    finally:
+        # If one commit failed, stop the others instead of waiting for them.
+        cancel.set()
+        executor.shutdown(wait=True)
+
+
+def rewrite(commits, messages, cwd=None):
+    """Recreates commits (oldest first) with the new messages; returns {old: new}.
+
+    Trees, authors and author dates are kept; the committer is you, as with
+    a rebase. Merges keep their message, with their parents rewritten.
+    Commits without a new message are recreated as they were, so that their
+    descendants can be rewritten. Nothing is checked out.
+    """
+    rewritten = {}
+    for commit in commits:
+        message = messages.get(commit.sha)
+        if message is None:
+            message = run_git(["log", "-1", "--format=%B", commit.sha], cwd)
+        args = ["commit-tree", commit.tree, "-F", "-"]
+        for parent in commit.parents:
+            args += ["-p", rewritten.get(parent, parent)]
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME=commit.author_name,
+            GIT_AUTHOR_EMAIL=commit.author_email,
+            GIT_AUTHOR_DATE=commit.author_date,
+        )
+        with span("reword.rewrite", commit=commit.sha[:10]):
+            rewritten[commit.sha] = run_git(
+                args, cwd, env, input=(message.strip() + "\n").encode()
+            )
+    return rewritten
+
+
+def update_head(old_head, new_head, rev_range, cwd=None):
+    """Moves HEAD (and its branch) to new_head, if it is still at old_head."""
+    run_git(
+        ["update-ref", "-m", f"reword: {rev_range}", "HEAD", new_head, old_head], cwd
+    )
@@ -0,0 +1,166 @@
+# This module splits the staged changes into several commits, for --split.
+#
+# Staged files are grouped by directory or file type, a message is generated
+# for each group in parallel, and the commits are then built one on top of the
+# other with git plumbing in a temporary index. The real index and the working
+# tree are never touched: once all groups are committed, HEAD's tree is
+# exactly what was staged.
+
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from .ai import generate_commit_message
+from .config import load_config
+from .git import run_git
+from .prompt import build_staged_prompt
+from ..utils.errors import handle_error
+from ..utils.trace import span
+
+DEFAULT_GROUP_BY = "directory"
+DEFAULT_DEPTH = 1
+DEFAULT_MAX_GROUPS = 8
+DEFAULT_MAX_WORKERS = 4
+
+GROUP_BY = ("directory", "type")
+
+# How git marks a deleted file in the raw diff.
+DELETED_MODE = "000000"
+
+
+def get_split_settings():
+    """Returns the split section of the config."""
+    return load_config().get("split", {})
+
+
+def group_key(path, group_by=DEFAULT_GROUP_BY, depth=DEFAULT_DEPTH):
+    """Returns the name of the group a path belongs to.
+
+    By directory, it is the first depth directories of the path ("." for
+    files at the top). By type, it is the file extension, or the file name
+    for files without one (such as Makefile).
+    """
+    if group_by == "type":
+        name = os.path.basename(path)
+        extension = os.path.splitext(name)[1]
+        return extension or name
+    parts = path.split("/")[:-1]
+    return "/".join(parts[:depth]) or "."
+
+
+def group_changes(changes, numstat=(), settings=None):
+    """Groups staged changes (see git.get_staged_changes) into [(name, changes)].
+
+    Groups are ordered by name. When there are more than max_groups, the
+    largest ones (by lines changed) are kept and the rest are merged into
+    one last group called "other".
+    """
+    if settings is None:
+        settings = get_split_settings()
+    group_by = settings.get("group_by", DEFAULT_GROUP_BY)
+    if group_by not in GROUP_BY:
+        handle_error(
+            f"Unknown split grouping '{group_by}'.",
+            f"Valid groupings are: {', '.join(GROUP_BY)}",
+        )
+    depth = settings.get("depth", DEFAULT_DEPTH)
+    max_groups = max(1, settings.get("max_groups", DEFAULT_MAX_GROUPS))
+
+    groups = {}
+    for change in changes:
+        groups.setdefault(group_key(change[5], group_by, depth), []).append(change)
+    if len(groups) <= max_groups:
+        return sorted(groups.items())
+
+    lines = {}
+    for added, deleted, path in numstat:
+        # Binary files count as one line.
+        lines[path] = int(added) + int(deleted) if added != "-" else 1
+    sizes = {
+        name: sum(lines.get(change[5], 1) for change in members)
+        for name, members in groups.items()
+    }
+    kept = sorted(groups, key=lambda name: -sizes[name])[: max_groups - 1]
+    other = [
+        change for name in sorted(groups) if name not in kept for change in groups[name]
+    ]
+    return sorted((name, groups[name]) for name in kept) + [("other", other)]
+
+
+def generate_group_messages(template, state, groups, use_cache=True, cancel=None):
+    """Generates a message for each group at the same time; returns them in order."""
+    settings = get_split_settings()
+    max_workers = max(
+        1, min(len(groups), settings.get("max_workers", DEFAULT_MAX_WORKERS))
+    )
+
+    def generate(group):
+        name, changes = group
+        with span("split.group", group=name, files=len(changes)):
+            paths = [change[5] for change in changes]
+            prompt = build_staged_prompt(template, state, use_cache, paths)
+            return generate_commit_message(
+                prompt, use_cache=use_cache, cancel=cancel, cwd=state.cwd
+            )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(generate, groups))
+
+
+def _index_info(changes):
+    """Formats changes for `git update-index -z --index-info`."""
+    records = []
+    for _, new_mode, _, new_sha, _, path in changes:
+        if new_mode == DELETED_MODE:
+            # Mode 0 removes the path from the index.
+            records.append(f"0 {new_sha}\t{path}")
+        else:
+            records.append(f"{new_mode} {new_sha}\t{path}")
+    return ("\0".join(records) + "\0").encode(errors="surrogateescape")
+
+
+def commit_groups(groups, messages, cwd=None):
+    """Commits each group with its message, in order, on top of HEAD.
+
+    The trees are built in a temporary index from HEAD's tree plus each
+    group's staged blobs, so nothing is re-staged. HEAD is moved once, at
+    the end, and only if it has not moved in the meantime. Returns the new
+    commits' hashes. Commit hooks do not run.
+    """
+    # Plumbing takes paths from the top of the tree.
+    cwd = run_git(["rev-parse", "--show-toplevel"], cwd)
+    head = subprocess.run(
+        ["git", "rev-parse", "-q", "--verify", "HEAD"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    commits = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, GIT_INDEX_FILE=os.path.join(tmp, "index"))
+        run_git(["read-tree", head] if head else ["read-tree", "--empty"], cwd, env)
+        parent = head
+        for (name, changes), message in zip(groups, messages):
+            with span("split.commit", group=name):
+                run_git(
+                    ["update-index", "-z", "--index-info"],
+                    cwd,
+                    env,
+                    input=_index_info(changes),
+                )
+                tree = run_git(["write-tree"], cwd, env)
+                args = ["commit-tree", tree, "-F", "-"]
+                if parent:
+                    args += ["-p", parent]
+                parent = run_git(
+                    args, cwd, env, input=(message.strip() + "\n").encode()
+                )
+                commits.append(parent)
+
+    subject = messages[-1].split("\n", 1)[0]
+    # An empty old value makes sure an unborn branch is still unborn.
+    run_git(
+        ["update-ref", "-m", f"commit (split): {subject}", "HEAD", parent, head],
+        cwd,
+    )
+    return commits
@@ -0,0 +1,164 @@
+# This module builds prompts for large diffs by summarizing them in parts.
+
+import itertools
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .ai import PromptStream, generate_commit_message
+from .config import load_config
+from .diff_filter import BYTES_PER_TOKEN
+
+DEFAULT_THRESHOLD_BYTES = 100000
+DEFAULT_CHUNK_BYTES = 65536
+DEFAULT_MAX_WORKERS = 4
+
+SUMMARY_PROMPT = (
+    "Summarize the following part of a larger git diff as a short bulleted list "
+    "of the changes it makes. Mention the affected files and the intent of the "
+    "changes. Do not write a commit message."
+)
+
+MERGE_PREAMBLE = (
+    "The staged diff is too large to show in full. "
+    "Summaries of its parts follow, use them in place of the diff."
+)
+
+
+def get_large_diff_settings():
+    """Returns the large_diff section of the config."""
+    return load_config().get("large_diff", {})
+
+
+def get_budget_bytes(template):
+    """Returns how many bytes of diff a template's token budget leaves room for.
+
+    Returns None for a template without a budget.
+    """
+    budget = template.get("token_budget", 0)
+    if not budget:
+        return None
+    return budget * BYTES_PER_TOKEN - len(template.get("prompt", ""))
+
+
+def build_prompt(template, diff, use_cache=True, settings=None, cwd=None):
+    """Builds the prompt for a template and diff, summarizing the diff if it is large.
+
+    diff is either the diff as a str, or a function returning a fresh iterator
+    over its lines (such as git.iter_staged_diff). A streamed diff is only
+    read into memory up to the large diff threshold. A diff over the
+    template's token budget is summarized too, however small the threshold.
+    The summaries are generated for the repository at cwd.
+    """
+    if settings is None:
+        settings = get_large_diff_settings()
+    template_prompt = template.get("prompt", "")
+    threshold = settings.get("threshold_bytes", DEFAULT_THRESHOLD_BYTES)
+    budget_bytes = get_budget_bytes(template)
+    if threshold and budget_bytes is not None:
+        threshold = max(1, min(threshold, budget_bytes))
+
+    if isinstance(diff, str):
+        if not threshold or len(diff) <= threshold:
+            return template_prompt + "\n\n" + diff
+        lines = iter(diff.splitlines(keepends=True))
+        head = []
+    elif not threshold:
+        return PromptStream(template_prompt, diff)
+    else:
+        lines = iter(diff())
+        head = []
+        size = 0
+        for line in lines:
+            head.append(line)
+            size += len(line)
+            if size > threshold:
+                break
+        else:
+            return template_prompt + "\n\n" + "".join(head)
+
+    print("Large diff, summarizing it in parts...")
+    chunks = iter_chunks(
+        itertools.chain(head, lines),
+        settings.get("chunk_bytes", DEFAULT_CHUNK_BYTES),
+    )
+    summaries = summarize_chunks(
+        chunks, settings.get("max_workers", DEFAULT_MAX_WORKERS), use_cache, cwd=cwd
+    )
+    return "\n\n".join([template_prompt, MERGE_PREAMBLE] + summaries)
+
+
+def summarize_chunks(
+    chunks, max_workers=DEFAULT_MAX_WORKERS, use_cache=True, cancel=None, cwd=None
+):
+    """Summarizes diff chunks in parallel, returning the summaries in chunk order.
+
+    chunks may be a lazy iterator; only a few chunks are held in memory at once.
+    Setting the optional cancel event stops the calls still running, as does
+    a failed chunk. The backend runs for the repository at cwd.
+    """
+    max_workers = max(1, max_workers)
+    if cancel is None:
+        cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = []
+    pending = set()
+    try:
+        for chunk in chunks:
+            if len(pending) >= 2 * max_workers:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            future = executor.submit(
+                generate_commit_message,
+                SUMMARY_PROMPT + "\n\n" + chunk,
+                use_cache=use_cache,
+                cancel=cancel,
+                cwd=cwd,
+            )
+            futures.append(future)
+            pending.add(future)
+        return [future.result() for future in futures]
+    except BaseException:
+        # If one chunk failed, stop the others instead of waiting for them.
+        cancel.set()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
+def iter_chunks(lines, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Groups diff lines into chunks of about chunk_bytes, cut at file or hunk starts.
+
+    A chunk that continues a file repeats that file's header, and a single hunk
+    larger than chunk_bytes is cut at line boundaries.
+    """
+    buffer = []
+    size = 0
+    # Index in buffer of the last file or hunk start, where a cut is cleanest.
+    boundary = 0
+    header = []
+    in_header = False
+
+    for line in lines:
+        if line.startswith("diff --git "):
+            header = [line]
+            in_header = True
+            boundary = len(buffer)
+        elif line.startswith("@@ "):
+            in_header = False
+            boundary = len(buffer)
+        elif in_header:
+            header.append(line)
+
+        if buffer and size + len(line) > chunk_bytes:
+            cut = boundary if boundary > 0 else len(buffer)
+            yield "".join(buffer[:cut])
+            buffer = buffer[cut:]
+            upcoming = buffer[0] if buffer else line
+            if not in_header and not upcoming.startswith("diff --git "):
+                buffer = header + buffer
+            size = sum(len(part) for part in buffer)
+            boundary = 0
+
+        buffer.append(line)
+        size += len(line)
+
+    if buffer:
+        yield "".join(buffer)
@@ -0,0 +1,39 @@
+# This module records how long generations take, to measure perceived latency.
+
+import json
+import os
+import time
+from .config import load_config
+
+TIMINGS_FILE = os.path.expanduser("~/.gemmit/timings.jsonl")
+
+
+def get_timing_settings():
+    """Returns the timings section of the config."""
+    return load_config().get("timings", {})
+
+
+def record_timing(first_line_seconds, total_seconds, cached, settings=None):
+    """Appends a generation's time to first line and total time to the timings file.
+
+    first_line_seconds is None when the generation produced no message lines.
+    Nothing is recorded unless timings are enabled in the config.
+    """
+    if settings is None:
+        settings = get_timing_settings()
+    if not settings.get("enabled", False):
+        return
+    record = {
+        "time": time.time(),
+        "first_line_seconds": first_line_seconds,
+        "total_seconds": total_seconds,
+        "cached": cached,
+    }
+    try:
+        os.makedirs(os.path.dirname(TIMINGS_FILE), exist_ok=True)
+        # A single short append is atomic, so concurrent runs never interleave.
+        with open(TIMINGS_FILE, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        # Timings are diagnostics; never fail a commit because of them.
+        pass
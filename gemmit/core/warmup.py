@@ -0,0 +1,96 @@
+# This module starts the gemini process ahead of time, so that it boots while
+# git is still computing the diff. gemini reads its prompt from stdin, so it
+# can be started before the prompt exists.
+
+import atexit
+import os
+import shutil
+import subprocess
+import threading
+from .config import load_config
+
+_lock = threading.Lock()
+# (directory, process) pairs: gemini reads its context from the directory it
+# runs in, so a process is only used for requests in the same one.
+_prespawned = []
+_cleanup_registered = []
+
+
+def get_startup_settings():
+    """Returns the startup section of the config."""
+    return load_config().get("startup", {})
+
+
+def _directory(cwd):
+    return os.path.realpath(cwd or os.getcwd())
+
+
+def prespawn_gemini(settings=None, cwd=None):
+    """Starts a gemini process in cwd for the next generation to use, if enabled.
+
+    At most one process is kept waiting; one waiting in another directory
+    is replaced. Returns True if one was started.
+    """
+    if settings is None:
+        settings = get_startup_settings()
+    if not settings.get("prespawn_gemini", True) or not shutil.which("gemini"):
+        return False
+    directory = _directory(cwd)
+    with _lock:
+        stale = [entry for entry in _prespawned if entry[0] != directory]
+        if len(stale) < len(_prespawned):
+            return False
+        del _prespawned[:]
+    for _, process in stale:
+        process.kill()
+        _close(process)
+    try:
+        process = subprocess.Popen(
+            ["gemini"],
+            cwd=directory,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except OSError:
+        return False
+    with _lock:
+        if not _cleanup_registered:
+            atexit.register(discard_prespawned)
+            _cleanup_registered.append(True)
+        _prespawned.append((directory, process))
+    return True
+
+
+def take_prespawned(cwd=None):
+    """Returns a running gemini process prespawned in cwd, or None if there is none."""
+    directory = _directory(cwd)
+    with _lock:
+        for entry in list(_prespawned):
+            if entry[0] != directory:
+                continue
+            _prespawned.remove(entry)
+            process = entry[1]
+            if process.poll() is None:
+                return process
+            _close(process)
+    return None
+
+
+def discard_prespawned():
+    """Kills prespawned processes that were never used (say, on a cache hit)."""
+    with _lock:
+        processes = [process for _, process in _prespawned]
+        del _prespawned[:]
+    for process in processes:
+        process.kill()
+        _close(process)
+
+
+def _close(process):
+    for pipe in (process.stdin, process.stdout, process.stderr):
+        try:
+            pipe.close()
+        except OSError:
+            pass
+    process.wait()
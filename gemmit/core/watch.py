@@ -0,0 +1,344 @@
+# This module pre-generates commit messages while files are being staged.
+#
+# The watcher waits for the index to change (with inotify where available,
+# by polling its stat otherwise), lets it settle for a debounce period, and
+# generates a message for the staged tree in the background. The message is
+# stored in the git directory under the HEAD and staged tree it was made for,
+# so that `gemmit` or the prepare-commit-msg hook can use it at once if the
+# index has not changed since. The index's stat is stored with it, so that
+# checking an unchanged index costs a stat rather than a write-tree. A
+# generation whose index state is already out of date is cancelled.
+
+import json
+import os
+import select
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from .config import load_config
+from .git import (
+    get_git_dir,
+    get_index_path,
+    get_staged_tree,
+    has_staged_changes,
+    RepoState,
+)
+from ..utils.errors import GenerationCancelled
+from ..utils.trace import span
+
+READY_FILE = "gemmit-ready.json"
+
+DEFAULT_DEBOUNCE_SECONDS = 1.0
+DEFAULT_POLL_INTERVAL_SECONDS = 0.5
+
+# inotify(7) events that mean a file in the directory was replaced or written.
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def get_watch_settings():
+    """Returns the watch section of the config."""
+    return load_config().get("watch", {})
+
+
+def get_head(cwd=None):
+    """Returns the commit HEAD points to, or "" on an unborn branch."""
+    return subprocess.run(
+        ["git", "rev-parse", "-q", "--verify", "HEAD"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def index_stamp(cwd=None):
+    """Returns [inode, size, mtime_ns] of the index, or None if it cannot be read.
+
+    git rewrites the index whenever it changes, so an equal stamp means an
+    equal index.
+    """
+    try:
+        st = os.stat(get_index_path(cwd))
+    except OSError:
+        return None
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def _ready_path(cwd=None):
+    return os.path.join(get_git_dir(cwd), READY_FILE)
+
+
+def write_ready_message(head, tree, template_name, message, cwd=None, stamp=None):
+    """Atomically stores the message generated for HEAD and the staged tree.
+
+    stamp is the index_stamp taken before the tree was computed; without
+    one, readers always compute the tree to check the message.
+    """
+    entry = {
+        "head": head,
+        "tree": tree,
+        "index": stamp,
+        "template": template_name,
+        "message": message,
+        "created": time.time(),
+    }
+    _write_entry(_ready_path(cwd), entry)
+
+
+def _write_entry(path, entry):
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # A missed pre-generation only costs the usual wait at commit time.
+        return
+
+
+def read_ready_message(template_name=None, cwd=None):
+    """Returns the pre-generated message if it is for the current HEAD and index.
+
+    With template_name, the message must also have been generated with that
+    template. Costs a single file read when no message is ready, and the
+    tree is only computed when the index was written since the message was.
+    """
+    path = _ready_path(cwd)
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if template_name and entry.get("template") != template_name:
+        return None
+    with span("watch.check_ready") as traced:
+        if entry.get("head") != get_head(cwd):
+            return None
+        stamp = index_stamp(cwd)
+        unchanged = stamp is not None and entry.get("index") == stamp
+        traced.set(index_unchanged=unchanged)
+        if not unchanged:
+            if entry.get("tree") != get_staged_tree(cwd):
+                return None
+            # The index was rewritten with the same contents (say, by
+            # `git add` of an unchanged file): spare the next read the tree.
+            _write_entry(path, dict(entry, index=stamp))
+    return entry.get("message")
+
+
+class PollMonitor:
+    """Notices index changes by comparing its stat at a fixed interval."""
+
+    def __init__(self, index, interval=DEFAULT_POLL_INTERVAL_SECONDS):
+        self.index = index
+        self.interval = interval
+        self._signature = self._stat()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.index)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def wait(self, timeout):
+        """Returns True as soon as the index changes, or False after timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            signature = self._stat()
+            if signature != self._signature:
+                self._signature = signature
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyMonitor:
+    """Notices index changes through inotify on its directory (Linux only).
+
+    git replaces the index by renaming index.lock over it, so the directory
+    is watched rather than the file.
+    """
+
+    def __init__(self, index):
+        import ctypes
+        import ctypes.util
+
+        self.name = os.fsencode(os.path.basename(index))
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        directory = os.fsencode(os.path.dirname(index))
+        if libc.inotify_add_watch(self.fd, directory, mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        """Returns True as soon as the index changes, or False after timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if readable and self._read_events():
+                return True
+
+    def _read_events(self):
+        """Reads the pending events; returns whether one was about the index."""
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return False
+        changed = False
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            changed = changed or name == self.name
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_monitor(index, poll=False, poll_interval=DEFAULT_POLL_INTERVAL_SECONDS):
+    """Returns an inotify monitor for the index, or a polling one if unavailable."""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyMonitor(index)
+        except (OSError, AttributeError):
+            pass
+    return PollMonitor(index, poll_interval)
+
+
+class Watcher:
+    """Keeps a message ready for the staged changes of a repository.
+
+    Only the latest index state is generated for: when the index settles in
+    a new state, the generation for the previous one is cancelled. on_event is
+    called with an event name, the (head, tree) key it is about and, once
+    ready, the message.
+    """
+
+    def __init__(
+        self,
+        template_name,
+        cwd=None,
+        debounce=DEFAULT_DEBOUNCE_SECONDS,
+        use_cache=True,
+        on_event=None,
+    ):
+        self.template_name = template_name
+        self.cwd = cwd
+        self.debounce = debounce
+        self.use_cache = use_cache
+        self.on_event = on_event or (lambda event, key, message=None: None)
+        self._lock = threading.Lock()
+        self._key = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def current_key(self):
+        """Returns (head, tree) for the index, or None if there is nothing to generate."""
+        return self._current_state()[0]
+
+    def _current_state(self):
+        """Returns the current key and the index_stamp it was computed from."""
+        stamp = index_stamp(self.cwd)
+        if not has_staged_changes(self.cwd):
+            return None, stamp
+        tree = get_staged_tree(self.cwd)
+        if tree is None:
+            return None, stamp
+        return (get_head(self.cwd), tree), stamp
+
+    def refresh(self):
+        """Starts a generation for the current index, unless one is running or done."""
+        key, stamp = self._current_state()
+        with self._lock:
+            if key == self._key:
+                return
+            if self._thread is not None and self._thread.is_alive():
+                self._cancel.set()
+                self.on_event("cancelled", self._key)
+            self._key = key
+            if key is None:
+                self.on_event("empty", key)
+                return
+            self._cancel = threading.Event()
+            self._thread = threading.Thread(
+                target=self._generate, args=(key, stamp, self._cancel), daemon=True
+            )
+            self.on_event("generating", key)
+            self._thread.start()
+
+    def _generate(self, key, stamp, cancel):
+        # Imported here, so that reading a ready message stays light.
+        from .ai import generate_commit_message
+        from .config import get_template
+        from .prompt import build_staged_prompt
+
+        try:
+            with span("watch.generate", tree=key[1][:10]):
+                template = get_template(self.template_name)
+                state = RepoState.collect(self.cwd)
+                prompt = build_staged_prompt(template, state, use_cache=self.use_cache)
+                # The index may have changed while it was being diffed, in
+                # which case the prompt is not the one for this key.
+                if cancel.is_set() or self.current_key() != key:
+                    return
+                message = generate_commit_message(
+                    prompt, use_cache=self.use_cache, cancel=cancel, cwd=self.cwd
+                )
+        except GenerationCancelled:
+            return
+        except SystemExit:
+            # The error has already been reported; the next change retries.
+            self.on_event("failed", key)
+            return
+        with self._lock:
+            if cancel.is_set() or key != self._key:
+                return
+            write_ready_message(
+                key[0], key[1], self.template_name, message, self.cwd, stamp
+            )
+        self.on_event("ready", key, message)
+
+    def run(self, stop, poll=False, poll_interval=DEFAULT_POLL_INTERVAL_SECONDS):
+        """Watches the index until the stop event is set."""
+        monitor = open_monitor(get_index_path(self.cwd), poll, poll_interval)
+        try:
+            self.refresh()
+            while not stop.is_set():
+                if not monitor.wait(min(self.debounce, 1.0)):
+                    continue
+                # Let a burst of `git add` calls settle first.
+                while monitor.wait(self.debounce) and not stop.is_set():
+                    pass
+                self.refresh()
+        finally:
+            monitor.close()
+            self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Waits for the running generation, if any, to finish."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
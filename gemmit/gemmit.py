@@ -1,25 +1,114 @@
 #!/usr/bin/env python3
 
 import argparse
+import os
 import sys
 import subprocess
-from .commands.generate import run as generate_run
 from .core.config import get_template, set_default_template, load_config
-from .core.git import (
-    get_staged_diff,
-    stage_all_files,
-    get_current_branch,
-    get_remote_url,
-)
+from .core.git import RepoState, stage_all_files
+from .core.backend import warm_up_backend
+from .utils.background import BackgroundTask
 from .utils.errors import handle_error
-from .core.ai import generate_commit_message
+from .utils.trace import enable as enable_trace, enable_from_env, span
+
+# Modules that pull in rich, thread pools or hashing are imported in the
+# branches that need them, so that quick paths such as --set-default or an
+# empty index stay fast when gemmit runs from hooks and scripts.
+
+
+def _collect_staged_state():
+    """Collects everything the run needs to know about the repository, in one pass.
+
+    Exits when nothing is staged.
+    """
+    state = RepoState.collect()
+    if not state.has_staged_changes:
+        print("No staged changes found.")
+        sys.exit(0)
+    return state
+
+
+def _generate_in_daemon(template_name, use_cache):
+    """Asks a running daemon for the commit message; returns None to generate in-process."""
+    from .core.daemon import request_generation
+
+    reply = request_generation(os.getcwd(), template_name, use_cache)
+    if reply is None:
+        return None
+    if reply["status"] == "empty":
+        print("No staged changes found.")
+        sys.exit(0)
+    if reply["status"] != "ok":
+        handle_error("generating commit message in the daemon", reply["error"])
+    return reply["message"]
+
+
+def _ready_message(template_name, use_cache):
+    """Returns the message `gemmit watch` prepared for the index, if still current."""
+    if not use_cache:
+        return None
+    from .core.watch import read_ready_message
+
+    return read_ready_message(template_name)
+
+
+def _push(state):
+    """Pushes the current branch to origin."""
+    try:
+        if state is None:
+            state = RepoState.collect()
+        branch = state.branch
+        remote_url = state.remote_url
+        config = load_config()
+        highlight_color = config.get("highlight_color", "green")
+        from rich.console import Console
+
+        console = Console()
+        if remote_url:
+            console.print(
+                f"[{highlight_color}]Pushing to {remote_url}...[/{highlight_color}]"
+            )
+        else:
+            console.print(f"[{highlight_color}]Pushing changes...[/{highlight_color}]")
+        with span("push"):
+            subprocess.run(["git", "push", "-u", "origin", branch], check=True)
+    except subprocess.CalledProcessError as e:
+        handle_error("pushing changes", e)
 
 
 def main():
     """Main entry point for the gemmit tool."""
+    enable_from_env()
+    if sys.argv[1:2] == ["daemon"]:
+        from .commands.daemon import run as daemon_run
+
+        daemon_run(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["batch"]:
+        from .commands.batch import run as batch_run
+
+        batch_run(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["reword"]:
+        from .commands.reword import run as reword_run
+
+        reword_run(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["watch"]:
+        from .commands.watch import run as watch_run
+
+        watch_run(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description="A tool to generate commit messages using AI.",
-        usage="gemmit <template> [<args>]",
+        usage=(
+            "gemmit <template> [<args>]\n"
+            "       gemmit batch [<args>] <path>...\n"
+            "       gemmit reword [<args>] <range>\n"
+            "       gemmit watch [<args>]\n"
+            "       gemmit daemon [--stop | --status]"
+        ),
     )
 
     parser.add_argument(
@@ -46,68 +135,150 @@ def main():
     parser.add_argument(
         "-y", "--yes", action="store_true", help="Skip confirmation prompt."
     )
+    parser.add_argument(
+        "-c",
+        "--candidates",
+        type=int,
+        metavar="N",
+        help="Generate N candidate messages in parallel and pick one.",
+    )
+    parser.add_argument(
+        "--split",
+        action="store_true",
+        help="Split the staged changes into several commits, by directory or type.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Bypass the cache of generated messages.",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Remove all cached messages and file summaries, and exit.",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Print a JSON breakdown of where the time went to stderr.",
+    )
 
     args, unknown_args = parser.parse_known_args()
+    if args.yes and args.candidates and args.candidates > 1:
+        # Candidates exist to be picked from, which -y would skip.
+        parser.error(
+            "--candidates asks you to pick a message; it cannot be used with -y."
+        )
+    if args.trace:
+        enable_trace()
 
     if args.default_template:
         set_default_template(args.default_template)
         return
 
+    if args.clear_cache:
+        from .core.cache import clear_cache
+        from .core.file_summaries import SUMMARY_DIR
+
+        removed = clear_cache()
+        summaries = clear_cache(SUMMARY_DIR)
+        print(f"Removed {removed} cached message(s) and {summaries} file summary(ies).")
+        return
+
+    # Steps that don't depend on each other overlap: staging runs in the
+    # background while the config is read, and once a generation is known to
+    # be needed, the backend warms up (gemini boots, or a connection opens)
+    # while git diffs. Staging still completes before anything reads the index.
+    staging = None
     if args.add:
         print("Adding all files...")
-        stage_all_files()
+        staging = BackgroundTask(stage_all_files)
 
     template_name = args.template
     if not template_name:
-        config = load_config()
+        with span("config"):
+            config = load_config()
         template_name = config.get("default_template")
         if not template_name:
             parser.error(
                 "a template name is required, or a default must be set with --set-default."
             )
 
+    if staging:
+        with span("staging"):
+            staging.result()
+
+    state = None
     commit_message = None
+    if args.split:
+        from .commands.split import run as split_run
+
+        state = _collect_staged_state()
+        with span("warm_up"):
+            warm_up_backend()
+        with span("split"):
+            split_run(template_name, state, yes=args.yes, use_cache=args.use_cache)
+        if args.push:
+            _push(state)
+        return
+
+    with span("ready"):
+        ready_message = _ready_message(template_name, args.use_cache)
     if args.yes:
-        template = get_template(template_name)
-        diff = get_staged_diff()
-        if not diff:
-            print("No staged changes found.")
-            sys.exit(0)
-        print("Generating commit message...")
-        prompt = template.get("prompt", "") + "\n\n" + diff
-        commit_message = generate_commit_message(prompt)
-    else:
-        commit_message = generate_run(
-            unknown_args
-            + ([template_name] if template_name and not unknown_args else [])
-        )
+        commit_message = ready_message
+        if commit_message is None:
+            with span("daemon"):
+                commit_message = _generate_in_daemon(template_name, args.use_cache)
+
+    if commit_message is None:
+        state = _collect_staged_state()
+        # Only now is a generation certain: nothing is booted for an empty
+        # index, a ready message or a daemon's reply.
+        if ready_message is None:
+            with span("warm_up"):
+                warm_up_backend()
+        if args.yes:
+            from .core.ai import generate_commit_message
+            from .core.prompt import build_staged_prompt
+
+            with span("config"):
+                template = get_template(template_name)
+            print("Generating commit message...")
+            with span("prompt"):
+                prompt = build_staged_prompt(template, state, use_cache=args.use_cache)
+            with span("generate"):
+                commit_message = generate_commit_message(
+                    prompt, use_cache=args.use_cache
+                )
+        else:
+            from .commands.generate import run as generate_run, run_candidates
+
+            run_args = unknown_args + (
+                [template_name] if template_name and not unknown_args else []
+            )
+            with span("generate", interactive=True):
+                if args.candidates and args.candidates > 1:
+                    commit_message = run_candidates(
+                        run_args, args.candidates, use_cache=args.use_cache, state=state
+                    )
+                else:
+                    commit_message = generate_run(
+                        run_args,
+                        use_cache=args.use_cache,
+                        state=state,
+                        first_message=ready_message,
+                    )
 
     if commit_message:
         try:
-            subprocess.run(["git", "commit", "-m", commit_message], check=True)
+            with span("commit"):
+                subprocess.run(["git", "commit", "-m", commit_message], check=True)
         except subprocess.CalledProcessError as e:
             handle_error("committing changes", e)
 
         if args.push:
-            try:
-                branch = get_current_branch()
-                remote_url = get_remote_url()
-                config = load_config()
-                highlight_color = config.get("highlight_color", "green")
-                from rich.console import Console
-
-                console = Console()
-                if remote_url:
-                    console.print(
-                        f"[{highlight_color}]Pushing to {remote_url}...[/{highlight_color}]"
-                    )
-                else:
-                    console.print(
-                        f"[{highlight_color}]Pushing changes...[/{highlight_color}]"
-                    )
-                subprocess.run(["git", "push", "-u", "origin", branch], check=True)
-            except subprocess.CalledProcessError as e:
-                handle_error("pushing changes", e)
+            _push(state)
 
 
 if __name__ == "__main__":
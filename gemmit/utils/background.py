@@ -0,0 +1,32 @@
+# This module runs a step of gemmit's start-up in a background thread.
+
+import threading
+
+
+class BackgroundTask:
+    """Runs a function in a thread and hands over its result on demand.
+
+    An exception raised by the function, including SystemExit from
+    handle_error, is raised again by result().
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(fn, args, kwargs), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, fn, args, kwargs):
+        try:
+            self._result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._error = e
+
+    def result(self):
+        """Waits for the function to finish and returns its result."""
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
@@ -16,3 +16,7 @@ def handle_error(message, error=None, max_lines=5):
         else:
             print(f"Details:\n{error_str}", file=sys.stderr)
     sys.exit(1)
+
+
+class GenerationCancelled(Exception):
+    """Raised when an in-flight commit message generation is cancelled."""
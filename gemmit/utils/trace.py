@@ -0,0 +1,171 @@
+# This module records how long the phases of a run take, for --trace and the
+# GEMMIT_TRACE environment variable.
+#
+# When tracing is off, span() returns one shared object whose methods do
+# nothing, so instrumented code pays for little more than a function call.
+
+import atexit
+import itertools
+import os
+import sys
+import threading
+import time
+
+TRACE_ENV = "GEMMIT_TRACE"
+
+# Where the report goes when no file is named.
+STDERR = "-"
+
+_tracer = None
+
+
+class Span:
+    """A timed phase; use it as a context manager.
+
+    Spans opened while another is open in the same thread are its children.
+    A span left by an exception records the exception's type as "error".
+    """
+
+    __slots__ = ("tracer", "name", "attrs", "id", "parent", "start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.id = None
+        self.parent = None
+        self.start = None
+
+    def set(self, **attrs):
+        """Adds attributes to the span, such as what it found out."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent = stack[-1].id if stack else None
+        self.id = next(self.tracer._ids)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        stack = self.tracer._stack()
+        if self in stack:
+            stack.remove(self)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._record(self, end)
+        return False
+
+
+class _NoSpan:
+    """What span() returns when tracing is off."""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """Collects the finished spans of a run and reports them as JSON."""
+
+    def __init__(self, destination=STDERR):
+        self.destination = destination
+        self.origin = time.perf_counter()
+        self.spans = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, span, end):
+        record = {
+            "id": span.id,
+            "parent": span.parent,
+            "name": span.name,
+            "start_ms": round((span.start - self.origin) * 1000, 3),
+            "duration_ms": round((end - span.start) * 1000, 3),
+            "thread": threading.current_thread().name,
+        }
+        if span.attrs:
+            record["attrs"] = span.attrs
+        with self._lock:
+            self.spans.append(record)
+
+    def report(self):
+        """Returns the spans in start order, and the total time of each phase."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        phases = {}
+        for s in spans:
+            phase = phases.setdefault(s["name"], {"count": 0, "total_ms": 0.0})
+            phase["count"] += 1
+            phase["total_ms"] = round(phase["total_ms"] + s["duration_ms"], 3)
+        return {
+            "total_ms": round((time.perf_counter() - self.origin) * 1000, 3),
+            "phases": phases,
+            "spans": spans,
+        }
+
+    def write(self):
+        """Writes the report to stderr or to the destination file."""
+        import json
+
+        report = json.dumps(self.report(), default=str)
+        if self.destination == STDERR:
+            print(report, file=sys.stderr)
+            return
+        try:
+            with open(self.destination, "w") as f:
+                f.write(report + "\n")
+        except OSError as e:
+            print(
+                f"Could not write the trace to {self.destination}: {e}", file=sys.stderr
+            )
+
+
+def enable(destination=STDERR):
+    """Starts tracing; the report is written when the process exits."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(destination)
+        atexit.register(_tracer.write)
+    return _tracer
+
+
+def enable_from_env():
+    """Starts tracing if GEMMIT_TRACE is set: to 1 for stderr, or to a file path."""
+    value = os.environ.get(TRACE_ENV, "")
+    if value and value != "0":
+        enable(STDERR if value in ("1", STDERR) else value)
+
+
+def disable():
+    """Stops tracing, dropping what was recorded."""
+    global _tracer
+    if _tracer is not None:
+        atexit.unregister(_tracer.write)
+    _tracer = None
+
+
+def span(name, **attrs):
+    """Returns a span timing the phase called name, or a no-op if tracing is off."""
+    if _tracer is None:
+        return _NO_SPAN
+    return Span(_tracer, name, attrs)
@@ -1,5 +1,109 @@
 import sys
 import os
+import subprocess
+import pytest
 
 # Add the src directory to the Python path for test discovery
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+
+def run_git(repo, *args, **kwargs):
+    """Runs git in repo and returns its output; a failing command fails the test."""
+    return subprocess.run(
+        ["git"] + list(args),
+        cwd=repo,
+        check=True,
+        capture_output=True,
+        text=True,
+        **kwargs,
+    ).stdout
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch):
+    """Lets tests commit without a git identity configured on the machine."""
+    for key, value in {
+        "GIT_AUTHOR_NAME": "Test",
+        "GIT_AUTHOR_EMAIL": "test@example.com",
+        "GIT_COMMITTER_NAME": "Test",
+        "GIT_COMMITTER_EMAIL": "test@example.com",
+    }.items():
+        monkeypatch.setenv(key, value)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """An empty repository on branch main, and the working directory.
+
+    Test modules override this fixture to add the commits and staged
+    changes they need.
+    """
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    run_git(repo, "init", "-q", "-b", "main")
+    monkeypatch.chdir(repo)
+    return repo
+
+
+@pytest.fixture(autouse=True)
+def isolated_gemmit_home(tmp_path, monkeypatch):
+    """Keeps tests away from the real ~/.gemmit config and cache."""
+    from gemmit.core import cache, config, daemon, file_summaries, hedge
+    from gemmit.core import ratelimit, timings
+
+    monkeypatch.setattr(config, "CONFIG_FILE", str(tmp_path / "config.json"))
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(file_summaries, "SUMMARY_DIR", str(tmp_path / "summaries"))
+    monkeypatch.setattr(daemon, "SOCKET_PATH", str(tmp_path / "daemon.sock"))
+    monkeypatch.setattr(hedge, "LATENCY_FILE", str(tmp_path / "latency.json"))
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_FILE", str(tmp_path / "ratelimit.json"))
+    monkeypatch.setattr(timings, "TIMINGS_FILE", str(tmp_path / "timings.jsonl"))
+
+
+@pytest.fixture(autouse=True)
+def fresh_quota_gate(monkeypatch):
+    """Stops quota backoff from one test delaying the next."""
+    from gemmit.core import ai
+
+    monkeypatch.setattr(ai, "_quota_gate", ai.QuotaGate())
+
+
+@pytest.fixture(autouse=True)
+def fresh_backends(monkeypatch):
+    """Stops a backend configured by one test from serving the next."""
+    from gemmit.core import backend
+
+    monkeypatch.setattr(backend, "_instances", {})
+
+
+@pytest.fixture(autouse=True)
+def no_prespawned():
+    """Stops a gemini prespawned by one test from answering the next."""
+    from gemmit.core import warmup
+
+    yield
+    warmup.discard_prespawned()
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    """Keeps the shared rate limiter out of tests that don't test it.
+
+    Its waits are on the wall clock, which tests that mock time.sleep
+    would spin on.
+    """
+    from gemmit.core import ratelimit
+
+    monkeypatch.setattr(
+        ratelimit, "get_rate_limit_settings", lambda: {"enabled": False}
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_trace(monkeypatch):
+    """Stops tracing started by one test (or the environment) leaking into others."""
+    from gemmit.utils import trace
+
+    monkeypatch.delenv(trace.TRACE_ENV, raising=False)
+    yield
+    trace.disable()
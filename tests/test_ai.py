@@ -1,26 +1,37 @@
+import io
 import pytest
-from unittest.mock import patch, MagicMock
-import subprocess
+from unittest.mock import patch, MagicMock, PropertyMock
+import threading
 from gemmit.core import ai
+from gemmit.utils.errors import GenerationCancelled
+
+
+def mock_process(stdout="", stderr="", returncode=0):
+    """Returns a mock of a finished gemini process."""
+    process = MagicMock(returncode=returncode)
+    # Give every call fresh pipes when the same mock is returned for several calls.
+    type(process).stdout = PropertyMock(side_effect=lambda: io.BytesIO(stdout.encode()))
+    type(process).stderr = PropertyMock(side_effect=lambda: io.BytesIO(stderr.encode()))
+    type(process).stdin = PropertyMock(return_value=MagicMock())
+    return process
+
 
 # Successful response from the gemini CLI
-MOCK_SUCCESS_RESPONSE = MagicMock(
-    stdout="feat: Implement the new feature", stderr="", returncode=0
-)
+MOCK_SUCCESS_RESPONSE = mock_process(stdout="feat: Implement the new feature")
 
 # Error response for quota exceeded
-MOCK_QUOTA_ERROR_RESPONSE = MagicMock(
-    stdout="", stderr="Error: 429 Quota exceeded for model.", returncode=1
+MOCK_QUOTA_ERROR_RESPONSE = mock_process(
+    stderr="Error: 429 Quota exceeded for model.", returncode=1
 )
 
 # Generic error response
-MOCK_GENERIC_ERROR_RESPONSE = MagicMock(
-    stdout="", stderr="An unexpected error occurred.", returncode=1
+MOCK_GENERIC_ERROR_RESPONSE = mock_process(
+    stderr="An unexpected error occurred.", returncode=1
 )
 
 
 @patch("shutil.which", return_value="/usr/local/bin/gemini")
-@patch("subprocess.run")
+@patch("subprocess.Popen")
 def test_generate_commit_message_success(mock_run, mock_which):
     """Tests a successful commit message generation."""
     mock_run.return_value = MOCK_SUCCESS_RESPONSE
@@ -31,13 +42,12 @@ def test_generate_commit_message_success(mock_run, mock_which):
 
 
 @patch("shutil.which", return_value="/usr/local/bin/gemini")
-@patch("subprocess.run")
+@patch("subprocess.Popen")
 def test_generate_commit_message_filters_mcp_lines(mock_run, mock_which):
     """Tests that MCP lines are filtered from the output."""
-    mock_run.return_value = MagicMock(
+    mock_run.return_value = mock_process(
         stdout="MCP STDOUT: some debug info\nfeat: A new feature\nMCP STDOUT: more info",
         stderr="MCP STDERR: some error\nAnother error",
-        returncode=0,
     )
 
     message = ai.generate_commit_message("a prompt")
@@ -45,16 +55,11 @@ def test_generate_commit_message_filters_mcp_lines(mock_run, mock_which):
 
 
 @patch("shutil.which", return_value="/usr/local/bin/gemini")
-@patch("subprocess.run")
+@patch("subprocess.Popen")
 def test_generate_commit_message_retry_then_succeed(mock_run, mock_which):
     """Tests that the retry logic works on quota errors."""
     # Simulate a quota error, then a success
-    mock_run.side_effect = [
-        subprocess.CalledProcessError(
-            1, ["gemini"], stderr="Error: 429 Quota exceeded for model."
-        ),
-        MOCK_SUCCESS_RESPONSE,
-    ]
+    mock_run.side_effect = [MOCK_QUOTA_ERROR_RESPONSE, MOCK_SUCCESS_RESPONSE]
 
     with patch("time.sleep") as mock_sleep:  # Don't actually sleep in tests
         message = ai.generate_commit_message("some prompt")
@@ -64,13 +69,11 @@ def test_generate_commit_message_retry_then_succeed(mock_run, mock_which):
 
 
 @patch("shutil.which", return_value="/usr/local/bin/gemini")
-@patch("subprocess.run")
+@patch("subprocess.Popen")
 def test_generate_commit_message_max_retries_exceeded(mock_run, mock_which):
     """Tests that the function exits after the maximum number of retries."""
     # Simulate continuous quota errors
-    mock_run.side_effect = subprocess.CalledProcessError(
-        1, ["gemini"], stderr="Error: 429 Quota exceeded for model."
-    )
+    mock_run.return_value = MOCK_QUOTA_ERROR_RESPONSE
 
     with pytest.raises(SystemExit):
         with patch("time.sleep"):  # Don't actually sleep in tests
@@ -84,3 +87,147 @@ def test_generate_commit_message_gemini_not_found(mock_which):
     """Tests that the function exits if the gemini CLI is not found."""
     with pytest.raises(SystemExit):
         ai.generate_commit_message("some prompt")
+
+
+@patch("shutil.which", return_value="/usr/local/bin/gemini")
+@patch("subprocess.Popen")
+def test_generate_commit_message_uses_cache(mock_run, mock_which):
+    """Tests that a repeated prompt is served from the cache."""
+    mock_run.return_value = MOCK_SUCCESS_RESPONSE
+
+    first = ai.generate_commit_message("cached prompt")
+    second = ai.generate_commit_message("cached prompt")
+    assert first == second == "feat: Implement the new feature"
+    mock_run.assert_called_once()
+
+
+@patch("shutil.which", return_value="/usr/local/bin/gemini")
+@patch("subprocess.Popen")
+def test_generate_commit_message_refresh_skips_cache(mock_run, mock_which):
+    """Tests that refreshing and bypassing the cache both call the model."""
+    mock_run.return_value = MOCK_SUCCESS_RESPONSE
+
+    ai.generate_commit_message("cached prompt")
+    ai.generate_commit_message("cached prompt", refresh_cache=True)
+    ai.generate_commit_message("cached prompt", use_cache=False)
+    assert mock_run.call_count == 3
+
+
+@patch("shutil.which", return_value="/usr/local/bin/gemini")
+@patch("subprocess.Popen")
+def test_generate_commit_message_generic_error(mock_run, mock_which):
+    """Tests that a non-quota error fails without retrying."""
+    mock_run.return_value = MOCK_GENERIC_ERROR_RESPONSE
+
+    with pytest.raises(SystemExit):
+        ai.generate_commit_message("some prompt")
+    mock_run.assert_called_once()
+
+
+@patch("shutil.which", return_value="/usr/local/bin/gemini")
+@patch("subprocess.Popen")
+def test_generate_commit_message_cancel_kills_process(mock_run, mock_which):
+    """Tests that cancelling a generation kills the running gemini process."""
+    process = mock_process(returncode=-9)
+    killed = threading.Event()
+    process.kill.side_effect = killed.set
+
+    def running_stdout():
+        # gemini prints nothing until it is killed.
+        killed.wait(5)
+        yield from ()
+
+    type(process).stdout = PropertyMock(side_effect=running_stdout)
+    mock_run.return_value = process
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(GenerationCancelled):
+        ai.generate_commit_message("some prompt", use_cache=False, cancel=cancel)
+    process.kill.assert_called_once()
+
+
+def test_quota_gate_delays_all_waiters():
+    """Tests that closing the gate makes later attempts wait out the delay."""
+    gate = ai.QuotaGate()
+    with patch("time.sleep") as mock_sleep:
+        gate.wait()
+        mock_sleep.assert_not_called()
+
+        gate.close_for(5)
+        gate.wait()
+        delay = mock_sleep.call_args[0][0]
+        assert 4 < delay <= 5
+
+
+@patch("shutil.which", return_value="/usr/local/bin/gemini")
+@patch("subprocess.Popen")
+def test_generate_commit_message_streams_prompt_to_stdin(mock_run, mock_which):
+    """Tests that the prompt is written to stdin in chunks, not passed in argv."""
+    process = mock_process(stdout="feat: Streamed")
+    stdin = process.stdin
+    mock_run.return_value = process
+    body = ["line\n"] * 3
+    prompt = ai.PromptStream("Template", lambda: iter(body))
+
+    with patch.object(ai, "PROMPT_CHUNK_CHARS", 4):
+        assert ai.generate_commit_message(prompt, use_cache=False) == "feat: Streamed"
+
+    assert mock_run.call_args[0][0] == ["gemini"]
+    written = b"".join(call.args[0] for call in stdin.write.call_args_list)
+    assert written == b"Template\n\nline\nline\nline\n"
+    assert max(len(call.args[0]) for call in stdin.write.call_args_list) <= 4
+    stdin.close.assert_called_once()
+
+
+@patch("shutil.which", return_value="/usr/local/bin/gemini")
+@patch("subprocess.Popen")
+def test_generate_commit_message_stream_hits_string_cache(mock_run, mock_which):
+    """Tests that a streamed prompt shares cache entries with the same str prompt."""
+    mock_run.return_value = MOCK_SUCCESS_RESPONSE
+
+    ai.generate_commit_message("Template\n\nline\n")
+    prompt = ai.PromptStream("Template", lambda: iter(["line\n"]))
+    assert ai.generate_commit_message(prompt) == "feat: Implement the new feature"
+    mock_run.assert_called_once()
+
+
+@patch("shutil.which", return_value="/usr/local/bin/gemini")
+@patch("subprocess.Popen")
+def test_generate_commit_message_streams_lines(mock_run, mock_which):
+    """Tests that message lines reach on_line as they arrive, without MCP lines."""
+    seen = []
+
+    def gemini_stdout():
+        yield b"MCP STDOUT: connecting\n"
+        yield b"feat: Subject\n"
+        # The first line is shown before gemini writes the next one.
+        assert seen == ["feat: Subject"]
+        yield b"\n"
+        yield b"Body\n"
+
+    process = mock_process()
+    type(process).stdout = PropertyMock(side_effect=gemini_stdout)
+    mock_run.return_value = process
+
+    message = ai.generate_commit_message("prompt", use_cache=False, on_line=seen.append)
+
+    assert seen == ["feat: Subject", "Body"]
+    assert message == "feat: Subject\nBody"
+
+
+@patch("shutil.which", return_value="/usr/local/bin/gemini")
+@patch("subprocess.Popen")
+def test_generate_commit_message_records_timing(mock_run, mock_which):
+    """Tests that time to first line and total time are recorded for each call."""
+    mock_run.return_value = MOCK_SUCCESS_RESPONSE
+
+    with patch.object(ai, "record_timing") as mock_record:
+        seen = []
+        ai.generate_commit_message("prompt")
+        ai.generate_commit_message("prompt", on_line=seen.append)
+
+    assert seen == ["feat: Implement the new feature"]
+    (first, total), kwargs = mock_record.call_args_list[0]
+    assert 0 <= first <= total and kwargs == {"cached": False}
+    assert mock_record.call_args_list[1][1] == {"cached": True}
@@ -0,0 +1,265 @@
+import json
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from gemmit.core import ai, backend, retry
+from gemmit.core.backend import FOLLOW_UP
+from gemmit.core.gemini_cli import GeminiCliBackend
+from gemmit.core.gemini_http import GeminiHttpBackend
+from gemmit.utils.errors import GenerationCancelled
+
+
+class FakeGeminiApi(BaseHTTPRequestHandler):
+    """Answers streamGenerateContent requests with the server's scripted replies."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding") != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b""
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            chunk = self.rfile.read(size + 2)[:-2]
+            if not size:
+                return body
+            body += chunk
+
+    def do_POST(self):
+        server = self.server
+        server.connections.add(self.client_address)
+        request = {
+            "method": "POST",
+            "path": self.path,
+            "key": self.headers.get("x-goog-api-key"),
+            "body": json.loads(self.read_body()),
+        }
+        server.requests.append(request)
+        if self.path.endswith("/cachedContents"):
+            self.send_reply(server.cache_reply)
+            return
+        generations = [r for r in server.requests if "alt=sse" in r["path"]]
+        self.send_reply(server.replies[min(len(generations), len(server.replies)) - 1])
+
+    def do_DELETE(self):
+        self.server.requests.append({"method": "DELETE", "path": self.path})
+        self.send_reply({"json": {}})
+
+    def send_reply(self, reply):
+        time.sleep(reply.get("delay", 0))
+        if "status" in reply:
+            payload = json.dumps({"error": {"message": reply["error"]}}).encode()
+            self.send_response(reply["status"])
+            for name, value in reply.get("headers", {}).items():
+                self.send_header(name, value)
+        elif "json" in reply:
+            payload = json.dumps(reply["json"]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+        else:
+            payload = b"".join(
+                b"data: "
+                + json.dumps(
+                    {"candidates": [{"content": {"parts": [{"text": piece}]}}]}
+                ).encode()
+                + b"\r\n\r\n"
+                for piece in reply["pieces"]
+            )
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except OSError:
+            # The client cancelled the request.
+            pass
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Runs the fake API and returns a function to script its replies."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGeminiApi)
+    server.daemon_threads = True
+    server.connections = set()
+    server.requests = []
+    server.replies = [{"pieces": ["feat: Add it\n"]}]
+    server.cache_reply = {"json": {"name": "cachedContents/c1"}}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+
+    config = {
+        "backend": "http",
+        "http_backend": {"base_url": f"http://127.0.0.1:{server.server_port}"},
+    }
+
+    def script(*replies):
+        server.replies = list(replies)
+        return server
+
+    with patch.object(backend, "load_config", return_value=config):
+        yield script
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_backend_selects_and_reuses_instances():
+    """Tests that the configured backend is used and kept across requests."""
+    assert isinstance(backend.get_backend({}), GeminiCliBackend)
+    http = backend.get_backend({"backend": "http"})
+    assert isinstance(http, GeminiHttpBackend)
+    assert backend.get_backend({"backend": "http"}) is http
+    other = backend.get_backend({"backend": "http", "http_backend": {"model": "m"}})
+    assert other is not http and other.model == "m"
+
+
+def test_http_backend_streams_lines_and_reuses_connection(api):
+    """Tests that lines are streamed as they arrive over one kept-alive connection."""
+    server = api({"pieces": ["feat: Talk HTTP\n\n- Reuse conn", "ections\n"]})
+    lines = []
+
+    first = ai.generate_commit_message(
+        'prompt "quoted"\n', use_cache=False, on_line=lines.append
+    )
+    second = ai.generate_commit_message("another prompt", use_cache=False)
+
+    assert first == second == "feat: Talk HTTP\n- Reuse connections"
+    assert lines == ["feat: Talk HTTP", "- Reuse connections"]
+    assert len(server.requests) == 2
+    assert len(server.connections) == 1
+    request = server.requests[0]
+    assert request["path"].endswith(":streamGenerateContent?alt=sse")
+    assert request["key"] == "test-key"
+    assert request["body"]["contents"][0]["parts"][0]["text"] == 'prompt "quoted"\n'
+
+
+def test_http_backend_retries_rate_limits(api):
+    """Tests that a 429 is retried after the delay the server asks for."""
+    server = api(
+        {"status": 429, "error": "Quota exceeded", "headers": {"Retry-After": "0"}},
+        {"status": 503, "error": "UNAVAILABLE"},
+        {"pieces": ["fix: Wait for quota\n"]},
+    )
+
+    with patch.object(
+        retry, "get_retry_settings", return_value={"base_delay_seconds": 0.01}
+    ):
+        message = ai.generate_commit_message("prompt", use_cache=False)
+
+    assert message == "fix: Wait for quota"
+    assert len(server.requests) == 3
+    assert len(server.connections) == 1
+
+
+def test_http_backend_fatal_error_fails_fast(api):
+    """Tests that a rejected request is not retried."""
+    server = api({"status": 400, "error": "API key not valid"})
+
+    with pytest.raises(SystemExit):
+        ai.generate_commit_message("prompt", use_cache=False)
+    assert len(server.requests) == 1
+
+
+def test_http_backend_cancel_closes_request(api):
+    """Tests that cancelling stops a request the server is still working on."""
+    api({"pieces": ["feat: Too late\n"], "delay": 5})
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+
+    start = time.monotonic()
+    with pytest.raises(GenerationCancelled):
+        ai.generate_commit_message("prompt", use_cache=False, cancel=cancel)
+    assert time.monotonic() - start < 2
+
+
+def test_http_backend_requires_api_key(api, monkeypatch):
+    """Tests that a missing API key is reported before any request is made."""
+    server = api()
+    monkeypatch.delenv("GEMINI_API_KEY")
+
+    with pytest.raises(SystemExit):
+        ai.generate_commit_message("prompt", use_cache=False)
+    assert server.requests == []
+
+
+# Large enough for the API to agree to cache it.
+LARGE_PROMPT = "Describe this diff.\n\n" + "+x\n" * 2000
+
+
+def test_http_session_sends_only_follow_ups_after_caching_prompt(api):
+    """Tests that Regenerate sends a short follow-up against the cached prompt."""
+    server = api(
+        {"pieces": ["feat: First\n"]},
+        {"pieces": ["feat: Second\n"]},
+        {"pieces": ["feat: Third\n"]},
+    )
+    session = ai.open_session(LARGE_PROMPT)
+
+    first = ai.generate_commit_message(LARGE_PROMPT, use_cache=False, session=session)
+    second = ai.generate_commit_message(LARGE_PROMPT, use_cache=False, session=session)
+    third = ai.generate_commit_message(LARGE_PROMPT, use_cache=False, session=session)
+    session.close()
+
+    assert [first, second, third] == ["feat: First", "feat: Second", "feat: Third"]
+    create, follow_up, last = (r["body"] for r in server.requests[1:4])
+    assert create["contents"][0]["parts"][0]["text"] == LARGE_PROMPT
+    assert follow_up["cachedContent"] == "cachedContents/c1"
+    assert LARGE_PROMPT not in json.dumps(follow_up)
+    assert [c["role"] for c in last["contents"]] == ["model", "user", "model", "user"]
+    assert last["contents"][-1]["parts"][0]["text"] == FOLLOW_UP
+    assert server.requests[-1] == {
+        "method": "DELETE",
+        "path": "/v1beta/cachedContents/c1",
+    }
+
+
+def test_http_session_falls_back_to_full_resend(api):
+    """Tests that an expired cache makes the session resend the whole conversation."""
+    server = api(
+        {"pieces": ["feat: First\n"]},
+        {"status": 404, "error": "CachedContent not found"},
+        {"pieces": ["feat: Second\n"]},
+    )
+    session = ai.open_session(LARGE_PROMPT)
+
+    ai.generate_commit_message(LARGE_PROMPT, use_cache=False, session=session)
+    message = ai.generate_commit_message(LARGE_PROMPT, use_cache=False, session=session)
+    session.close()
+
+    assert message == "feat: Second"
+    resend = server.requests[-1]["body"]
+    assert "cachedContent" not in resend
+    assert resend["contents"][0]["parts"][0]["text"] == LARGE_PROMPT
+    assert resend["contents"][1]["parts"][0]["text"] == "feat: First\n"
+    assert not any(r["method"] == "DELETE" for r in server.requests)
+
+
+def test_http_session_skips_cache_for_small_prompts(api):
+    """Tests that a prompt too small to cache is resent without trying."""
+    server = api({"pieces": ["feat: First\n"]}, {"pieces": ["feat: Second\n"]})
+    session = ai.open_session("small prompt")
+
+    ai.generate_commit_message("small prompt", use_cache=False, session=session)
+    ai.generate_commit_message("small prompt", use_cache=False, session=session)
+    session.close()
+
+    assert [r["path"].split("/")[-1] for r in server.requests] == [
+        "gemini-2.5-flash:streamGenerateContent?alt=sse"
+    ] * 2
+    assert len(server.requests[1]["body"]["contents"]) == 3
+
+
+def test_cli_session_resends_prompt():
+    """Tests that the stateless default session sends the whole prompt every time."""
+    cli = GeminiCliBackend()
+    session = cli.open_session("prompt")
+    with patch.object(cli, "generate", return_value="feat: Again") as mock_generate:
+        session.generate()
+        session.generate()
+    assert [c.args[0] for c in mock_generate.call_args_list] == ["prompt", "prompt"]
+    assert session.replies == ["feat: Again", "feat: Again"]
@@ -0,0 +1,16 @@
+import pytest
+from gemmit.utils.background import BackgroundTask
+from gemmit.utils.errors import handle_error
+
+
+def test_background_task_returns_result():
+    """Tests that the function's result is handed over."""
+    assert BackgroundTask(lambda a, b=0: a + b, 1, b=2).result() == 3
+
+
+def test_background_task_reraises_exit():
+    """Tests that handle_error in the background exits when the result is taken."""
+    task = BackgroundTask(handle_error, "staging all files")
+
+    with pytest.raises(SystemExit):
+        task.result()
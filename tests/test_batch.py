@@ -0,0 +1,141 @@
+import json
+import subprocess
+import sys
+import time
+import pytest
+from gemmit.commands.batch import run as batch_run
+from gemmit.core import batch
+
+FAKE_GEMINI = """#!{python}
+import sys, time
+sys.stdin.read()
+time.sleep({latency})
+print("feat: Batch commit")
+"""
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """A directory of repositories and a fake gemini; returns a function to add repos."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    gemini = bin_dir / "gemini"
+    gemini.write_text(FAKE_GEMINI.format(python=sys.executable, latency=0.3))
+    gemini.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    for key, value in {
+        "GIT_AUTHOR_NAME": "Test",
+        "GIT_AUTHOR_EMAIL": "test@example.com",
+        "GIT_COMMITTER_NAME": "Test",
+        "GIT_COMMITTER_EMAIL": "test@example.com",
+    }.items():
+        monkeypatch.setenv(key, value)
+    root = tmp_path / "workspace"
+    root.mkdir()
+
+    def add_repo(name, staged=True):
+        repo = root / name
+        repo.mkdir(parents=True)
+        subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+        (repo / "file.txt").write_text("content\n")
+        if staged:
+            subprocess.run(["git", "add", "file.txt"], cwd=repo, check=True)
+        return str(repo)
+
+    return root, add_repo
+
+
+def head_subject(repo):
+    return subprocess.run(
+        ["git", "log", "-1", "--format=%s"],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def test_discover_repositories_skips_nested_and_hidden(workspace):
+    """Tests that discovery finds repositories without descending into them."""
+    root, add_repo = workspace
+    first = add_repo("a")
+    second = add_repo("group/b")
+    add_repo("a/nested")
+    add_repo(".hidden/c")
+    add_repo("node_modules/d")
+
+    assert batch.discover_repositories(str(root)) == [first, second]
+    assert batch.discover_repositories(first) == [first]
+    assert batch.discover_repositories(str(root), max_depth=1) == [first]
+
+
+def test_run_batch_commits_in_parallel_and_reports_each_repo(workspace):
+    """Tests that repositories are committed concurrently, empty ones skipped."""
+    _, add_repo = workspace
+    repos = [add_repo(f"repo{i}") for i in range(4)]
+    empty = add_repo("empty", staged=False)
+    seen = []
+
+    start = time.monotonic()
+    results = batch.run_batch(
+        repos + [empty], "kernel", use_cache=False, max_workers=5, on_result=seen.append
+    )
+    elapsed = time.monotonic() - start
+
+    # Four 0.3s generations, run side by side.
+    assert elapsed < 1.2
+    assert [r["repo"] for r in results] == repos + [empty]
+    assert [r["status"] for r in results] == ["committed"] * 4 + ["empty"]
+    assert len(seen) == 5
+    for repo, result in zip(repos, results):
+        assert head_subject(repo) == "feat: Batch commit"
+        assert result["subject"] == "feat: Batch commit"
+        assert set(result["seconds"]) == {"generate", "commit"}
+
+
+def test_failed_repository_does_not_stop_the_others(workspace):
+    """Tests that a failing commit is reported with its step and error."""
+    _, add_repo = workspace
+    good = add_repo("good")
+    bad = add_repo("bad")
+    hook = f"{bad}/.git/hooks/pre-commit"
+    with open(hook, "w") as f:
+        f.write("#!/bin/sh\necho 'hook says no' >&2\nexit 1\n")
+    subprocess.run(["chmod", "+x", hook], check=True)
+
+    results = batch.run_batch([good, bad], "kernel", use_cache=False)
+
+    assert results[0]["status"] == "committed"
+    assert results[1]["status"] == "failed"
+    assert results[1]["step"] == "commit"
+    assert "hook says no" in results[1]["error"]
+
+
+def test_batch_command_writes_summary(workspace, tmp_path, capsys):
+    """Tests the batch command end to end: progress on stderr, summary in a file."""
+    root, add_repo = workspace
+    add_repo("one")
+    add_repo("two", staged=False)
+    output = tmp_path / "summary.json"
+
+    batch_run([str(root), "-t", "kernel", "-a", "-j", "2", "-o", str(output)])
+
+    summary = json.loads(output.read_text())
+    assert summary["repos"] == 2
+    assert summary["counts"] == {"committed": 2}
+    assert summary["latency"]["max_seconds"] > 0
+    progress = capsys.readouterr().err
+    assert "[2/2]" in progress
+    assert "2 committed" in progress
+
+
+def test_batch_command_exits_nonzero_on_failure(workspace, tmp_path):
+    """Tests that failures are reflected in the exit status."""
+    _, add_repo = workspace
+    repo = add_repo("broken")
+    with open(f"{repo}/.git/hooks/pre-commit", "w") as f:
+        f.write("#!/bin/sh\nexit 1\n")
+    subprocess.run(["chmod", "+x", f"{repo}/.git/hooks/pre-commit"], check=True)
+
+    with pytest.raises(SystemExit) as exc:
+        batch_run([repo, "-t", "kernel", "-o", str(tmp_path / "out.json")])
+    assert exc.value.code == 1
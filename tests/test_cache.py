@@ -0,0 +1,104 @@
+import os
+import time
+from unittest.mock import MagicMock, patch
+from gemmit.core import ai, cache
+
+SETTINGS = {"enabled": True, "max_entries": 3, "max_bytes": 1024 * 1024}
+
+
+def test_cache_key_depends_on_prompt():
+    """Tests that the key changes whenever the prompt or diff changes."""
+    assert cache.cache_key("prompt\n\ndiff") == cache.cache_key("prompt\n\ndiff")
+    assert cache.cache_key("prompt\n\ndiff") != cache.cache_key("prompt\n\ndiff2")
+
+
+def test_cache_key_depends_on_backend_and_model():
+    """Tests that the same prompt is cached apart for each backend and model."""
+    keys = {
+        cache.cache_key("prompt"),
+        cache.cache_key("prompt", "cli"),
+        cache.cache_key("prompt", "http", "gemini-2.5-flash"),
+        cache.cache_key("prompt", "http", "gemini-2.5-pro"),
+    }
+    assert len(keys) == 4
+
+
+def test_switching_model_does_not_serve_the_other_models_message(monkeypatch):
+    """Tests that a message cached for one model is not returned for another."""
+    backend = MagicMock(model="flash")
+    backend.name = "http"
+    backend.generate.side_effect = ["feat: From flash", "feat: From pro"]
+    monkeypatch.setattr(ai, "get_backend", lambda: backend)
+
+    assert ai.generate_commit_message("prompt") == "feat: From flash"
+    assert ai.generate_commit_message("prompt") == "feat: From flash"
+    backend.model = "pro"
+    assert ai.generate_commit_message("prompt") == "feat: From pro"
+    assert backend.generate.call_count == 2
+
+
+def test_store_and_get_message():
+    """Tests a round trip through the cache."""
+    key = cache.cache_key("some prompt")
+    assert cache.get_cached_message(key, SETTINGS) is None
+
+    cache.store_message(key, "feat: Cached message", SETTINGS)
+    assert cache.get_cached_message(key, SETTINGS) == "feat: Cached message"
+    # No temp files are left behind by the atomic write.
+    assert os.listdir(cache.CACHE_DIR) == [key + ".json"]
+
+
+def test_expired_entry_is_a_miss():
+    """Tests that entries older than the TTL are not served."""
+    key = cache.cache_key("old prompt")
+    cache.store_message(key, "feat: Old message", SETTINGS)
+
+    with patch("time.time", return_value=time.time() + 10):
+        assert cache.get_cached_message(key, {"ttl_seconds": 5}) is None
+    assert not os.path.exists(os.path.join(cache.CACHE_DIR, key + ".json"))
+
+
+def test_ttl_counts_from_last_use():
+    """Tests that reads and eviction both expire an entry after ttl_seconds unused."""
+    settings = dict(SETTINGS, ttl_seconds=60)
+    used, unused = cache.cache_key("used prompt"), cache.cache_key("unused prompt")
+    now = time.time()
+    for key in (used, unused):
+        with patch("time.time", return_value=now - 50):
+            cache.store_message(key, "feat: Message", settings)
+        path = os.path.join(cache.CACHE_DIR, key + ".json")
+        os.utime(path, (now - 50, now - 50))
+
+    # Reading an entry written 50s ago keeps it for another 60s.
+    assert cache.get_cached_message(used, settings) == "feat: Message"
+    with patch("time.time", return_value=now + 30):
+        cache.store_message(cache.cache_key("new prompt"), "feat: New", settings)
+        assert cache.get_cached_message(used, settings) == "feat: Message"
+    assert not os.path.exists(os.path.join(cache.CACHE_DIR, unused + ".json"))
+
+
+def test_eviction_drops_least_recently_used():
+    """Tests that the entry cap evicts the least recently used entries."""
+    keys = [cache.cache_key(f"prompt {i}") for i in range(4)]
+    now = time.time()
+    for i, key in enumerate(keys[:3]):
+        cache.store_message(key, f"message {i}", SETTINGS)
+        path = os.path.join(cache.CACHE_DIR, key + ".json")
+        os.utime(path, (now - 100 + i, now - 100 + i))
+
+    # Reading the oldest entry makes it the most recently used one.
+    assert cache.get_cached_message(keys[0], SETTINGS) == "message 0"
+    cache.store_message(keys[3], "message 3", SETTINGS)
+
+    assert cache.get_cached_message(keys[1], SETTINGS) is None
+    assert cache.get_cached_message(keys[0], SETTINGS) == "message 0"
+    assert cache.get_cached_message(keys[3], SETTINGS) == "message 3"
+
+
+def test_clear_cache():
+    """Tests that clearing the cache removes every entry."""
+    cache.store_message(cache.cache_key("a"), "message a", SETTINGS)
+    cache.store_message(cache.cache_key("b"), "message b", SETTINGS)
+
+    assert cache.clear_cache() == 2
+    assert cache.get_cached_message(cache.cache_key("a"), SETTINGS) is None
@@ -0,0 +1,112 @@
+import subprocess
+import pytest
+from unittest.mock import patch
+from gemmit.core import compact, summarize
+from gemmit.core.config import get_template
+from gemmit.core.diff_filter import BYTES_PER_TOKEN, DiffFilter
+from gemmit.core.git import RepoState
+from gemmit.core.prompt import build_staged_prompt
+
+NO_FILTER = DiffFilter({})
+
+
+@pytest.fixture
+def no_summaries(monkeypatch):
+    """Turns large diff summarization off, so that compaction may reach stat."""
+    monkeypatch.setattr(
+        compact, "get_large_diff_settings", lambda: {"threshold_bytes": 0}
+    )
+
+
+def test_fit_to_budget_without_budget_is_unchanged():
+    """Tests that templates without a token budget keep their diff."""
+    diff = "x" * 1000
+    assert compact.fit_to_budget({"prompt": "p"}, diff, NO_FILTER) is diff
+
+
+@patch("gemmit.core.compact.get_staged_diff")
+def test_fit_to_budget_keeps_fitting_diff(mock_get_diff):
+    """Tests that a diff within the budget is not recomputed."""
+    template = {"prompt": "p", "token_budget": 100}
+    assert compact.fit_to_budget(template, "small diff", NO_FILTER) == "small diff"
+    mock_get_diff.assert_not_called()
+
+
+@patch("gemmit.core.compact.get_staged_diff")
+def test_fit_to_budget_escalates_levels(mock_get_diff, no_summaries):
+    """Tests that more compact levels are tried in order until one fits."""
+    sizes = {"whitespace": 500, "stat": 50}
+    mock_get_diff.side_effect = lambda level, cwd, paths: "y" * sizes[level]
+    template = {
+        "prompt": "p",
+        "diff_level": "whitespace",
+        "token_budget": 20,
+    }
+
+    diff = compact.fit_to_budget(template, "x" * 500, NO_FILTER)
+
+    assert diff == "y" * 50
+    mock_get_diff.assert_called_once_with("stat", None, None)
+
+
+@patch("gemmit.core.compact.iter_staged_diff")
+def test_fit_to_budget_streams_only_up_to_limit(mock_iter_diff, no_summaries):
+    """Tests that streamed diffs are abandoned as soon as they exceed the budget."""
+    consumed = []
+
+    def endless(level):
+        while True:
+            consumed.append(level)
+            yield "line\n"
+
+    mock_iter_diff.side_effect = lambda level, cwd, paths: iter(["stat line\n"])
+    template = {"prompt": "", "diff_level": "whitespace", "token_budget": 10}
+
+    diff = compact.fit_to_budget(template, lambda: endless("whitespace"), NO_FILTER)
+
+    assert diff == "stat line\n"
+    assert len(consumed) <= 10 * BYTES_PER_TOKEN // len("line\n") + 1
+    mock_iter_diff.assert_called_once_with("stat", None, None)
+
+
+def test_fit_to_budget_returns_most_compact_when_nothing_fits():
+    """Tests that the last level is handed on when even it is over budget."""
+    template = {"prompt": "", "diff_level": "stat", "token_budget": 1}
+    diff = "z" * 100
+    assert compact.fit_to_budget(template, diff, NO_FILTER) is diff
+
+
+@patch("gemmit.core.compact.get_staged_diff")
+def test_fit_to_budget_hands_over_budget_diffs_to_summarization(mock_get_diff):
+    """Tests that compaction stops short of stat when large diffs are summarized."""
+    mock_get_diff.side_effect = lambda level, cwd, paths: "y" * 500
+    template = {"prompt": "p", "diff_level": "whitespace", "token_budget": 20}
+    diff = "x" * 500
+
+    assert compact.fit_to_budget(template, diff, NO_FILTER) is diff
+    mock_get_diff.assert_not_called()
+
+
+def test_diff_over_the_budget_reaches_summarization(tmp_path, monkeypatch):
+    """Tests that a large staged diff is summarized, not cut to its headers."""
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    content = "".join(f"line {i} of a large generated change\n" for i in range(6000))
+    (tmp_path / "big.txt").write_text(content)
+    subprocess.run(["git", "add", "big.txt"], cwd=tmp_path, check=True)
+    monkeypatch.chdir(tmp_path)
+    template = get_template("kernel")
+    assert len(content) > compact.get_budget_bytes(template)
+
+    with patch.object(
+        summarize, "generate_commit_message", return_value="- Adds big.txt"
+    ) as generate, patch.object(compact, "get_staged_diff") as compacted, patch.object(
+        compact, "iter_staged_diff", wraps=compact.iter_staged_diff
+    ) as streamed:
+        prompt = build_staged_prompt(template, RepoState.collect(), use_cache=False)
+
+    assert summarize.MERGE_PREAMBLE in prompt
+    assert "- Adds big.txt" in prompt
+    assert generate.call_count >= 2
+    levels = [call.args[0] for call in streamed.call_args_list]
+    assert "stat" not in levels
+    compacted.assert_not_called()
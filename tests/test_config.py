@@ -1,3 +1,5 @@
+import json
+import os
 import pytest
 from unittest.mock import patch, mock_open
 from gemmit.core import config
@@ -52,3 +54,55 @@ def test_load_config_file_not_found(mock_open, mock_exists):
     """
     with pytest.raises(SystemExit):
         config.load_config()
+
+
+def write_config(data):
+    """Writes a config file and returns its path."""
+    with open(config.CONFIG_FILE, "w") as f:
+        json.dump(data, f)
+
+
+def test_load_config_is_cached_until_file_changes():
+    """Tests that the config is parsed once and reloaded when it changes."""
+    write_config({"templates": {"a": {"prompt": "A"}}})
+    first = config.load_config()
+
+    with patch("json.load") as mock_json_load:
+        assert config.load_config() is first
+        mock_json_load.assert_not_called()
+
+    write_config({"templates": {"a": {"prompt": "A"}, "b": {"prompt": "B"}}})
+    os.utime(config.CONFIG_FILE, ns=(0, 1))
+    assert "b" in config.load_config()["templates"]
+
+
+def test_load_config_rejects_invalid_template():
+    """Tests that broken templates are reported when the config is loaded."""
+    write_config({"templates": {"broken": {"template": "{message}"}}})
+    with pytest.raises(SystemExit):
+        config.load_config()
+
+
+def test_load_config_rejects_unknown_diff_level():
+    """Tests that an unknown diff_level is reported when the config is loaded."""
+    write_config({"templates": {"t": {"prompt": "p", "diff_level": "tiny"}}})
+    with pytest.raises(SystemExit):
+        config.load_config()
+
+
+def test_load_config_rejects_unknown_backend():
+    """Tests that an unknown backend is reported when the config is loaded."""
+    write_config({"backend": "carrier-pigeon", "templates": {}})
+    with pytest.raises(SystemExit):
+        config.load_config()
+
+
+def test_set_default_template_does_not_mutate_cache():
+    """Tests that saving a new default reloads instead of editing the cached dict."""
+    write_config({"default_template": "a", "templates": {"a": {"prompt": "A"}}})
+    cached = config.load_config()
+
+    config.set_default_template("b")
+
+    assert cached["default_template"] == "a"
+    assert config.load_config()["default_template"] == "b"
@@ -0,0 +1,204 @@
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import pytest
+from unittest.mock import patch
+from gemmit.core import daemon
+from conftest import run_git
+
+
+@pytest.fixture
+def socket_path():
+    """A socket path short enough for AF_UNIX, wherever tmp_path lives."""
+    directory = tempfile.mkdtemp(prefix="gemmit-")
+    yield os.path.join(directory, "d.sock")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def running_daemon(socket_path):
+    """Starts a daemon in a background thread and stops it afterwards."""
+    servers = []
+
+    def start(**kwargs):
+        server = daemon.Daemon(path=socket_path, **kwargs)
+        assert server.bind()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        servers.append((server, thread))
+        return server
+
+    yield start
+    for server, thread in servers:
+        server.stop()
+        thread.join(timeout=5)
+
+
+@pytest.fixture
+def repo(repo):
+    """A repository with one staged file."""
+    (repo / "a.txt").write_text("one\n")
+    run_git(repo, "add", "a.txt")
+    return repo
+
+
+def test_request_generation_without_daemon(socket_path):
+    """Tests that clients fall back to in-process mode when no daemon runs."""
+    assert daemon.request_generation(".", "kernel", path=socket_path) is None
+    assert daemon.ping(socket_path) is None
+    assert daemon.stop(socket_path) is False
+
+
+def test_ping_and_stop(running_daemon, socket_path):
+    """Tests that the daemon answers status requests and stops on request."""
+    running_daemon()
+
+    status = daemon.ping(socket_path)
+    assert status["status"] == "ok"
+    assert status["pid"] == os.getpid()
+
+    assert daemon.stop(socket_path)
+    for _ in range(50):
+        if not os.path.exists(socket_path):
+            break
+        threading.Event().wait(0.1)
+    assert not os.path.exists(socket_path)
+
+
+@patch("gemmit.core.ai.generate_commit_message")
+def test_daemon_generates_for_client_repo(
+    mock_generate, running_daemon, socket_path, repo
+):
+    """Tests that the daemon builds the prompt from the client's repository."""
+    mock_generate.return_value = "feat: Add a"
+    running_daemon()
+
+    reply = daemon.request_generation(str(repo), "kernel", path=socket_path)
+
+    assert reply == {"status": "ok", "message": "feat: Add a"}
+    prompt = "".join(mock_generate.call_args[0][0])
+    assert "a.txt" in prompt
+    # The backend runs in the client's repository, not the daemon's directory.
+    assert mock_generate.call_args.kwargs["cwd"] == str(repo)
+
+
+def test_daemon_summarizes_large_diffs_in_the_client_repo(
+    running_daemon, socket_path, repo, tmp_path, monkeypatch
+):
+    """Tests that every gemini the daemon runs, summaries included, runs in the repo."""
+    from gemmit.core import summarize
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    seen = tmp_path / "seen"
+    gemini = bin_dir / "gemini"
+    gemini.write_text(f'#!/bin/sh\ncat >/dev/null\npwd -P >> {seen}\necho "- Part"\n')
+    gemini.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    (repo / "big.txt").write_text("".join(f"line {i}\n" for i in range(200)))
+    run_git(repo, "add", "big.txt")
+    monkeypatch.setattr(
+        summarize,
+        "get_large_diff_settings",
+        lambda: {"threshold_bytes": 500, "chunk_bytes": 500},
+    )
+    # The daemon's own directory is elsewhere.
+    monkeypatch.chdir(tmp_path)
+    running_daemon()
+
+    reply = daemon.request_generation(str(repo), "kernel", False, socket_path)
+
+    assert reply["status"] == "ok"
+    directories = seen.read_text().split()
+    # Several parts were summarized before the message itself was asked for.
+    assert len(directories) > 2
+    assert set(directories) == {str(repo.resolve())}
+
+
+def test_daemon_reports_empty_index(running_daemon, socket_path, repo):
+    """Tests that the daemon tells the client when nothing is staged."""
+    run_git(repo, "reset", "-q")
+    running_daemon()
+
+    reply = daemon.request_generation(str(repo), "kernel", path=socket_path)
+
+    assert reply == {"status": "empty"}
+
+
+def test_daemon_reports_errors(running_daemon, socket_path, repo):
+    """Tests that a failed generation is reported instead of crashing the daemon."""
+    running_daemon()
+
+    reply = daemon.request_generation(str(repo), "no-such-template", path=socket_path)
+
+    assert reply["status"] == "error"
+    assert daemon.ping(socket_path)["status"] == "ok"
+
+
+def test_full_queue_answers_busy(running_daemon, socket_path):
+    """Tests that connections beyond the queue's capacity are turned away."""
+    # Without workers, the first connection fills the queue and stays there.
+    running_daemon(workers=0, queue_size=1)
+    waiting = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    waiting.connect(socket_path)
+    try:
+        assert daemon.ping(socket_path) == {"status": "busy"}
+        assert daemon.request_generation(".", "kernel", path=socket_path) is None
+    finally:
+        waiting.close()
+
+
+def test_git_environment_skips_daemon(running_daemon, socket_path, monkeypatch):
+    """Tests that clients run by git hooks generate in-process."""
+    running_daemon()
+    monkeypatch.setenv("GIT_INDEX_FILE", "/tmp/index")
+
+    with patch.object(daemon, "_send") as mock_send:
+        assert daemon.request_generation(".", "kernel", path=socket_path) is None
+    mock_send.assert_not_called()
+
+
+def test_bind_refuses_running_daemon(running_daemon, socket_path):
+    """Tests that a second daemon does not take over a live socket."""
+    running_daemon()
+    assert not daemon.Daemon(path=socket_path).bind()
+
+
+def test_bind_replaces_stale_socket(socket_path):
+    """Tests that a socket left by a dead daemon is replaced."""
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+
+    server = daemon.Daemon(path=socket_path)
+    try:
+        assert server.bind()
+    finally:
+        server._listener.close()
+
+
+def test_socket_is_private_from_the_start(socket_path):
+    """Tests that the socket is never open to other users, even right after bind."""
+    modes = []
+
+    class RecordingSocket(socket.socket):
+        def bind(self, address):
+            super().bind(address)
+            modes.append(stat.S_IMODE(os.stat(address).st_mode))
+
+    umask = os.umask(0o022)
+    server = daemon.Daemon(path=socket_path)
+    try:
+        with patch.object(daemon.socket, "socket", RecordingSocket):
+            assert server.bind()
+    finally:
+        # bind must have put the umask back as well.
+        restored = os.umask(umask)
+        if server._listener:
+            server._listener.close()
+
+    assert modes == [0o600]
+    assert restored == 0o022
@@ -0,0 +1,72 @@
+from unittest.mock import patch
+from gemmit.core import diff_filter
+
+DIFF = (
+    "diff --git a/src/app.py b/src/app.py\n"
+    "--- a/src/app.py\n"
+    "+++ b/src/app.py\n"
+    "@@ -1 +1 @@\n"
+    "-old\n"
+    "+new\n"
+    "diff --git a/package-lock.json b/package-lock.json\n"
+    "--- a/package-lock.json\n"
+    "+++ b/package-lock.json\n"
+    "@@ -1 +1 @@\n"
+    '-"version": "1"\n'
+    '+"version": "2"\n'
+)
+
+
+def test_matches_any():
+    """Tests that globs without a slash match file names anywhere."""
+    assert diff_filter.matches_any("web/yarn.lock", ["*.lock"])
+    assert diff_filter.matches_any("vendor/lib/a.go", ["vendor/*"])
+    assert not diff_filter.matches_any("src/vendor.py", ["vendor/*"])
+
+
+def test_filter_collapses_excluded_files(capsys):
+    """Tests that excluded files are replaced by their numstat line."""
+    f = diff_filter.DiffFilter({"package-lock.json": "1\t1\tpackage-lock.json"})
+
+    filtered = f.wrap(DIFF)
+
+    assert "+new" in filtered
+    assert '"version"' not in filtered
+    assert "#   1\t1\tpackage-lock.json" in filtered
+    assert f.bytes_saved == len(DIFF) - DIFF.index("diff --git a/package-lock")
+    assert "Filtered 1 file(s)" in capsys.readouterr().err
+
+
+def test_filter_wraps_streams_and_reports_once(capsys):
+    """Tests that a streamed diff is filtered on every pass but reported once."""
+    f = diff_filter.DiffFilter({"package-lock.json": "1\t1\tpackage-lock.json"})
+    source = f.wrap(lambda: iter(DIFF.splitlines(keepends=True)))
+
+    assert "".join(source()) == "".join(source())
+    assert capsys.readouterr().err.count("Filtered") == 1
+
+
+def test_filter_without_exclusions_is_a_no_op():
+    """Tests that nothing is added when no file is excluded."""
+    assert diff_filter.DiffFilter({}).wrap(DIFF) is DIFF
+
+
+@patch("gemmit.core.diff_filter.get_attributes")
+@patch("gemmit.core.diff_filter.get_staged_numstat")
+def test_load_diff_filter(mock_numstat, mock_attributes):
+    """Tests that globs, .gitattributes and binaries all exclude files."""
+    mock_numstat.return_value = [
+        ("1", "1", "src/app.py"),
+        ("900", "850", "package-lock.json"),
+        ("40", "0", "api/service.gen.go"),
+        ("-", "-", "logo.png"),
+    ]
+    mock_attributes.return_value = {
+        "src/app.py": {"linguist-generated": "unspecified", "diff": "unspecified"},
+        "api/service.gen.go": {"linguist-generated": "true", "diff": "unspecified"},
+    }
+
+    f = diff_filter.load_diff_filter({"exclude": ["*.json"]})
+
+    assert sorted(f.excluded) == ["api/service.gen.go", "logo.png", "package-lock.json"]
+    assert f.excluded["logo.png"] == "-\t-\tlogo.png"
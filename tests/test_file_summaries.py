@@ -0,0 +1,152 @@
+import os
+import subprocess
+import time
+import pytest
+from unittest.mock import patch
+from gemmit.core import cache, file_summaries
+from gemmit.core.git import RepoState, get_staged_changes, get_staged_file_diffs
+from gemmit.core.prompt import build_staged_prompt
+from conftest import run_git
+
+
+def fake_summary(prompt, use_cache=True, cancel=None, cwd=None):
+    """Names the file in the prompt's diff."""
+    header = next(line for line in prompt.split("\n") if line.startswith("diff --git"))
+    return f"- Changes {header.split(' b/', 1)[1]}"
+
+
+@pytest.fixture
+def repo(repo):
+    """A repository with a commit and two staged changes."""
+    (repo / "src").mkdir()
+    (repo / "README").write_text("readme\n")
+    run_git(repo, "add", ".")
+    run_git(repo, "commit", "-qm", "init")
+    (repo / "README").write_text("readme, updated\n")
+    (repo / "src" / "new file.py").write_text("x = 1\n")
+    run_git(repo, "add", ".")
+    return repo
+
+
+def test_get_staged_file_diffs_splits_one_diff_per_file(repo):
+    """Tests that every file gets its own diff, from a single git process."""
+    with patch("subprocess.check_output", wraps=subprocess.check_output) as git:
+        diffs = get_staged_file_diffs(["README", "src/new file.py"])
+
+    assert git.call_count == 1
+    assert sorted(diffs) == ["README", "src/new file.py"]
+    assert diffs["README"].startswith("diff --git a/README b/README\n")
+    assert "+readme, updated\n" in diffs["README"]
+    assert "+x = 1" in diffs["src/new file.py"]
+    assert "README" not in diffs["src/new file.py"]
+
+
+def test_only_changed_files_are_summarized_again(repo):
+    """Tests that staging one more file only summarizes that file."""
+    with patch.object(
+        file_summaries, "generate_commit_message", side_effect=fake_summary
+    ) as generate:
+        first = file_summaries.summarize_files(get_staged_changes())
+        (repo / "src" / "other.py").write_text("y = 2\n")
+        run_git(repo, "add", "src/other.py")
+        second = file_summaries.summarize_files(get_staged_changes())
+
+    assert first == {
+        "README": "- Changes README",
+        "src/new file.py": "- Changes src/new file.py",
+    }
+    assert second == dict(first, **{"src/other.py": "- Changes src/other.py"})
+    assert generate.call_count == 3
+
+
+def test_changing_a_blob_changes_the_key(repo):
+    """Tests that a file staged again with other contents is not served stale."""
+    change = next(c for c in get_staged_changes() if c[5] == "README")
+    (repo / "README").write_text("readme, updated again\n")
+    run_git(repo, "add", "README")
+    changed = next(c for c in get_staged_changes() if c[5] == "README")
+
+    assert file_summaries.summary_key(change, "full") != file_summaries.summary_key(
+        changed, "full"
+    )
+    assert file_summaries.summary_key(change, "full") != file_summaries.summary_key(
+        change, "stat"
+    )
+
+
+def test_no_cache_summarizes_everything_and_stores_nothing(repo):
+    with patch.object(
+        file_summaries, "generate_commit_message", side_effect=fake_summary
+    ) as generate:
+        file_summaries.summarize_files(get_staged_changes())
+        file_summaries.summarize_files(get_staged_changes(), use_cache=False)
+
+    assert generate.call_count == 4
+
+
+def test_large_and_small_files_are_summarized_alike(repo):
+    """Tests that files summarized in parts get the same use_cache and cancel."""
+    from gemmit.core import summarize
+
+    (repo / "big.txt").write_text("".join(f"line {i}\n" for i in range(100)))
+    run_git(repo, "add", "big.txt")
+    calls = []
+
+    def record(prompt, **kwargs):
+        calls.append(kwargs)
+        return "- Part"
+
+    with patch.object(
+        file_summaries, "get_large_diff_settings", return_value={"chunk_bytes": 300}
+    ), patch.object(
+        file_summaries, "generate_commit_message", side_effect=record
+    ), patch.object(summarize, "generate_commit_message", side_effect=record):
+        file_summaries.summarize_files(get_staged_changes(), use_cache=False)
+
+    # Two small files in one call each, and the big one in several parts.
+    assert len(calls) > 3
+    assert all(call["use_cache"] is False for call in calls)
+    assert len({id(call["cancel"]) for call in calls}) == 1
+
+
+def test_summary_cache_is_bounded():
+    """Tests that summaries are evicted by count, size and age like messages."""
+    settings = {"max_entries": 2, "max_bytes": 10**6, "ttl_seconds": 60}
+    for i in range(3):
+        cache.write_entry(
+            file_summaries.SUMMARY_DIR, f"key{i}", {"summary": str(i)}, settings
+        )
+        past = time.time() - 10 + i
+        os.utime(os.path.join(file_summaries.SUMMARY_DIR, f"key{i}.json"), (past, past))
+
+    assert cache.read_entry(file_summaries.SUMMARY_DIR, "key0", settings) is None
+    assert cache.read_entry(file_summaries.SUMMARY_DIR, "key2", settings)["summary"]
+
+    later = time.time() + 120
+    with patch.object(cache.time, "time", return_value=later):
+        assert cache.read_entry(file_summaries.SUMMARY_DIR, "key2", settings) is None
+
+    cache.write_entry(
+        file_summaries.SUMMARY_DIR, "big", {"summary": "x" * 100}, {"max_bytes": 50}
+    )
+    assert cache.read_entry(file_summaries.SUMMARY_DIR, "big", settings) is None
+
+
+def test_staged_prompt_is_built_from_summaries_when_enabled(repo):
+    """Tests the prompt with file_summaries on: summaries instead of the diff."""
+    settings = dict(file_summaries.get_file_summary_settings(), enabled=True)
+    with patch.object(
+        file_summaries, "get_file_summary_settings", return_value=settings
+    ), patch(
+        "gemmit.core.prompt.get_file_summary_settings", return_value=settings
+    ), patch.object(
+        file_summaries, "generate_commit_message", side_effect=fake_summary
+    ):
+        prompt = build_staged_prompt(
+            {"prompt": "Write a message."}, RepoState.collect()
+        )
+
+    assert prompt.startswith("Write a message.\n\n")
+    assert "README:\n- Changes README" in prompt
+    assert "src/new file.py:\n- Changes src/new file.py" in prompt
+    assert "diff --git" not in prompt
@@ -1,24 +1,34 @@
+import sys
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
 from gemmit.commands import generate
 
 
+@pytest.fixture(autouse=True)
+def repo_state():
+    """Keeps the command from querying the real git index."""
+    with patch("gemmit.commands.generate.RepoState") as state:
+        state.collect.return_value.has_staged_changes = True
+        yield state
+
+
 @patch("gemmit.commands.generate.load_config")
 @patch("gemmit.commands.generate.Console")
 @patch("gemmit.commands.generate.get_template")
-@patch("gemmit.commands.generate.get_staged_diff")
+@patch("gemmit.commands.generate.build_staged_prompt")
 @patch("gemmit.commands.generate.generate_commit_message")
 def test_run_success(
     mock_generate_commit,
-    mock_get_diff,
+    mock_build_prompt,
     mock_get_template,
     mock_console,
     mock_load_config,
+    repo_state,
 ):
     """Tests the successful run of the generate command with user accepting."""
     # Setup mocks
     mock_get_template.return_value = {"prompt": "Test prompt"}
-    mock_get_diff.return_value = "diff --git a/file.txt b/file.txt"
+    mock_build_prompt.return_value = "Test prompt\n\ndiff --git a/file.txt b/file.txt"
     mock_generate_commit.return_value = "feat: This is a test commit"
     mock_load_config.return_value = {"highlight_color": "blue"}
 
@@ -33,21 +43,29 @@ def test_run_success(
     # Assertions
     assert result == "feat: This is a test commit"
     mock_get_template.assert_called_once_with("my-template")
-    mock_get_diff.assert_called_once()
+    mock_build_prompt.assert_called_once_with(
+        {"prompt": "Test prompt"}, repo_state.collect.return_value, use_cache=True
+    )
     expected_prompt = "Test prompt\n\ndiff --git a/file.txt b/file.txt"
-    mock_generate_commit.assert_called_once_with(expected_prompt)
+    mock_generate_commit.assert_called_once_with(
+        expected_prompt,
+        use_cache=True,
+        refresh_cache=False,
+        on_line=ANY,
+        session=ANY,
+    )
     mock_console_instance.input.assert_called_once_with(
         "Use this message? [Y]es, [E]dit, [R]egenerate, [N]o: "
     )
 
 
 @patch("gemmit.commands.generate.get_template")
-@patch("gemmit.commands.generate.get_staged_diff")
-def test_run_no_staged_changes(mock_get_diff, mock_get_template):
+@patch("gemmit.commands.generate.build_staged_prompt")
+def test_run_no_staged_changes(mock_build_prompt, mock_get_template, repo_state):
     """Tests that the command exits gracefully if there are no staged changes."""
     # Setup mocks
     mock_get_template.return_value = {"prompt": "Test prompt"}
-    mock_get_diff.return_value = ""  # No diff
+    repo_state.collect.return_value.has_staged_changes = False
 
     with pytest.raises(SystemExit) as e:
         generate.run(["my-template"])
@@ -65,3 +83,241 @@ def test_run_no_template_specified(mock_handle_error, mock_load_config):
         "No template specified and no default template set.",
         "Usage: gemmit add <template> or gemmit --set-default <template>",
     )
+
+
+@patch("gemmit.commands.generate.open_session")
+@patch("gemmit.commands.generate.load_config")
+@patch("gemmit.commands.generate.Console")
+@patch("gemmit.commands.generate.get_template")
+@patch("gemmit.commands.generate.build_staged_prompt")
+@patch("gemmit.commands.generate.generate_commit_message")
+def test_run_regenerates_in_one_session(
+    mock_generate_commit,
+    mock_build_prompt,
+    mock_get_template,
+    mock_console,
+    mock_load_config,
+    mock_open_session,
+    repo_state,
+):
+    """Tests that every message of the loop comes from one session, closed at the end."""
+    mock_get_template.return_value = {"prompt": "Test prompt"}
+    mock_build_prompt.return_value = "Test prompt\n\ndiff --git a/file.txt b/file.txt"
+    mock_generate_commit.side_effect = ["feat: First", "feat: Second"]
+    mock_load_config.return_value = {}
+    mock_console_instance = MagicMock()
+    mock_console_instance.input.side_effect = ["r", "y"]
+    mock_console.return_value = mock_console_instance
+
+    result = generate.run(["my-template"])
+
+    assert result == "feat: Second"
+    session = mock_open_session.return_value
+    mock_open_session.assert_called_once_with(
+        "Test prompt\n\ndiff --git a/file.txt b/file.txt",
+        repo_state.collect.return_value.cwd,
+    )
+    assert all(
+        call.kwargs["session"] is session
+        for call in mock_generate_commit.call_args_list
+    )
+    session.close.assert_called_once()
+
+
+@patch("gemmit.commands.generate.Prefetcher")
+@patch("gemmit.commands.generate.load_config")
+@patch("gemmit.commands.generate.Console")
+@patch("gemmit.commands.generate.get_template")
+@patch("gemmit.commands.generate.build_staged_prompt")
+@patch("gemmit.commands.generate.generate_commit_message")
+def test_run_regenerate_uses_prefetched_candidate(
+    mock_generate_commit,
+    mock_build_prompt,
+    mock_get_template,
+    mock_console,
+    mock_load_config,
+    mock_prefetcher,
+):
+    """Tests that Regenerate takes the speculatively generated candidate."""
+    mock_get_template.return_value = {"prompt": "Test prompt"}
+    mock_build_prompt.return_value = "Test prompt\n\ndiff --git a/file.txt b/file.txt"
+    mock_generate_commit.side_effect = ["feat: First message", "feat: Second message"]
+    mock_load_config.return_value = {"prefetch": {"enabled": True, "max_candidates": 3}}
+    prefetcher = mock_prefetcher.return_value
+    # Nothing is prefetched before the first Regenerate.
+    prefetcher.take.side_effect = [None, "feat: Prefetched message"]
+
+    mock_console_instance = MagicMock()
+    mock_console_instance.input.side_effect = ["r", "r", "y"]
+    mock_console.return_value = mock_console_instance
+
+    result = generate.run(["my-template"])
+
+    assert result == "feat: Prefetched message"
+    assert mock_generate_commit.call_count == 2
+    mock_prefetcher.assert_called_once_with(
+        "Test prompt\n\ndiff --git a/file.txt b/file.txt", 3, ANY
+    )
+    assert prefetcher.start.call_count == 2
+    prefetcher.cancel.assert_called()
+
+
+@patch("gemmit.commands.generate.Prefetcher")
+@patch("gemmit.commands.generate.load_config")
+@patch("gemmit.commands.generate.Console")
+@patch("gemmit.commands.generate.get_template")
+@patch("gemmit.commands.generate.build_staged_prompt")
+@patch("gemmit.commands.generate.generate_commit_message")
+def test_run_accepting_the_first_message_prefetches_nothing(
+    mock_generate_commit,
+    mock_build_prompt,
+    mock_get_template,
+    mock_console,
+    mock_load_config,
+    mock_prefetcher,
+):
+    """Tests that no speculative call is made for a user who takes the first message."""
+    mock_get_template.return_value = {"prompt": "Test prompt"}
+    mock_build_prompt.return_value = "Test prompt\n\ndiff --git a/file.txt b/file.txt"
+    mock_generate_commit.return_value = "feat: First message"
+    mock_load_config.return_value = {"prefetch": {"enabled": True}}
+    mock_console_instance = MagicMock()
+    mock_console_instance.input.side_effect = ["y"]
+    mock_console.return_value = mock_console_instance
+
+    assert generate.run(["my-template"]) == "feat: First message"
+    mock_prefetcher.return_value.start.assert_not_called()
+    mock_generate_commit.assert_called_once()
+
+
+@patch("gemmit.commands.generate.load_config")
+@patch("gemmit.commands.generate.Console")
+@patch("gemmit.commands.generate.get_template")
+@patch("gemmit.commands.generate.build_staged_prompt")
+@patch("gemmit.commands.generate.generate_commit_message")
+def test_run_candidates_picks_numbered_message(
+    mock_generate_commit,
+    mock_build_prompt,
+    mock_get_template,
+    mock_console,
+    mock_load_config,
+):
+    """Tests that all candidates are generated and the picked one is returned."""
+    mock_get_template.return_value = {"prompt": "Test prompt"}
+    mock_build_prompt.return_value = "Test prompt\n\ndiff --git a/file.txt b/file.txt"
+    mock_generate_commit.side_effect = ["feat: One", "feat: Two", "feat: Three"]
+    mock_load_config.return_value = {}
+
+    mock_console_instance = MagicMock()
+    mock_console_instance.input.side_effect = ["9", "2"]
+    mock_console.return_value = mock_console_instance
+
+    result = generate.run_candidates(["my-template"], 3)
+
+    assert result in ["feat: One", "feat: Two", "feat: Three"]
+    assert mock_generate_commit.call_count == 3
+    use_cache_flags = sorted(
+        call.kwargs["use_cache"] for call in mock_generate_commit.call_args_list
+    )
+    assert use_cache_flags == [False, False, True]
+    mock_console_instance.input.assert_called_with("Use which message? [1-3], [N]o: ")
+
+
+@patch("gemmit.commands.generate.load_config")
+@patch("gemmit.commands.generate.Console")
+@patch("gemmit.commands.generate.get_template")
+@patch("gemmit.commands.generate.build_staged_prompt")
+@patch("gemmit.commands.generate.generate_commit_message")
+def test_run_candidates_prints_messages_without_markup(
+    mock_generate_commit,
+    mock_build_prompt,
+    mock_get_template,
+    mock_console,
+    mock_load_config,
+):
+    """Tests that brackets in a candidate are printed as is, not as rich markup."""
+    mock_get_template.return_value = {"prompt": "Test prompt"}
+    mock_build_prompt.return_value = "Test prompt\n\ndiff --git a/file.txt b/file.txt"
+    mock_generate_commit.return_value = "chore: Bump version [skip ci]\n\n[bold]Body"
+    mock_load_config.return_value = {"highlight_color": "blue"}
+    console = mock_console.return_value
+    console.input.return_value = "1"
+
+    generate.run_candidates(["my-template"], 1)
+
+    for line in ("chore: Bump version [skip ci]", "", "[bold]Body"):
+        console.print.assert_any_call(line, style="blue", markup=False, highlight=False)
+
+
+@patch("gemmit.commands.generate.load_config")
+@patch("gemmit.commands.generate.Console")
+@patch("gemmit.commands.generate.get_template")
+@patch("gemmit.commands.generate.build_staged_prompt")
+@patch("gemmit.commands.generate.generate_commit_message")
+def test_run_candidates_skips_failed_candidates(
+    mock_generate_commit,
+    mock_build_prompt,
+    mock_get_template,
+    mock_console,
+    mock_load_config,
+):
+    """Tests that a failed candidate does not abort the others."""
+    mock_get_template.return_value = {"prompt": "Test prompt"}
+    mock_build_prompt.return_value = "Test prompt\n\ndiff --git a/file.txt b/file.txt"
+    mock_generate_commit.side_effect = [SystemExit(1), "feat: Survivor"]
+    mock_load_config.return_value = {"candidates": {"max_workers": 1}}
+
+    mock_console_instance = MagicMock()
+    mock_console_instance.input.return_value = "1"
+    mock_console.return_value = mock_console_instance
+
+    assert generate.run_candidates(["my-template"], 2) == "feat: Survivor"
+
+
+@patch("gemmit.commands.generate.load_config")
+@patch("gemmit.commands.generate.Console")
+@patch("gemmit.commands.generate.get_template")
+@patch("gemmit.commands.generate.build_staged_prompt")
+@patch("gemmit.commands.generate.generate_commit_message")
+def test_run_prints_lines_as_they_stream(
+    mock_generate_commit,
+    mock_build_prompt,
+    mock_get_template,
+    mock_console,
+    mock_load_config,
+):
+    """Tests that each message line is printed as soon as it is generated."""
+    mock_get_template.return_value = {"prompt": "Test prompt"}
+    mock_build_prompt.return_value = "Test prompt\n\ndiff --git a/file.txt b/file.txt"
+    mock_load_config.return_value = {"highlight_color": "blue"}
+    console = mock_console.return_value
+    console.input.return_value = "y"
+    printed = []
+    console.print.side_effect = lambda *args, **kwargs: printed.append(args)
+
+    def fake_generate(prompt, on_line, **kwargs):
+        on_line("feat: [scope] Streamed subject")
+        # The spinner is gone and the first line is on screen before the rest.
+        console.status.return_value.stop.assert_called()
+        assert ("feat: [scope] Streamed subject",) in printed
+        on_line("Body")
+        return "feat: [scope] Streamed subject\nBody"
+
+    mock_generate_commit.side_effect = fake_generate
+
+    assert generate.run(["my-template"]) == "feat: [scope] Streamed subject\nBody"
+    console.print.assert_any_call("Body", style="blue", markup=False, highlight=False)
+
+
+def test_yes_with_candidates_is_rejected(monkeypatch, capsys):
+    """Tests that -y does not silently drop --candidates."""
+    from gemmit import gemmit
+
+    monkeypatch.setattr(sys, "argv", ["gemmit", "kernel", "-y", "--candidates", "3"])
+    with patch("gemmit.commands.generate.generate_commit_message") as generate:
+        with pytest.raises(SystemExit) as e:
+            gemmit.main()
+
+    assert e.value.code == 2
+    assert "cannot be used with -y" in capsys.readouterr().err
+    generate.assert_not_called()
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import patch
 import subprocess
 from gemmit.core import git
+from conftest import run_git
 
 
 @patch("subprocess.check_output")
@@ -12,7 +13,7 @@ def test_get_staged_diff_success(mock_check_output):
     diff = git.get_staged_diff()
     assert "-hello" in diff
     assert "+world" in diff
-    mock_check_output.assert_called_once_with(["git", "diff", "--cached"])
+    mock_check_output.assert_called_once_with(["git", "diff", "--cached"], cwd=None)
 
 
 @patch("subprocess.check_output")
@@ -33,3 +34,123 @@ def test_get_staged_diff_error(mock_check_output):
 
     with pytest.raises(SystemExit):
         git.get_staged_diff()
+
+
+@patch("subprocess.Popen")
+def test_iter_staged_diff_streams_lines(mock_popen):
+    """Tests that iter_staged_diff yields the diff line by line."""
+    process = mock_popen.return_value
+    process.stdout.__iter__.return_value = iter([b"diff --git a/f b/f\n", b"+world\n"])
+    process.stderr.read.return_value = b""
+    process.wait.return_value = 0
+    process.poll.return_value = 0
+
+    assert list(git.iter_staged_diff()) == ["diff --git a/f b/f\n", "+world\n"]
+    mock_popen.assert_called_once()
+    assert mock_popen.call_args[0][0] == ["git", "diff", "--cached"]
+
+
+@patch("subprocess.Popen")
+def test_iter_staged_diff_error(mock_popen):
+    """Tests that a failing git diff is reported once the stream ends."""
+    process = mock_popen.return_value
+    process.stdout.__iter__.return_value = iter([])
+    process.stderr.read.return_value = b"fatal: not a git repository"
+    process.wait.return_value = 128
+    process.poll.return_value = 128
+
+    with pytest.raises(SystemExit):
+        list(git.iter_staged_diff())
+
+
+@patch("subprocess.run")
+def test_has_staged_changes(mock_run):
+    """Tests that the exit status of git diff --quiet is interpreted."""
+    mock_run.return_value.returncode = 1
+    assert git.has_staged_changes() is True
+    mock_run.return_value.returncode = 0
+    assert git.has_staged_changes() is False
+
+
+def test_parse_numstat_handles_renames_and_binaries():
+    """Tests that renamed files use their new path and binaries keep '-' counts."""
+    output = "1\t2\tsrc/a.py\0-\t-\tlogo.png\0003\t0\t\0old name.py\0new name.py\0"
+
+    assert git.parse_numstat(output) == [
+        ("1", "2", "src/a.py"),
+        ("-", "-", "logo.png"),
+        ("3", "0", "new name.py"),
+    ]
+
+
+@patch("subprocess.check_output")
+def test_get_staged_diff_stat_level(mock_check_output):
+    """Tests that the stat level keeps only the diffstat and headers."""
+    mock_check_output.return_value = (
+        b" file.txt | 2 +-\n"
+        b"diff --git a/file.txt b/file.txt\n"
+        b"--- a/file.txt\n"
+        b"+++ b/file.txt\n"
+        b"@@ -1 +1 @@ def main():\n"
+        b"-hello\n"
+        b"+world\n"
+    )
+
+    diff = git.get_staged_diff("stat")
+
+    assert diff == (
+        " file.txt | 2 +-\n"
+        "diff --git a/file.txt b/file.txt\n"
+        "@@ -1 +1 @@ def main():\n"
+    )
+    assert "-U0" in mock_check_output.call_args[0][0]
+
+
+def test_get_staged_diff_unknown_level():
+    """Tests that an unknown compaction level is rejected."""
+    with pytest.raises(SystemExit):
+        git.get_staged_diff("tiny")
+
+
+@pytest.fixture
+def repo(repo):
+    """A repository with one commit on branch 'main'."""
+    (repo / "a.txt").write_text("one\n")
+    run_git(repo, "add", "a.txt")
+    run_git(repo, "commit", "-q", "-m", "initial")
+    return repo
+
+
+def test_repo_state_collect(repo):
+    """Tests that the snapshot reads the branch and staged files of a repo."""
+    (repo / "a.txt").write_text("one\ntwo\n")
+    run_git(repo, "add", "a.txt")
+
+    with patch("subprocess.check_output", wraps=subprocess.check_output) as spy:
+        state = git.RepoState.collect(str(repo))
+        assert spy.call_count == 1
+
+    assert state.branch == "main"
+    assert state.numstat == [("1", "0", "a.txt")]
+    assert state.has_staged_changes
+    assert state.remote_url == ""
+
+
+def test_repo_state_detached_head_from_subdirectory(repo):
+    """Tests that a detached HEAD is reported like 'git rev-parse --abbrev-ref'."""
+    (repo / "sub").mkdir()
+    run_git(repo, "checkout", "-q", "--detach")
+
+    state = git.RepoState.collect(str(repo / "sub"))
+
+    assert state.branch == "HEAD"
+    assert not state.has_staged_changes
+
+
+def test_repo_state_in_worktree(repo, tmp_path):
+    """Tests that the branch of a linked worktree is read through its .git file."""
+    worktree = tmp_path / "wt"
+    run_git(repo, "worktree", "add", "-q", "-b", "feature", str(worktree))
+
+    assert git.find_git_dir(str(worktree)).startswith(str(repo / ".git"))
+    assert git.RepoState.collect(str(worktree)).branch == "feature"
@@ -0,0 +1,151 @@
+import json
+import os
+import sys
+import time
+import pytest
+from unittest.mock import patch
+from gemmit.core import ai, hedge, ratelimit
+
+# A fake gemini whose first invocation is slow and whose later ones are fast.
+FAKE_GEMINI = """#!{python}
+import os, sys, time
+sys.stdin.read()
+marker = {marker!r}
+first = not os.path.exists(marker)
+open(marker, "a").write(str(os.getpid()) + "\\n")
+if first:
+    time.sleep({slow})
+    print("feat: Slow answer")
+else:
+    print("feat: Hedged answer")
+"""
+
+SETTINGS = {"enabled": True, "min_samples": 3, "percentile": 50}
+
+
+def seed_history(seconds, hedged=False, count=5):
+    for _ in range(count):
+        hedge.record_call(seconds, hedged, SETTINGS)
+
+
+@pytest.fixture
+def slow_first_gemini(tmp_path, monkeypatch):
+    """Puts a gemini on PATH whose first call takes 5 seconds; returns its log."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    marker = tmp_path / "calls"
+    gemini = bin_dir / "gemini"
+    gemini.write_text(
+        FAKE_GEMINI.format(python=sys.executable, marker=str(marker), slow=5)
+    )
+    gemini.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    return marker
+
+
+def test_percentile():
+    """Tests the nearest-rank percentile."""
+    values = [5, 1, 4, 2, 3]
+    assert hedge.percentile(values, 50) == 3
+    assert hedge.percentile(values, 95) == 5
+    assert hedge.percentile(values, 1) == 1
+
+
+def test_hedge_delay_adapts_to_history():
+    """Tests that the hedge threshold is a percentile of recent latencies."""
+    assert hedge.hedge_delay(SETTINGS) is None  # No history yet.
+    seed_history(2.0)
+    seed_history(4.0, count=2)
+    assert hedge.hedge_delay(SETTINGS) == 2.0
+    assert hedge.hedge_delay(dict(SETTINGS, percentile=100)) == 4.0
+    assert hedge.hedge_delay(dict(SETTINGS, enabled=False)) is None
+
+
+def test_hedge_delay_respects_budget():
+    """Tests that hedging stops once too many recent calls were hedged."""
+    seed_history(1.0, hedged=True, count=2)
+    seed_history(1.0, count=8)
+    assert hedge.hedge_delay(dict(SETTINGS, max_fraction=0.3)) == 1.0
+    assert hedge.hedge_delay(dict(SETTINGS, max_fraction=0.2)) is None
+    # Hedging every call is the most there can be: never more than double.
+    seed_history(1.0, hedged=True, count=hedge.DEFAULT_HISTORY_SIZE)
+    assert hedge.hedge_delay(dict(SETTINGS, max_fraction=5)) is None
+
+
+def test_record_call_keeps_newest():
+    """Tests that the history is bounded."""
+    settings = dict(SETTINGS, history_size=3)
+    for seconds in [1, 2, 3, 4]:
+        hedge.record_call(seconds, False, settings)
+    with open(hedge.LATENCY_FILE) as f:
+        assert [c["seconds"] for c in json.load(f)["calls"]] == [2, 3, 4]
+
+
+def test_slow_call_is_hedged_and_loser_killed(slow_first_gemini):
+    """Tests that a call slower than usual is raced by a second one, which wins."""
+    seed_history(0.2)
+    lines = []
+
+    with patch.object(ai, "get_hedge_settings", return_value=SETTINGS):
+        start = time.monotonic()
+        message = ai.generate_commit_message(
+            "prompt", use_cache=False, on_line=lines.append
+        )
+        elapsed = time.monotonic() - start
+
+    assert message == lines[0] == "feat: Hedged answer"
+    assert elapsed < 4
+    pids = [int(pid) for pid in slow_first_gemini.read_text().split()]
+    assert len(pids) == 2
+    # The slow call was killed rather than left to use quota.
+    with pytest.raises(ProcessLookupError):
+        for _ in range(50):
+            os.kill(pids[0], 0)
+            time.sleep(0.1)
+    with open(hedge.LATENCY_FILE) as f:
+        assert json.load(f)["calls"][-1]["hedged"] is True
+
+
+def test_no_hedge_without_a_spare_permit(slow_first_gemini, monkeypatch):
+    """Tests that a hedge takes a rate limit permit, and is skipped if none is spare."""
+    limit = {"enabled": True, "requests_per_minute": 1, "burst": 2}
+    monkeypatch.setattr(ratelimit, "get_rate_limit_settings", lambda: limit)
+    seed_history(0.2)
+    # Another process took a permit: the only one left is the first call's.
+    ratelimit.acquire(settings=limit)
+
+    with patch.object(ai, "get_hedge_settings", return_value=SETTINGS):
+        message = ai.generate_commit_message("prompt", use_cache=False)
+
+    assert message == "feat: Slow answer"
+    assert len(slow_first_gemini.read_text().split()) == 1
+    assert not ratelimit.has_spare_permit(limit, reserve=0)
+
+
+def test_hedge_takes_a_permit(slow_first_gemini, monkeypatch):
+    limit = {"enabled": True, "requests_per_minute": 1, "burst": 3}
+    monkeypatch.setattr(ratelimit, "get_rate_limit_settings", lambda: limit)
+    seed_history(0.2)
+
+    with patch.object(ai, "get_hedge_settings", return_value=SETTINGS):
+        assert ai.generate_commit_message("prompt", use_cache=False) == (
+            "feat: Hedged answer"
+        )
+
+    assert len(slow_first_gemini.read_text().split()) == 2
+    # The first call and the hedge each took one of the three.
+    assert ratelimit.has_spare_permit(limit, reserve=0)
+    assert not ratelimit.has_spare_permit(limit, reserve=1)
+
+
+def test_fast_call_is_not_hedged(slow_first_gemini):
+    """Tests that calls within the usual latency run once."""
+    slow_first_gemini.write_text("0\n")  # Make the next call a fast one.
+    seed_history(5.0)
+
+    with patch.object(ai, "get_hedge_settings", return_value=SETTINGS):
+        assert ai.generate_commit_message("prompt", use_cache=False) == (
+            "feat: Hedged answer"
+        )
+
+    assert len(slow_first_gemini.read_text().split()) == 2
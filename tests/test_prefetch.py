@@ -0,0 +1,61 @@
+from unittest.mock import patch
+from gemmit.core.prefetch import Prefetcher
+from gemmit.utils.errors import GenerationCancelled
+
+
+@patch("gemmit.core.prefetch.generate_commit_message")
+def test_prefetcher_take_returns_candidate(mock_generate):
+    """Tests that a started candidate is returned by take."""
+    mock_generate.return_value = "feat: Prefetched message"
+    prefetcher = Prefetcher("a prompt", max_candidates=2)
+
+    prefetcher.start()
+    assert prefetcher.take() == "feat: Prefetched message"
+    assert prefetcher.take() is None
+    prefetcher.cancel()
+
+    _, kwargs = mock_generate.call_args
+    assert kwargs["use_cache"] is False
+    assert kwargs["speculative"] is True
+
+
+@patch("gemmit.core.prefetch.generate_commit_message")
+def test_prefetcher_respects_cap(mock_generate):
+    """Tests that no more than max_candidates generations are started."""
+    mock_generate.return_value = "feat: Prefetched message"
+    prefetcher = Prefetcher("a prompt", max_candidates=1)
+
+    prefetcher.start()
+    prefetcher.take()
+    prefetcher.start()
+    assert prefetcher.take() is None
+    assert mock_generate.call_count == 1
+    prefetcher.cancel()
+
+
+@patch("gemmit.core.prefetch.generate_commit_message")
+def test_prefetcher_cancel_stops_generation(mock_generate):
+    """Tests that cancel signals the in-flight generation and waits for it."""
+
+    def slow_generate(prompt, use_cache, cancel, session, speculative):
+        cancel.wait()
+        raise GenerationCancelled()
+
+    mock_generate.side_effect = slow_generate
+    prefetcher = Prefetcher("a prompt")
+
+    prefetcher.start()
+    prefetcher.cancel()
+    assert prefetcher.take() is None
+
+
+@patch("gemmit.core.prefetch.has_spare_permit", return_value=False)
+@patch("gemmit.core.prefetch.generate_commit_message")
+def test_prefetcher_leaves_the_last_permit(mock_generate, mock_spare):
+    """Tests that nothing is prefetched while the rate limiter has no permit to spare."""
+    prefetcher = Prefetcher("a prompt")
+
+    prefetcher.start()
+    assert prefetcher.take() is None
+    mock_generate.assert_not_called()
+    prefetcher.cancel()
@@ -0,0 +1,113 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from gemmit.core import ai, ratelimit
+from gemmit.utils.errors import GenerationCancelled
+
+# 600 requests per minute: one permit every 0.1s once the burst is spent.
+SETTINGS = {"enabled": True, "requests_per_minute": 600, "burst": 2}
+
+# Takes permits in a separate process sharing the test's state file.
+WORKER = """
+import sys, time
+from gemmit.core import ratelimit
+ratelimit.RATE_LIMIT_FILE = sys.argv[1]
+for _ in range(int(sys.argv[2])):
+    ratelimit.acquire(settings={settings!r})
+    print(time.time(), flush=True)
+"""
+
+
+def timed_acquires(count, settings=SETTINGS):
+    start = time.monotonic()
+    times = []
+    for _ in range(count):
+        ratelimit.acquire(settings=settings)
+        times.append(time.monotonic() - start)
+    return times
+
+
+def test_acquire_allows_burst_then_paces():
+    """Tests that a burst of calls starts at once and later ones are spaced out."""
+    times = timed_acquires(4)
+    assert times[1] < 0.05
+    assert 0.08 < times[2] < 0.2
+    assert 0.18 < times[3] < 0.3
+
+
+def test_quota_error_blocks_then_releases_one_at_a_time():
+    """Tests that a recorded quota error holds calls back, then lets them trickle."""
+    ratelimit.record_quota_error(0.3, SETTINGS)
+
+    times = timed_acquires(2)
+
+    assert 0.25 < times[0] < 0.4
+    assert times[1] - times[0] > 0.08
+    with open(ratelimit.RATE_LIMIT_FILE) as f:
+        assert json.load(f)["quota_errors"] == 1
+
+
+def test_acquire_can_be_cancelled():
+    """Tests that a caller waiting for a permit can give up."""
+    ratelimit.record_quota_error(5, SETTINGS)
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+
+    with pytest.raises(GenerationCancelled):
+        ratelimit.acquire(cancel, SETTINGS)
+
+
+def test_reserve_leaves_the_last_permit_to_others():
+    """Tests that a speculative acquire waits rather than take the last permit."""
+    ratelimit.acquire(settings=SETTINGS)
+    assert not ratelimit.has_spare_permit(SETTINGS)
+
+    start = time.monotonic()
+    ratelimit.acquire(settings=SETTINGS, reserve=1)
+    assert time.monotonic() - start > 0.08
+    # The permit it left is still there for the next call.
+    assert timed_acquires(1)[0] < 0.05
+
+
+def test_disabled_limiter_keeps_no_state():
+    """Tests that nothing is paced or written when the limiter is off."""
+    ratelimit.record_quota_error(5, {"enabled": False})
+    assert timed_acquires(5, {"enabled": False})[-1] < 0.05
+    assert not os.path.exists(ratelimit.RATE_LIMIT_FILE)
+
+
+def test_quota_gate_reports_to_other_processes():
+    """Tests that the in-process gate shares quota errors through the limiter."""
+    with patch.object(ratelimit, "get_rate_limit_settings", return_value=SETTINGS):
+        ai.QuotaGate().close_for(0.3)
+        start = time.monotonic()
+        # A fresh gate stands in for another process, which knows nothing locally.
+        ai.QuotaGate().wait()
+    assert time.monotonic() - start > 0.25
+
+
+def test_limiter_is_shared_between_processes():
+    """Tests that permits taken by concurrent processes add up to one rate."""
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    code = WORKER.format(settings=SETTINGS)
+    env = dict(os.environ, PYTHONPATH=root)
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", code, ratelimit.RATE_LIMIT_FILE, "3"],
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+        for _ in range(2)
+    ]
+    times = sorted(
+        float(line) for worker in workers for line in worker.communicate()[0].split()
+    )
+
+    assert len(times) == 6
+    # Two permits of burst, then four more at 0.1s intervals.
+    assert times[-1] - times[0] > 0.35
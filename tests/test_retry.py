@@ -0,0 +1,181 @@
+import json
+import sys
+import pytest
+from unittest.mock import patch
+from gemmit.core import ai, retry
+from gemmit.core.retry import RetriesExhausted, RetryPolicy, TransientError
+
+# A fake gemini that plays one scripted outcome per invocation.
+FAKE_GEMINI = """#!{python}
+import json, sys, time
+sys.stdin.read()
+with open({state!r}) as f:
+    state = json.load(f)
+outcome = state["outcomes"][min(state["calls"], len(state["outcomes"]) - 1)]
+state["calls"] += 1
+with open({state!r}, "w") as f:
+    json.dump(state, f)
+if outcome["kind"] == "hang":
+    time.sleep(60)
+elif outcome["kind"] == "fail":
+    sys.stderr.write(outcome["stderr"])
+    sys.exit(1)
+else:
+    print(outcome["message"])
+"""
+
+
+@pytest.fixture
+def fake_backend(tmp_path, monkeypatch):
+    """Installs the fake gemini and returns a function to script its outcomes."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    state_file = tmp_path / "state.json"
+    gemini = bin_dir / "gemini"
+    gemini.write_text(FAKE_GEMINI.format(python=sys.executable, state=str(state_file)))
+    gemini.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+
+    def script(*outcomes):
+        state_file.write_text(json.dumps({"calls": 0, "outcomes": list(outcomes)}))
+        return lambda: json.loads(state_file.read_text())["calls"]
+
+    return script
+
+
+def fast_policy(**overrides):
+    settings = {
+        "base_delay_seconds": 0.01,
+        "max_delay_seconds": 0.05,
+        "attempt_timeout_seconds": 5,
+        "deadline_seconds": 30,
+    }
+    settings.update(overrides)
+    return RetryPolicy.from_settings(settings)
+
+
+def test_classify_error():
+    """Tests that errors are sorted into quota, transient and fatal ones."""
+    assert retry.classify_error("Error: 429 Too Many Requests") == "quota"
+    assert retry.classify_error("RESOURCE_EXHAUSTED: Quota exceeded") == "quota"
+    assert retry.classify_error("503 Service Unavailable") == "transient"
+    assert retry.classify_error("request failed: ECONNRESET") == "transient"
+    assert retry.classify_error("API key not valid") == "fatal"
+    assert retry.classify_error("line 4290 of the prompt") == "fatal"
+
+
+def test_parse_retry_after():
+    """Tests that server-suggested delays are read from common error formats."""
+    assert retry.parse_retry_after("Retry-After: 7") == 7
+    assert retry.parse_retry_after('{"retryDelay": "34s"}') == 34
+    assert retry.parse_retry_after("Please retry in 2.5s.") == 2.5
+    assert retry.parse_retry_after("Quota exceeded") is None
+
+
+def test_backoff_grows_with_jitter_and_cap():
+    """Tests that delays double up to the cap and jitter only shortens them."""
+    policy = RetryPolicy(base_delay=1, max_delay=5, jitter=0.5)
+    for attempt, ceiling in [(0, 1), (1, 2), (2, 4), (3, 5), (10, 5)]:
+        delays = [policy.backoff(attempt) for _ in range(50)]
+        assert all(ceiling / 2 <= d <= ceiling for d in delays)
+    assert policy.backoff(0, retry_after=12) == 12
+    assert RetryPolicy(base_delay=1, jitter=0).backoff(2) == 4
+
+
+def test_run_retries_transient_errors_only():
+    """Tests that transient errors are retried and other errors raised at once."""
+    calls = []
+
+    def flaky(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise TransientError("Transient API error")
+        return "ok"
+
+    assert fast_policy().run(flaky) == "ok"
+    assert len(calls) == 3
+
+    def broken(timeout):
+        raise ValueError("fatal")
+
+    with pytest.raises(ValueError):
+        fast_policy().run(broken)
+
+
+def test_run_gives_up_before_passing_deadline():
+    """Tests that a suggested delay beyond the deadline fails fast."""
+
+    def rate_limited(timeout):
+        raise TransientError("API quota error (429)", retry_after=60)
+
+    with patch("time.sleep") as mock_sleep:
+        with pytest.raises(RetriesExhausted, match="deadline"):
+            fast_policy(deadline_seconds=10).run(rate_limited)
+    mock_sleep.assert_not_called()
+
+
+def test_run_shares_quota_backoff_through_gate():
+    """Tests that quota errors close the gate instead of sleeping privately."""
+    gate = ai.QuotaGate()
+    attempts = []
+
+    def rate_limited_once(timeout):
+        attempts.append(timeout)
+        if len(attempts) == 1:
+            raise TransientError("quota", retry_after=0.2, quota=True)
+        return "ok"
+
+    with patch.object(gate, "close_for", wraps=gate.close_for) as mock_close:
+        assert fast_policy().run(rate_limited_once, gate=gate) == "ok"
+    mock_close.assert_called_once_with(0.2)
+
+
+def test_fake_backend_recovers_from_injected_failures(fake_backend):
+    """Tests the whole path against a backend failing with a quota and a 503 error."""
+    calls = fake_backend(
+        {"kind": "fail", "stderr": "429 Quota exceeded. Please retry in 0.05s."},
+        {"kind": "fail", "stderr": "503 Service Unavailable"},
+        {"kind": "ok", "message": "feat: Survive flaky backends"},
+    )
+
+    with patch.object(
+        retry, "get_retry_settings", return_value={"base_delay_seconds": 0.01}
+    ):
+        message = ai.generate_commit_message("prompt", use_cache=False)
+
+    assert message == "feat: Survive flaky backends"
+    assert calls() == 3
+
+
+def test_fake_backend_fatal_error_fails_fast(fake_backend):
+    """Tests that an error that retrying cannot fix is not retried."""
+    calls = fake_backend({"kind": "fail", "stderr": "Error: API key not valid"})
+
+    with pytest.raises(SystemExit):
+        ai.generate_commit_message("prompt", use_cache=False)
+    assert calls() == 1
+
+
+def test_fake_backend_hung_attempt_times_out(fake_backend):
+    """Tests that a hung gemini is killed after the attempt timeout and retried."""
+    calls = fake_backend(
+        {"kind": "hang"},
+        {"kind": "ok", "message": "feat: Recover from a hang"},
+    )
+    settings = {"attempt_timeout_seconds": 0.5, "base_delay_seconds": 0.01}
+
+    with patch.object(retry, "get_retry_settings", return_value=settings):
+        message = ai.generate_commit_message("prompt", use_cache=False)
+
+    assert message == "feat: Recover from a hang"
+    assert calls() == 2
+
+
+def test_fake_backend_total_deadline(fake_backend):
+    """Tests that a backend that keeps hanging cannot block a commit forever."""
+    fake_backend({"kind": "hang"})
+    settings = {"attempt_timeout_seconds": 5, "deadline_seconds": 0.5}
+
+    with patch.object(retry, "get_retry_settings", return_value=settings):
+        with pytest.raises(SystemExit):
+            ai.generate_commit_message("prompt", use_cache=False)
@@ -0,0 +1,113 @@
+import subprocess
+import pytest
+from unittest.mock import patch
+from gemmit.commands.reword import run as reword_run
+from gemmit.core import reword
+from conftest import run_git
+
+
+def fake_message(prompt, use_cache=True, cancel=None):
+    """Names the files in the prompt's diff."""
+    files = sorted(
+        line.split(" b/", 1)[1]
+        for line in prompt.split("\n")
+        if line.startswith("diff --git ")
+    )
+    return f"Reworded {', '.join(files)}\n\nNew body."
+
+
+@pytest.fixture
+def repo(repo, monkeypatch):
+    """A repository with a base commit and three commits to reword."""
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "Committer")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "committer@example.com")
+    monkeypatch.setenv("GIT_AUTHOR_NAME", "Carol")
+    monkeypatch.setenv("GIT_AUTHOR_EMAIL", "carol@example.com")
+
+    def commit(path, content, message, author):
+        (repo / path).write_text(content)
+        run_git(repo, "add", path)
+        run_git(
+            repo,
+            "commit",
+            "-qm",
+            message,
+            f"--author={author} <{author.lower()}@example.com>",
+            "--date=2020-01-02T03:04:05+0200",
+        )
+
+    commit("base.txt", "base\n", "base", "Alice")
+    commit("one.txt", "1\n", "wip", "Alice")
+    commit("two.txt", "2\n", "fix stuff", "Bob")
+    commit("one.txt", "1\n1\n", "more", "Alice")
+    (repo / "untracked.txt").write_text("keep me\n")
+    return repo
+
+
+def test_iter_commits_reads_the_range_in_one_pass(repo):
+    """Tests that every commit comes with its own diff, oldest first."""
+    with patch("subprocess.Popen", wraps=subprocess.Popen) as popen:
+        commits = list(reword.iter_commits("HEAD~3.."))
+
+    assert popen.call_count == 1
+    assert [c.subject for c in commits] == ["wip", "fix stuff", "more"]
+    assert [c.author_name for c in commits] == ["Alice", "Bob", "Alice"]
+    assert commits[0].author_date.endswith("+0200")
+    assert commits[0].diff[0].startswith("diff --git a/one.txt b/one.txt")
+    assert all(not line.startswith("\0") for c in commits for line in c.diff)
+    assert "+1\n" in "".join(commits[2].diff)
+
+
+def test_reword_rewrites_messages_and_keeps_trees_and_authors(repo):
+    """Tests a full reword: new messages, same trees, authors and dates, HEAD moved."""
+    old = run_git(repo, "log", "--format=%T %an %ae %ad", "-4").splitlines()
+
+    with patch.object(reword, "generate_commit_message", side_effect=fake_message):
+        reword_run(["HEAD~3..", "-y", "--no-cache", "-t", "kernel"])
+
+    assert run_git(repo, "log", "--format=%s", "-4").splitlines() == [
+        "Reworded one.txt",
+        "Reworded two.txt",
+        "Reworded one.txt",
+        "base",
+    ]
+    assert run_git(repo, "log", "--format=%T %an %ae %ad", "-4").splitlines() == old
+    assert run_git(repo, "log", "-1", "--format=%b") == "New body.\n\n"
+    assert run_git(repo, "status", "--porcelain") == "?? untracked.txt\n"
+    assert "reword: HEAD~3.." in run_git(repo, "reflog", "-1")
+
+
+def test_reword_keeps_merge_messages_and_rewrites_their_parents(repo):
+    """Tests that merges are recreated on top of the reworded commits."""
+    run_git(repo, "checkout", "-q", "-b", "side", "HEAD~1")
+    (repo / "side.txt").write_text("side\n")
+    run_git(repo, "add", "side.txt")
+    run_git(repo, "commit", "-qm", "side work")
+    run_git(repo, "checkout", "-q", "main")
+    run_git(repo, "merge", "-q", "--no-ff", "-m", "Merge side", "side")
+
+    with patch.object(reword, "generate_commit_message", side_effect=fake_message):
+        reword_run(["HEAD~2..", "-y", "-t", "kernel"])
+
+    assert run_git(repo, "log", "-1", "--format=%s") == "Merge side\n"
+    parents = run_git(repo, "log", "--format=%s", "HEAD^1", "-1")
+    assert parents == "Reworded one.txt\n"
+    assert run_git(repo, "log", "--format=%s", "HEAD^2", "-1") == "Reworded side.txt\n"
+
+
+def test_reword_refuses_ranges_not_ending_at_head(repo):
+    """Tests that nothing is generated for a range HEAD is not the tip of."""
+    with patch.object(reword, "generate_commit_message") as generate:
+        with pytest.raises(SystemExit):
+            reword_run(["HEAD~3..HEAD~1", "-y", "-t", "kernel"])
+    generate.assert_not_called()
+
+
+def test_reword_dry_run_changes_nothing(repo, capsys):
+    head = run_git(repo, "rev-parse", "HEAD")
+
+    with patch.object(reword, "generate_commit_message", side_effect=fake_message):
+        reword_run(["HEAD~2..", "--dry-run", "-t", "kernel"])
+
+    assert run_git(repo, "rev-parse", "HEAD") == head
+    assert "Reworded two.txt" in capsys.readouterr().out
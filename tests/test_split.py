@@ -0,0 +1,163 @@
+import os
+import time
+import pytest
+from unittest.mock import patch
+from gemmit.core import git, split
+from gemmit.core.git import RepoState, get_staged_changes
+from conftest import run_git
+
+
+@pytest.fixture
+def repo(repo):
+    """A repository with a commit, staged changes in three groups and unstaged edits."""
+    (repo / "docs").mkdir()
+    (repo / "src" / "core").mkdir(parents=True)
+    (repo / "README").write_text("readme\n")
+    (repo / "docs" / "old.md").write_text("old\n")
+    (repo / "src" / "core" / "main.py").write_text("print(1)\n")
+    run_git(repo, "add", ".")
+    run_git(repo, "commit", "-qm", "init")
+
+    (repo / "README").write_text("readme, updated\n")
+    (repo / "docs" / "new file.md").write_text("new\n")
+    run_git(repo, "rm", "-q", "docs/old.md")
+    (repo / "src" / "core" / "main.py").write_text("print(2)\n")
+    (repo / "src" / "util.py").write_text("x = 1\n")
+    run_git(repo, "add", ".")
+    # Not staged, so it must stay out of every commit.
+    (repo / "src" / "util.py").write_text("x = 2\n")
+    return repo
+
+
+def fake_message(prompt, use_cache=True, cancel=None, cwd=None):
+    """Names the files in the prompt's diff, so that tests can check what it saw."""
+    files = sorted(
+        line.split(" b/", 1)[1]
+        for line in prompt.split("\n")
+        if line.startswith("diff --git ")
+    )
+    return f"Update {', '.join(files)}\n\nBody."
+
+
+def test_group_key():
+    """Tests grouping by top directories and by file type."""
+    assert split.group_key("README") == "."
+    assert split.group_key("src/core/main.py") == "src"
+    assert split.group_key("src/core/main.py", depth=2) == "src/core"
+    assert split.group_key("src/core/main.py", "type") == ".py"
+    assert split.group_key("build/Makefile", "type") == "Makefile"
+
+
+def test_group_changes_merges_smallest_groups_beyond_the_limit():
+    """Tests that only the largest groups are kept when there are too many."""
+    changes = [
+        ("100644", "100644", "a" * 40, "b" * 40, "M", path)
+        for path in ("a/1", "b/1", "b/2", "c/1", "d/1")
+    ]
+    numstat = [("1", "0", "a/1"), ("50", "0", "b/1"), ("5", "5", "b/2")]
+    numstat += [("30", "0", "c/1"), ("-", "-", "d/1")]
+
+    groups = split.group_changes(changes, numstat, {"max_groups": 3})
+
+    assert [name for name, _ in groups] == ["b", "c", "other"]
+    assert [change[5] for change in groups[2][1]] == ["a/1", "d/1"]
+
+
+def test_group_changes_rejects_unknown_grouping():
+    with pytest.raises(SystemExit):
+        split.group_changes([], settings={"group_by": "author"})
+
+
+def test_split_commits_each_group_without_touching_the_index(repo):
+    """Tests that each group becomes one commit, and the result is what was staged."""
+    staged_tree = run_git(repo, "write-tree").strip()
+    state = RepoState.collect()
+    groups = split.group_changes(get_staged_changes(), state.numstat, {})
+
+    with patch.object(split, "generate_commit_message", side_effect=fake_message):
+        messages = split.generate_group_messages(
+            {"prompt": "Write a message."}, state, groups, use_cache=False
+        )
+    commits = split.commit_groups(groups, messages)
+
+    assert [name for name, _ in groups] == [".", "docs", "src"]
+    assert messages == [
+        "Update README\n\nBody.",
+        "Update docs/new file.md, docs/old.md\n\nBody.",
+        "Update src/core/main.py, src/util.py\n\nBody.",
+    ]
+    log = run_git(repo, "log", "--format=%H %s", "-4").splitlines()
+    assert [line.split(" ", 1)[0] for line in log[:3]] == commits[::-1]
+    assert log[3].endswith(" init")
+    for commit, (_, changes) in zip(commits, groups):
+        touched = run_git(repo, "show", "--format=", "--name-only", commit).split("\n")
+        assert sorted(filter(None, touched)) == sorted(c[5] for c in changes)
+    assert run_git(repo, "rev-parse", "HEAD^{tree}").strip() == staged_tree
+    # Nothing is left staged, and the unstaged edit is still there.
+    assert run_git(repo, "status", "--porcelain") == " M src/util.py\n"
+
+
+def test_group_prompts_come_from_the_repository_in_state(repo, tmp_path, monkeypatch):
+    """Tests that group prompts diff state.cwd, not the process's directory."""
+    monkeypatch.chdir(tmp_path)
+    state = RepoState.collect(str(repo))
+    groups = split.group_changes(get_staged_changes(str(repo)), state.numstat, {})
+
+    with patch.object(split, "generate_commit_message", side_effect=fake_message):
+        messages = split.generate_group_messages(
+            {"prompt": "Write a message."}, state, groups, use_cache=False
+        )
+
+    assert messages[0] == "Update README\n\nBody."
+
+
+def test_split_on_unborn_branch_from_subdirectory(tmp_path, monkeypatch):
+    """Tests the first commits of a repository, made from a subdirectory."""
+    repo = tmp_path / "fresh"
+    (repo / "a").mkdir(parents=True)
+    (repo / "b").mkdir()
+    run_git(repo, "init", "-q")
+    (repo / "a" / "one.txt").write_text("1\n")
+    (repo / "b" / "two.txt").write_text("2\n")
+    run_git(repo, "add", ".")
+    monkeypatch.chdir(repo / "b")
+
+    groups = split.group_changes(git.get_staged_changes(), settings={})
+    commits = split.commit_groups(groups, ["feat: a", "feat: b"])
+
+    assert run_git(repo, "rev-list", "HEAD").split() == commits[::-1]
+    assert run_git(repo, "status", "--porcelain") == ""
+    assert os.path.exists(repo / "a" / "one.txt")
+
+
+def test_split_refuses_to_move_a_head_that_moved(repo):
+    """Tests that a commit made meanwhile is not overwritten."""
+    groups = split.group_changes(get_staged_changes(), settings={})
+    original = split.run_git
+
+    def commit_meanwhile(args, *rest, **kwargs):
+        if args[0] == "update-ref":
+            run_git(repo, "commit", "-qm", "meanwhile")
+        return original(args, *rest, **kwargs)
+
+    with patch.object(split, "run_git", side_effect=commit_meanwhile):
+        with pytest.raises(SystemExit):
+            split.commit_groups(groups, ["one", "two", "three"])
+    assert run_git(repo, "log", "-1", "--format=%s").strip() == "meanwhile"
+
+
+def test_split_command_generates_groups_in_parallel(repo, capsys):
+    """Tests --split end to end with a slow model: messages are generated at once."""
+    from gemmit.commands.split import run as split_run
+
+    def slow_message(prompt, use_cache=True, cancel=None, cwd=None):
+        time.sleep(0.3)
+        return fake_message(prompt)
+
+    start = time.monotonic()
+    with patch.object(split, "generate_commit_message", side_effect=slow_message):
+        commits = split_run("kernel", RepoState.collect(), yes=True, use_cache=False)
+
+    assert time.monotonic() - start < 0.8
+    assert len(commits) == 3
+    assert "Update README" in capsys.readouterr().out
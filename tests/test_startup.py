@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Import time budget for gemmit's quick paths, in milliseconds. It is well
+# above what these paths cost today, so that only real regressions trip it.
+IMPORT_BUDGET_MS = int(os.environ.get("GEMMIT_IMPORT_BUDGET_MS", "75"))
+
+# Modules that must only be imported on the paths that use them.
+LAZY_MODULES = [
+    "rich",
+    "concurrent.futures",
+    "gemmit.commands.generate",
+    "gemmit.core.ai",
+]
+
+
+def import_times(args, cwd, env, expected_output=""):
+    """Runs python -X importtime and returns {module: self time in us}.
+
+    The run must succeed and print expected_output, so that a path which
+    fails early is not mistaken for a fast one.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + args,
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert expected_output in result.stdout
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        try:
+            times[fields[2].strip()] = int(fields[0])
+        except (IndexError, ValueError):
+            # The header line.
+            continue
+    return times
+
+
+@pytest.fixture
+def startup_env(tmp_path):
+    """An empty git repository and HOME to run gemmit's quick paths in."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    env = os.environ.copy()
+    env["HOME"] = str(tmp_path)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return repo, env
+
+
+@pytest.mark.parametrize(
+    "args, expected_output",
+    [
+        (["--set-default", "kernel"], "Default template set to 'kernel'."),
+        (["kernel", "-y"], "No staged changes found."),
+        (["kernel"], "No staged changes found."),
+    ],
+    ids=["set-default", "no-staged-changes-yes", "no-staged-changes"],
+)
+def test_quick_paths_stay_within_import_budget(startup_env, args, expected_output):
+    """Tests that quick paths skip heavy imports and stay within the budget."""
+    repo, env = startup_env
+    baseline = import_times(["-c", "pass"], repo, env)
+    times = import_times(["-m", "gemmit.gemmit"] + args, repo, env, expected_output)
+
+    imported = set(times) - set(baseline)
+    for module in LAZY_MODULES:
+        assert module not in imported, f"{module} imported on a quick path"
+
+    cost_ms = sum(times[module] for module in imported) / 1000
+    assert (
+        cost_ms < IMPORT_BUDGET_MS
+    ), f"startup imports took {cost_ms:.1f}ms, over the {IMPORT_BUDGET_MS}ms budget"
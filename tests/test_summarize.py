@@ -0,0 +1,112 @@
+from unittest.mock import patch
+from gemmit.core import summarize
+
+
+def make_file_diff(name, hunks=1, hunk_lines=10):
+    """Returns a synthetic diff for one file."""
+    header = f"diff --git a/{name} b/{name}\n--- a/{name}\n+++ b/{name}\n"
+    body = ""
+    for i in range(hunks):
+        body += f"@@ -{i * 100},3 +{i * 100},3 @@\n"
+        body += "".join(f"+line {j}\n" for j in range(hunk_lines))
+    return header + body
+
+
+def chunk_diff(diff, chunk_bytes):
+    """Returns the chunks iter_chunks makes of a whole diff."""
+    return list(summarize.iter_chunks(diff.splitlines(keepends=True), chunk_bytes))
+
+
+def test_iter_chunks_groups_whole_files():
+    """Tests that small files are grouped into chunks without being cut."""
+    files = [make_file_diff(f"file{i}.py") for i in range(6)]
+    chunks = chunk_diff("".join(files), chunk_bytes=len(files[0]) * 2)
+
+    assert len(chunks) == 3
+    assert "".join(chunks) == "".join(files)
+
+
+def test_iter_chunks_splits_large_file_by_hunks():
+    """Tests that a file over the chunk size is split at hunks with its header."""
+    diff = make_file_diff("big.py", hunks=4)
+    chunks = chunk_diff(diff, chunk_bytes=len(diff) // 2)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith("diff --git a/big.py b/big.py\n")
+        assert "@@ " in chunk
+
+
+@patch("gemmit.core.summarize.generate_commit_message")
+def test_build_prompt_small_diff_is_unchanged(mock_generate):
+    """Tests that diffs under the threshold are sent as they are."""
+    prompt = summarize.build_prompt(
+        {"prompt": "Template"}, "small diff", settings={"threshold_bytes": 100}
+    )
+    assert prompt == "Template\n\nsmall diff"
+    mock_generate.assert_not_called()
+
+
+@patch("gemmit.core.summarize.generate_commit_message")
+def test_build_prompt_large_diff_is_summarized(mock_generate):
+    """Tests that large diffs are replaced by per-chunk summaries, in order."""
+    mock_generate.side_effect = (
+        lambda prompt, **kwargs: "summary of " + prompt.split("a/")[1].split(" ")[0]
+    )
+    diff = make_file_diff("one.py") + make_file_diff("two.py")
+    settings = {"threshold_bytes": 10, "chunk_bytes": len(diff) // 2 + 1}
+
+    prompt = summarize.build_prompt({"prompt": "Template"}, diff, settings=settings)
+
+    assert mock_generate.call_count == 2
+    assert prompt.startswith("Template\n\n" + summarize.MERGE_PREAMBLE)
+    assert prompt.index("summary of one.py") < prompt.index("summary of two.py")
+    assert "+line" not in prompt
+
+
+@patch("gemmit.core.summarize.generate_commit_message")
+def test_build_prompt_streamed_small_diff_is_read(mock_generate):
+    """Tests that a streamed diff under the threshold becomes a plain prompt."""
+    prompt = summarize.build_prompt(
+        {"prompt": "Template"},
+        lambda: iter(["line 1\n", "line 2\n"]),
+        settings={"threshold_bytes": 100},
+    )
+    assert prompt == "Template\n\nline 1\nline 2\n"
+    mock_generate.assert_not_called()
+
+
+def test_build_prompt_streamed_without_threshold_stays_a_stream():
+    """Tests that with summarizing disabled a streamed diff is never loaded."""
+    prompt = summarize.build_prompt(
+        {"prompt": "Template"},
+        lambda: iter(["line 1\n"]),
+        settings={"threshold_bytes": 0},
+    )
+    assert isinstance(prompt, summarize.PromptStream)
+    assert "".join(prompt) == "Template\n\nline 1\n"
+    # The stream can be replayed for a retry.
+    assert "".join(prompt) == "Template\n\nline 1\n"
+
+
+@patch("gemmit.core.summarize.generate_commit_message")
+def test_summarize_chunks_consumes_lazily(mock_generate):
+    """Tests that summaries keep chunk order when fed from a generator."""
+    mock_generate.side_effect = lambda prompt, **kwargs: prompt[-1]
+    chunks = (str(i) for i in range(7))
+
+    assert summarize.summarize_chunks(chunks, max_workers=2) == list("0123456")
+
+
+@patch("gemmit.core.summarize.generate_commit_message")
+def test_build_prompt_summarizes_diffs_over_the_token_budget(mock_generate):
+    """Tests that a diff under the threshold but over the budget is summarized."""
+    mock_generate.return_value = "- summary"
+    template = {"prompt": "p", "token_budget": 10}
+
+    prompt = summarize.build_prompt(
+        template, "x" * 100, settings={"threshold_bytes": 100000, "chunk_bytes": 60}
+    )
+
+    assert summarize.MERGE_PREAMBLE in prompt
+    mock_generate.assert_called_once()
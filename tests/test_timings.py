@@ -0,0 +1,23 @@
+import json
+import os
+from gemmit.core import timings
+
+
+def test_record_timing_disabled_by_default():
+    """Tests that nothing is written unless timings are enabled."""
+    timings.record_timing(0.1, 0.5, cached=False, settings={})
+
+    assert not os.path.exists(timings.TIMINGS_FILE)
+
+
+def test_record_timing_appends_records():
+    """Tests that each generation appends one JSON line."""
+    settings = {"enabled": True}
+    timings.record_timing(0.1, 0.5, cached=False, settings=settings)
+    timings.record_timing(None, 0.2, cached=True, settings=settings)
+
+    with open(timings.TIMINGS_FILE) as f:
+        records = [json.loads(line) for line in f]
+    assert [r["first_line_seconds"] for r in records] == [0.1, None]
+    assert [r["total_seconds"] for r in records] == [0.5, 0.2]
+    assert [r["cached"] for r in records] == [False, True]
@@ -0,0 +1,161 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from gemmit.core.retry import RetryPolicy, TransientError
+from gemmit.utils import trace
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def spans_by_name(tracer):
+    return {s["name"]: s for s in tracer.report()["spans"]}
+
+
+def test_span_is_a_shared_no_op_when_tracing_is_off():
+    """Tests that disabled tracing records nothing and allocates no spans."""
+    first = trace.span("phase", size=1)
+    with first as s:
+        s.set(more=2)
+    assert trace.span("other") is first
+    assert trace._tracer is None
+
+
+def test_spans_nest_and_record_attributes_and_errors():
+    """Tests parent links, attributes set on the way, and failed phases."""
+    tracer = trace.enable()
+    with trace.span("outer", level="full") as outer:
+        with trace.span("inner") as inner:
+            inner.set(bytes=42)
+        with pytest.raises(ValueError):
+            with trace.span("failing"):
+                raise ValueError("boom")
+        outer.set(done=True)
+
+    spans = spans_by_name(tracer)
+    assert spans["outer"]["parent"] is None
+    assert spans["outer"]["attrs"] == {"level": "full", "done": True}
+    assert spans["inner"]["parent"] == spans["outer"]["id"]
+    assert spans["inner"]["attrs"] == {"bytes": 42}
+    assert spans["failing"]["attrs"] == {"error": "ValueError"}
+    assert spans["outer"]["duration_ms"] >= spans["inner"]["duration_ms"]
+
+
+def test_spans_in_other_threads_have_their_own_parents():
+    """Tests that a span open in one thread is not the parent of another's."""
+    tracer = trace.enable()
+    with trace.span("main"):
+        worker = threading.Thread(target=lambda: trace.span("worker").__enter__())
+        worker.start()
+        worker.join()
+        with trace.span("child"):
+            pass
+
+    spans = spans_by_name(tracer)
+    assert spans["child"]["parent"] == spans["main"]["id"]
+
+
+def test_report_totals_phases_and_writes_json(tmp_path):
+    """Tests the per-phase totals and the report written to a file."""
+    path = tmp_path / "trace.json"
+    tracer = trace.enable(str(path))
+    for _ in range(3):
+        with trace.span("attempt"):
+            pass
+    tracer.write()
+
+    report = json.loads(path.read_text())
+    assert report["phases"]["attempt"]["count"] == 3
+    assert len(report["spans"]) == 3
+    assert report["total_ms"] >= report["phases"]["attempt"]["total_ms"]
+
+
+def test_enable_from_env(monkeypatch, tmp_path):
+    """Tests that GEMMIT_TRACE picks stderr or a file, and 0 leaves tracing off."""
+    monkeypatch.setenv(trace.TRACE_ENV, "0")
+    trace.enable_from_env()
+    assert trace._tracer is None
+
+    monkeypatch.setenv(trace.TRACE_ENV, "1")
+    trace.enable_from_env()
+    assert trace._tracer.destination == trace.STDERR
+    trace.disable()
+
+    monkeypatch.setenv(trace.TRACE_ENV, str(tmp_path / "out.json"))
+    trace.enable_from_env()
+    assert trace._tracer.destination == str(tmp_path / "out.json")
+
+
+def test_retry_attempts_and_sleeps_are_traced():
+    """Tests that each attempt and each wait between attempts is a span."""
+    tracer = trace.enable()
+    calls = []
+
+    def flaky(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise TransientError("Transient API error")
+        return "ok"
+
+    policy = RetryPolicy.from_settings(
+        {"base_delay_seconds": 0.01, "max_delay_seconds": 0.02}
+    )
+    assert policy.run(flaky) == "ok"
+
+    phases = tracer.report()["phases"]
+    assert phases["retry.attempt"]["count"] == 3
+    assert phases["retry.sleep"]["count"] == 2
+    failed = [s for s in tracer.report()["spans"] if s["name"] == "retry.attempt"]
+    assert [s["attrs"].get("error") for s in failed] == [
+        "TransientError",
+        "TransientError",
+        None,
+    ]
+
+
+def test_gemmit_yes_writes_a_trace(tmp_path):
+    """Tests a traced `gemmit -y` run end to end, with a fake gemini."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    gemini = bin_dir / "gemini"
+    gemini.write_text(
+        f"#!{sys.executable}\nimport sys\nsys.stdin.read()\nprint('feat: Traced')\n"
+    )
+    gemini.chmod(0o755)
+    env = dict(
+        os.environ,
+        HOME=str(tmp_path),
+        PATH=f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+        PYTHONPATH=REPO_ROOT,
+        GIT_AUTHOR_NAME="Test",
+        GIT_AUTHOR_EMAIL="test@example.com",
+        GIT_COMMITTER_NAME="Test",
+        GIT_COMMITTER_EMAIL="test@example.com",
+        GEMMIT_TRACE=str(tmp_path / "trace.json"),
+    )
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    (repo / "file.txt").write_text("content\n")
+    subprocess.run(["git", "add", "file.txt"], cwd=repo, check=True)
+
+    subprocess.run(
+        [sys.executable, "-m", "gemmit.gemmit", "kernel", "-y", "--no-cache"],
+        cwd=repo,
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+
+    report = json.loads((tmp_path / "trace.json").read_text())
+    for phase in (
+        "git.repo_state",
+        "prompt",
+        "generate",
+        "retry.attempt",
+        "backend.call",
+        "commit",
+    ):
+        assert phase in report["phases"], phase
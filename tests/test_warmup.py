@@ -0,0 +1,101 @@
+import subprocess
+import sys
+import pytest
+from unittest.mock import patch
+from gemmit.core import ai, warmup
+
+
+@pytest.fixture
+def fake_gemini(tmp_path, monkeypatch):
+    """Puts a gemini on PATH that echoes the first line of its prompt."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    gemini = bin_dir / "gemini"
+    gemini.write_text('#!/bin/sh\nread line\necho "feat: $line"\n')
+    gemini.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    yield
+    warmup.discard_prespawned()
+
+
+def test_prespawn_disabled(fake_gemini):
+    """Tests that nothing is started when prespawning is turned off."""
+    assert not warmup.prespawn_gemini({"prespawn_gemini": False})
+    assert warmup.take_prespawned() is None
+
+
+def test_prespawn_without_gemini(monkeypatch):
+    """Tests that a missing gemini is left for the generation to report."""
+    monkeypatch.setenv("PATH", "/nonexistent")
+    assert not warmup.prespawn_gemini({})
+
+
+def test_generation_uses_prespawned_process(fake_gemini):
+    """Tests that the next generation writes its prompt to the running process."""
+    assert warmup.prespawn_gemini({})
+
+    with patch("subprocess.Popen", wraps=subprocess.Popen) as spy:
+        message = ai.generate_commit_message("Prespawned\n", use_cache=False)
+
+    assert message == "feat: Prespawned"
+    spy.assert_not_called()
+    assert warmup.take_prespawned() is None
+
+
+def test_discard_kills_unused_process(fake_gemini):
+    """Tests that a process nobody took is killed."""
+    assert warmup.prespawn_gemini({})
+    _, process = warmup._prespawned[0]
+
+    warmup.discard_prespawned()
+
+    assert process.poll() is not None
+    assert warmup.take_prespawned() is None
+
+
+def test_prespawn_keeps_one_process_waiting(fake_gemini):
+    """Tests that repeated prespawns don't pile up idle processes."""
+    assert warmup.prespawn_gemini({})
+    assert not warmup.prespawn_gemini({})
+    assert len(warmup._prespawned) == 1
+
+
+def test_prespawned_process_is_only_used_in_its_directory(fake_gemini, tmp_path):
+    """Tests that gemini runs where the repository is, prespawned or not."""
+    gemini = tmp_path / "bin" / "gemini"
+    gemini.write_text(
+        '#!/bin/sh\nread line\necho "feat: $line in $(basename "$(pwd -P)")"\n'
+    )
+    other = tmp_path / "other"
+    other.mkdir()
+    assert warmup.prespawn_gemini({})
+
+    with patch("subprocess.Popen", wraps=subprocess.Popen) as spy:
+        message = ai.generate_commit_message("Elsewhere\n", use_cache=False, cwd=other)
+
+    assert message == "feat: Elsewhere in other"
+    assert spy.call_args.kwargs["cwd"] == other
+    # The process waiting in the current directory was left alone...
+    assert len(warmup._prespawned) == 1
+    # ...until a prespawn for another directory replaces it.
+    assert warmup.prespawn_gemini({}, cwd=other)
+    assert [directory for directory, _ in warmup._prespawned] == [str(other.resolve())]
+    assert ai.generate_commit_message("Here\n", use_cache=False, cwd=other) == (
+        "feat: Here in other"
+    )
+    assert warmup.take_prespawned(other) is None
+
+
+@pytest.mark.parametrize("args", [["kernel", "-y"], ["kernel"]], ids=["yes", "ask"])
+def test_nothing_is_warmed_up_for_an_empty_index(tmp_path, monkeypatch, args):
+    """Tests that gemini is only booted once something is staged."""
+    from gemmit import gemmit
+
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["gemmit"] + args)
+    with patch.object(gemmit, "warm_up_backend") as warm_up:
+        with pytest.raises(SystemExit):
+            gemmit.main()
+
+    warm_up.assert_not_called()
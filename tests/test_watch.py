@@ -0,0 +1,166 @@
+import os
+import sys
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from gemmit.commands.watch import run as watch_run
+from gemmit.core import ai, watch
+from gemmit.core.git import get_staged_tree
+from gemmit.utils.errors import GenerationCancelled
+from conftest import run_git
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture
+def repo(repo):
+    """A repository with a commit and a staged change."""
+    (repo / "README").write_text("readme\n")
+    run_git(repo, "add", ".")
+    run_git(repo, "commit", "-qm", "init")
+    (repo / "README").write_text("readme, updated\n")
+    run_git(repo, "add", "README")
+    return repo
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.02)
+
+
+def test_get_staged_tree_does_not_touch_the_index(repo):
+    """Tests that the staged tree is the one write-tree gives, with the index untouched."""
+    index = repo / ".git" / "index"
+    before = os.stat(index).st_mtime_ns
+
+    tree = get_staged_tree()
+
+    assert os.stat(index).st_mtime_ns == before
+    assert tree == run_git(repo, "write-tree").strip()
+    assert not [name for name in os.listdir(repo / ".git") if "gemmit-index" in name]
+
+
+def test_ready_message_is_only_used_for_the_same_head_and_tree(repo):
+    """Tests that a ready message goes stale when the index or HEAD moves."""
+    head, tree = watch.get_head(), get_staged_tree()
+    watch.write_ready_message(head, tree, "kernel", "Update README")
+
+    assert watch.read_ready_message("kernel") == "Update README"
+    assert watch.read_ready_message() == "Update README"
+    assert watch.read_ready_message("conventional") is None
+
+    (repo / "other").write_text("other\n")
+    run_git(repo, "add", "other")
+    assert watch.read_ready_message("kernel") is None
+
+
+def test_ready_message_skips_the_tree_while_the_index_is_unchanged(repo):
+    """Tests that the tree is only computed again once the index is rewritten."""
+    stamp = watch.index_stamp()
+    watch.write_ready_message(
+        watch.get_head(), get_staged_tree(), "kernel", "Ready", stamp=stamp
+    )
+
+    with patch.object(watch, "get_staged_tree", wraps=get_staged_tree) as tree:
+        assert watch.read_ready_message("kernel") == "Ready"
+        assert tree.call_count == 0
+
+        # Staging the same contents again rewrites the index, not the tree.
+        run_git(repo, "add", "README")
+        os.utime(repo / ".git" / "index", ns=(0, 0))
+        assert watch.read_ready_message("kernel") == "Ready"
+        assert watch.read_ready_message("kernel") == "Ready"
+        assert tree.call_count == 1
+
+        (repo / "other").write_text("other\n")
+        run_git(repo, "add", "other")
+        assert watch.read_ready_message("kernel") is None
+
+
+@pytest.mark.parametrize("poll", [True, False], ids=["poll", "inotify"])
+def test_watcher_cancels_stale_generations(repo, poll):
+    """Tests that staging again cancels the running generation and starts a new one."""
+    calls = []
+    events = []
+
+    def slow_message(prompt, use_cache=True, cancel=None, **kwargs):
+        calls.append(prompt)
+        if len(calls) == 1:
+            # The first generation only ends when it is cancelled.
+            cancel.wait(5)
+            raise GenerationCancelled()
+        return "Update README and other"
+
+    watcher = watch.Watcher(
+        "kernel",
+        debounce=0.1,
+        use_cache=False,
+        on_event=lambda event, key, message=None: events.append(event),
+    )
+    stop = threading.Event()
+    with patch.object(ai, "generate_commit_message", side_effect=slow_message):
+        thread = threading.Thread(
+            target=watcher.run, args=(stop,), kwargs={"poll": poll}
+        )
+        thread.start()
+        try:
+            wait_for(lambda: calls)
+            (repo / "other").write_text("other\n")
+            run_git(repo, "add", "other")
+            wait_for(lambda: "ready" in events)
+        finally:
+            stop.set()
+            thread.join()
+            watcher.wait()
+
+    assert events == ["generating", "cancelled", "generating", "ready"]
+    assert "b/other" in calls[1] and "b/other" not in calls[0]
+    with patch.object(watch, "get_staged_tree") as tree:
+        assert watch.read_ready_message("kernel") == "Update README and other"
+    tree.assert_not_called()
+
+
+def test_hook_fills_in_plain_commits_only(repo, monkeypatch):
+    """Tests that `git commit` gets the ready message, and -m is left alone."""
+    monkeypatch.setenv("PYTHONPATH", REPO_ROOT)
+    monkeypatch.setenv("GIT_EDITOR", "true")
+    watch_run(["--install-hook"])
+    watch.write_ready_message(watch.get_head(), get_staged_tree(), "kernel", "Ready")
+
+    run_git(repo, "commit", "-q")
+    assert run_git(repo, "log", "-1", "--format=%B").strip() == "Ready"
+
+    (repo / "other").write_text("other\n")
+    run_git(repo, "add", "other")
+    watch.write_ready_message(watch.get_head(), get_staged_tree(), "kernel", "Ready")
+    run_git(repo, "commit", "-qm", "Mine")
+    assert run_git(repo, "log", "-1", "--format=%B").strip() == "Mine"
+
+
+def test_install_hook_keeps_foreign_hooks(repo):
+    hook = repo / ".git" / "hooks" / "prepare-commit-msg"
+    hook.parent.mkdir(exist_ok=True)
+    hook.write_text("#!/bin/sh\necho mine\n")
+
+    with pytest.raises(SystemExit):
+        watch_run(["--install-hook"])
+    assert hook.read_text() == "#!/bin/sh\necho mine\n"
+
+
+def test_gemmit_yes_commits_the_ready_message_without_generating(repo, monkeypatch):
+    from gemmit import gemmit
+
+    watch.write_ready_message(watch.get_head(), get_staged_tree(), "kernel", "Ready")
+    monkeypatch.setattr(sys, "argv", ["gemmit", "kernel", "-y"])
+    with patch.object(gemmit, "warm_up_backend") as warm_up, patch.object(
+        ai, "generate_commit_message"
+    ) as generate:
+        gemmit.main()
+
+    generate.assert_not_called()
+    warm_up.assert_not_called()
+    assert run_git(repo, "log", "-1", "--format=%s").strip() == "Ready"